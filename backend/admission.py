@@ -0,0 +1,290 @@
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from fastapi import HTTPException, Request
+import functools
+import threading
+import asyncio
+import math
+import time
+import os
+
+from events import event_bus
+from resilience import ProviderBusy, remaining
+from metrics import ADMISSION_REJECTED, ADMISSION_WAIT_SECONDS, PROVIDER_WAIT_SECONDS
+
+def _parse_limits(value, defaults):
+    """Parse ``name=number`` pairs, e.g. ``analysis=2,seo=2``, over defaults."""
+    limits = dict(defaults)
+    for pair in (value or '').split(','):
+        name, _, number = pair.partition('=')
+        if name.strip() and number.strip():
+            limits[name.strip()] = int(number)
+    return limits
+
+# Pipeline runs allowed at once per endpoint, and how many may wait for a slot
+ADMISSION_LIMITS = _parse_limits(os.getenv("ADMISSION_LIMITS"), {'analysis': 2, 'seo': 2, 'blog': 4})
+ADMISSION_QUEUE = _parse_limits(os.getenv("ADMISSION_QUEUE"), {'analysis': 8, 'seo': 8, 'blog': 16})
+# Upstream calls allowed at once per provider, across all running pipelines
+PROVIDER_LIMITS = _parse_limits(
+    os.getenv("PROVIDER_LIMITS"), {'spyfu': 4, 'anthropic': 4, 'openai': 8, 'gemini': 8}
+)
+PROVIDER_WAIT_TIMEOUT = float(os.getenv("PROVIDER_WAIT_TIMEOUT", "300"))
+
+class QueueFull(Exception):
+    """Raised when a pool's wait queue is full."""
+
+    def __init__(self, pool, retry_after):
+        super().__init__(f'{pool} queue is full')
+        self.retry_after = retry_after
+
+class AdmissionPool:
+    """Concurrency limit with a bounded, per-user fair wait queue.
+
+    Up to ``limit`` holders run at once. Further requests wait in one queue
+    per user, and freed slots go to the users in turn, so one user's burst
+    cannot starve everyone else. When ``queue_size`` requests are already
+    waiting, new ones are rejected straight away with an estimate of when
+    to retry. Waiters are told their queue position on their event stream.
+
+    Must only be used from the server's event loop.
+
+    Args:
+        name (str): Pool name, e.g. the endpoint.
+        limit (int): Maximum concurrent holders.
+        queue_size (int): Maximum waiting requests.
+    """
+
+    def __init__(self, name, limit, queue_size):
+        self.name = name
+        self.limit = max(limit, 1)
+        self.queue_size = queue_size
+        self.active = 0
+        self.queued = 0
+        self.service_seconds = 30.0
+        self._waiting = OrderedDict()
+
+    def retry_after(self):
+        """Seconds until a slot is likely to free up for a new request."""
+        return max(math.ceil(self.service_seconds * (self.queued + 1) / self.limit), 1)
+
+    def _order(self):
+        """Waiters in the order slots will be granted: one per user per round."""
+        queues = [list(waiters) for waiters in self._waiting.values()]
+        order = []
+        for turn in range(max(map(len, queues), default=0)):
+            order.extend(waiters[turn] for waiters in queues if turn < len(waiters))
+        return order
+
+    def _announce(self):
+        for position, (user_id, future) in enumerate(self._order(), 1):
+            event_bus.publish(user_id, 'queued', pool=self.name, position=position, queued=self.queued)
+
+    async def acquire(self, user_id):
+        """Wait for a slot.
+
+        Raises:
+            QueueFull: If the wait queue is full.
+        """
+        if self.active < self.limit and not self.queued:
+            self.active += 1
+            return
+        if self.queued >= self.queue_size:
+            raise QueueFull(self.name, self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(user_id, deque()).append((user_id, future))
+        self.queued += 1
+        self._announce()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as the client went away; pass the slot on
+                self.release()
+            else:
+                self._remove(user_id, future)
+            raise
+
+    def _remove(self, user_id, future):
+        waiters = self._waiting.get(user_id)
+        if waiters is None:
+            return
+        try:
+            waiters.remove((user_id, future))
+            self.queued -= 1
+        except ValueError:
+            return
+        if not waiters:
+            del self._waiting[user_id]
+        self._announce()
+
+    def release(self, seconds=None):
+        """Free a slot, handing it to the next user in turn.
+
+        Args:
+            seconds (float): How long the slot was held, to refine retry estimates.
+        """
+        if seconds is not None:
+            self.service_seconds = 0.8 * self.service_seconds + 0.2 * seconds
+        while self._waiting:
+            user_id, waiters = self._waiting.popitem(last=False)
+            _, future = waiters.popleft()
+            if waiters:
+                self._waiting[user_id] = waiters
+            self.queued -= 1
+            if not future.done():
+                # The slot passes straight to the waiter; active is unchanged
+                future.set_result(None)
+                self._announce()
+                return
+        self.active -= 1
+
+    def status(self):
+        return {'limit': self.limit, 'active': self.active, 'queued': self.queued, 'queue_size': self.queue_size}
+
+admission_pools = {
+    name: AdmissionPool(name, limit, ADMISSION_QUEUE.get(name, 0))
+    for name, limit in ADMISSION_LIMITS.items()
+}
+
+async def _request_user(request):
+    """Who a request is queued for: its user ID, else the client address."""
+    user_id = request.path_params.get('userId') or request.path_params.get('user_id') \
+        or request.query_params.get('userId')
+    if not user_id and request.headers.get('content-type', '').startswith('application/json'):
+        try:
+            # FastAPI has already read the body, so this is served from its cache
+            body = await request.json()
+            user_id = body.get('userId') if isinstance(body, dict) else None
+        except ValueError:
+            pass
+    return user_id or (request.client.host if request.client else 'anonymous')
+
+def admission(pool_name):
+    """Build a FastAPI dependency that holds a pool slot for the whole request.
+
+    Waiting happens on the event loop, so queued requests occupy no
+    threadpool threads. A full queue answers 429 with ``Retry-After``.
+
+    Args:
+        pool_name (str): Key in ``ADMISSION_LIMITS``.
+
+    Returns:
+        callable: The dependency.
+    """
+    pool = admission_pools[pool_name]
+
+    async def admit(request: Request):
+        start = time.perf_counter()
+        try:
+            await pool.acquire(await _request_user(request))
+        except QueueFull as e:
+            ADMISSION_REJECTED.inc(pool=pool_name)
+            raise HTTPException(
+                status_code=429,
+                detail=f'Too many {pool_name} requests in progress, retry in {e.retry_after}s',
+                headers={'Retry-After': str(e.retry_after)}
+            )
+        ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - start, pool=pool_name)
+
+        held = time.perf_counter()
+        try:
+            yield
+        finally:
+            pool.release(time.perf_counter() - held)
+
+    return admit
+
+def admission_status():
+    """Current load of each admission pool."""
+    return {name: pool.status() for name, pool in admission_pools.items()}
+
+_provider_slots = {name: threading.BoundedSemaphore(max(limit, 1)) for name, limit in PROVIDER_LIMITS.items()}
+
+def provider_for_model(model):
+    """Map an LLM model name to its provider key."""
+    model = model.lower()
+    if 'claude' in model or model.startswith('anthropic/'):
+        return 'anthropic'
+    if 'gemini' in model:
+        return 'gemini'
+    return 'openai'
+
+def _slot_wait_timeout():
+    left = remaining()
+    return PROVIDER_WAIT_TIMEOUT if left is None else max(min(PROVIDER_WAIT_TIMEOUT, left), 0)
+
+@contextmanager
+def provider_slot(provider):
+    """Hold one of a provider's concurrent call slots.
+
+    Called from worker threads around each upstream call, so all pipelines
+    together stay within the provider's rate limits.
+
+    Raises:
+        ProviderBusy: If no slot frees up within ``PROVIDER_WAIT_TIMEOUT``
+            or before the request's deadline.
+    """
+    slots = _provider_slots.get(provider)
+    if slots is None:
+        yield
+        return
+    start = time.perf_counter()
+    if not slots.acquire(timeout=_slot_wait_timeout()):
+        raise ProviderBusy(provider)
+    PROVIDER_WAIT_SECONDS.observe(time.perf_counter() - start, provider=provider)
+    try:
+        yield
+    finally:
+        slots.release()
+
+@asynccontextmanager
+async def provider_slot_async(provider):
+    """``provider_slot`` for coroutines on the event loop.
+
+    The slots are shared with worker threads and batch processes, so they
+    cannot be awaited directly; while all are taken, the coroutine polls
+    for a free one without blocking the loop.
+
+    Raises:
+        ProviderBusy: If no slot frees up within ``PROVIDER_WAIT_TIMEOUT``
+            or before the request's deadline.
+    """
+    slots = _provider_slots.get(provider)
+    if slots is None:
+        yield
+        return
+    start = time.perf_counter()
+    timeout = _slot_wait_timeout()
+    while not slots.acquire(False):
+        if time.perf_counter() - start >= timeout:
+            raise ProviderBusy(provider)
+        await asyncio.sleep(0.05)
+    PROVIDER_WAIT_SECONDS.observe(time.perf_counter() - start, provider=provider)
+    try:
+        yield
+    finally:
+        slots.release()
+
+def share_provider_limits(slots):
+    """Use provider semaphores shared with other processes, e.g. batch workers.
+
+    Args:
+        slots (dict): ``provider -> multiprocessing`` semaphore created by the parent.
+    """
+    _provider_slots.update(slots)
+
+def install_provider_limits():
+    """Apply the provider call limits to every crewai ``LLM.call``."""
+    from crewai import LLM
+    call = LLM.call
+    if getattr(call, 'limited', False):
+        return
+
+    @functools.wraps(call)
+    def limited_call(self, *args, **kwargs):
+        with provider_slot(provider_for_model(self.model)):
+            return call(self, *args, **kwargs)
+
+    limited_call.limited = True
+    LLM.call = limited_call
@@ -3,6 +3,13 @@ from crewai import Agent, Crew, Task, LLM
 from crewai_tools import FileReadTool
 from dotenv import load_dotenv
 from pathlib import Path
+from postprocess import save_artifact
+from metrics import instrument_tools
+from cassettes import record_tools
+from storage import get_storage
+from runs import run_dir
+from resilience import LLM_TIMEOUT
+from templates import precompiled
 import agentops
 import os
 
@@ -10,19 +17,23 @@ load_dotenv()
 
 openai = LLM(
     model="gpt-4o",
-    api_key=os.getenv("OPENAI_API_KEY")
+    api_key=os.getenv("OPENAI_API_KEY"),
+    timeout=LLM_TIMEOUT
 )
 
 gemini = LLM(
     model="gemini/gemini-2.0-flash-exp",
-    api_key=os.getenv("GEMINI_API_KEY")
+    api_key=os.getenv("GEMINI_API_KEY"),
+    timeout=LLM_TIMEOUT
 )
 
 anthropic = LLM(
     model="claude-3-5-sonnet-20241022",
-    api_key=os.getenv("ANTHROPIC_API_KEY")
+    api_key=os.getenv("ANTHROPIC_API_KEY"),
+    timeout=LLM_TIMEOUT
 )
 
+@precompiled
 @CrewBase
 class AnalysisCrew():
     """Analysis Crew for processing and analyzing data."""
@@ -41,11 +52,19 @@ class AnalysisCrew():
 
         Args:
             user_id (str): The ID of the user for whom the analysis is being performed.
-            inputs (dict): The inputs required for the analysis.
+            inputs (dict): The inputs required for the analysis; an optional
+                ``run_id`` selects the run namespace the outputs are saved in.
         """
         try:
             self.inputs = inputs
             self.output_dir = Path('outputs') / str(self.inputs['user_id'])
+            run_id = self.inputs.get('run_id')
+            self.run_dir = run_dir(self.inputs['user_id'], run_id) if run_id else self.output_dir
+            self.artifacts = {}
+
+            # The file tools read local copies of the stored SpyFu data
+            for filename in ('competitor_rankings.json', 'user_rankings.json'):
+                get_storage().fetch(self.output_dir / 'data' / filename)
         except Exception as e:
             print(f"Error initializing AnalysisCrew: {e}")
             raise
@@ -75,7 +94,7 @@ class AnalysisCrew():
         return Task(
             config=self.tasks_config['analyze_keyword_rankings_data'],
             agent=self.data_analyst_agent(),
-            tools=[
+            tools=instrument_tools(record_tools([
                 FileReadTool(
                     name="Read competitor rankings data",
                     description="Read the competitor_rankings.json file",
@@ -90,8 +109,8 @@ class AnalysisCrew():
                     encoding='utf-8',
                     errors='ignore'
                 )
-            ],
-            output_file=str(self.output_dir / 'crew' / '1_analysis.md')
+            ])),
+            callback=save_artifact(self.run_dir / 'crew' / '1_analysis.md', self.artifacts, 'analysis')
         )
 
     @crew
@@ -1,20 +1,56 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from spire.doc import Document, FileFormat
+from starlette.routing import Match
 from urllib.parse import unquote
 from pydantic import BaseModel
+from typing import Optional
 from dotenv import load_dotenv
-from threading import Thread
 from pathlib import Path
-import shutil
+import asyncio
+import time
 import uuid
 import os
 
+from admission import admission, admission_status
 from blog_writer import generate_blog
+from bundles import ZipBundle, collect_artifacts, parse_range
+from events import event_bus, stream_events
+from executors import run_crew, run_io, shutdown_executors
+from janitor import janitor
+from keyword_index import keyword_indexes
+from metrics import HTTP_REQUEST_SECONDS, render_metrics
+from profiling import (
+    global_profile,
+    parse_profile_header,
+    profiled,
+    requested_profile,
+    start_global_sampler,
+    stop_global_sampler
+)
+from documents import (
+    DOCUMENT_SOURCES,
+    available_docx_files,
+    etag_matches,
+    get_cached_document,
+    media_type_for,
+    parse_document_name,
+    render_user_documents
+)
+from resilience import CircuitOpen, DeadlineExceeded, ProviderBusy, breaker_status, deadline
+from routing import model_router
+from renderer import RENDER_FORMATS, shutdown_render_pool, warm_render_pool
+from storage import get_storage
+from templates import warm_crew_templates
+from speculation import speculator
+from refresh import refresher, reuse_tracked_analysis
+from usage import BudgetExceeded, budget_status, get_usage_ledger
+from runs import is_valid_run_id, list_runs, pipeline_run_async, run_dir
 from main import (
+    fetch_spyfu_stage,
     run_analysis_crew,
     get_available_keywords,
+    get_keyword_clusters,
     save_keyword_details,
     run_seo_crew
 )
@@ -30,14 +66,70 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,
     allow_methods=["GET", "POST", "OPTIONS", "DELETE"],
-    allow_headers=["Content-Type", "Authorization", "Accept"],
+    allow_headers=["Content-Type", "Authorization", "Accept", "X-Profile"],
+    expose_headers=["X-Profile-Path", "Retry-After"],
     allow_credentials=True,
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Record the latency of every API request, labelled by route template."""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get('route')
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, 'path', 'unmatched'),
+            status=status
+        )
+
+def _request_user_id(request: Request):
+    """The user a request is for, from its path or query parameters."""
+    params = request.scope.get('path_params') or {}
+    if not params:
+        # Middleware runs before routing, so match the route here
+        for route in request.app.router.routes:
+            match, child_scope = route.matches(request.scope)
+            if match == Match.FULL:
+                params = child_scope.get('path_params') or {}
+                break
+    return params.get('userId') or params.get('user_id') or request.query_params.get('userId')
+
+@app.middleware("http")
+async def track_user_access(request: Request, call_next):
+    """Mark the request's user as active so the janitor keeps their outputs.
+
+    The user is touched when the request starts and again when it ends, so
+    a long request does not leave the user looking idle.
+    """
+    user_id = _request_user_id(request) if request.method != 'DELETE' else None
+    if user_id:
+        janitor.touch(user_id)
+    response = await call_next(request)
+    if user_id:
+        janitor.touch(user_id)
+    return response
+
+@app.middleware("http")
+async def select_profile_mode(request: Request, call_next):
+    """Carry the X-Profile header to profiled endpoints through a context variable."""
+    token = requested_profile.set(parse_profile_header(request.headers.get('x-profile')))
+    try:
+        return await call_next(request)
+    finally:
+        requested_profile.reset(token)
+
 class UserData(BaseModel):
     """Model for user data input."""
     institution_name: str
     domain_url: str
+    userId: Optional[str] = None
 
 class KeywordsData(BaseModel):
     """Model for keywords data input."""
@@ -47,6 +139,41 @@ class OutlineData(BaseModel):
     """Model for outline data input."""
     outline: str
 
+def check_run_id(run_id):
+    """Reject malformed run IDs passed by clients.
+
+    Args:
+        run_id (str): Run ID from the query string, may be None.
+    """
+    if run_id is not None and not is_valid_run_id(run_id):
+        raise HTTPException(status_code=400, detail=f'Invalid run ID: {run_id}')
+
+def upstream_unavailable(error):
+    """Map a failed upstream dependency to an HTTP error.
+
+    Args:
+        error (Exception): ``CircuitOpen``, ``ProviderBusy`` or ``DeadlineExceeded``.
+
+    Returns:
+        HTTPException: 503 with ``Retry-After`` while a circuit is open,
+        503 while a provider's call slots are all taken, 504 when the
+        request ran out of time.
+    """
+    if isinstance(error, CircuitOpen):
+        return HTTPException(status_code=503, detail=str(error), headers={'Retry-After': str(int(error.retry_after))})
+    if isinstance(error, ProviderBusy):
+        return HTTPException(status_code=503, detail=str(error))
+    return HTTPException(status_code=504, detail=str(error))
+
+def over_budget(error):
+    """Map a ``BudgetExceeded`` error to a 429, with ``Retry-After`` for the daily user budget."""
+    headers = {'Retry-After': str(int(error.retry_after))} if error.retry_after else None
+    return HTTPException(status_code=429, detail=str(error), headers=headers)
+
+class RenderData(BaseModel):
+    """Model for document render input."""
+    formats: list[str] = ['docx']
+
 def create_user_directory(userId):
     """Create user-specific directories for storing outputs.
 
@@ -67,55 +194,47 @@ def create_user_directory(userId):
         print(f"Error creating directories for user {userId}: {str(e)}")
 
 def cleanup_user_directory(userId):
-    """Remove the user-specific directory and all its contents.
+    """Remove the user-specific directory and all its contents in the background.
 
     Args:
         userId (str): Unique identifier for the user.
     """
     try:
-        user_dir = Path('outputs') / userId
-        if user_dir.exists():
-            shutil.rmtree(user_dir)
+        janitor.discard(Path('outputs') / userId, 'cleanup')
+        keyword_indexes.forget(userId)
     except Exception as e:
         print(f"Error cleaning up directory for user {userId}: {str(e)}")
 
-def convert_markdown_to_docx(markdown_file, output_filename, userId):
-    """Convert a markdown file to a DOCX file and save it.
+def discard_user_directory(user_id):
+    """Move a user's directory out of ``outputs/`` for background deletion, under the user's lock."""
+    with get_storage().user_lock(user_id):
+        janitor.discard(Path('outputs') / str(user_id), 'cleanup')
 
-    Args:
-        markdown_file (Path): Path to the markdown file to convert.
-        output_filename (str): Name of the output DOCX file.
-        userId (str): Unique identifier for the user.
+def forget_user(user_id):
+    """Drop a user's in-memory state once their directory is discarded.
 
-    Returns:
-        Path: Path to the saved DOCX file, or None if conversion failed.
+    Clears the progress history, cancels any SEO preparation and forgets
+    the keyword index, so nothing is served for data that is gone. Call
+    from the event loop.
     """
-    try:
-        # Setup output directory for DOCX files
-        doc_dir = Path('outputs') / userId / 'doc'
-        doc_dir.mkdir(parents=True, exist_ok=True)
-        output_path = doc_dir / output_filename
-
-        # Load the markdown file and save it as DOCX
-        doc = Document()
-        doc.LoadFromFile(str(markdown_file))
-        doc.SaveToFile(str(output_path), FileFormat.Docx2016)
-        doc.Dispose()
-
-        print(f"✅ Saved to: {output_path}")
-        return output_path
-
-    except Exception as e:
-        print(f"Error converting {markdown_file}: {str(e)}")
-        return None
+    event_bus.clear(user_id)
+    speculator.discard(user_id)
+    keyword_indexes.forget(user_id)
 
 @app.get('/download/{userId}/{filename}')
-async def download_file(userId: str, filename: str):
-    """Endpoint to download converted DOCX files.
+async def download_file(userId: str, filename: str, request: Request, run_id: Optional[str] = None):
+    """Endpoint to download converted DOCX, PDF or HTML files.
+
+    Files are rendered from their markdown source on first download and
+    cached by content hash; the hash doubles as the ETag so unchanged
+    files are answered with 304 Not Modified.
 
     Args:
         userId (str): Unique identifier for the user.
         filename (str): Name of the file to download.
+        request (Request): Incoming request, used for conditional headers.
+        run_id (str): Run to download from; by default the latest run
+            that produced the file.
 
     Returns:
         FileResponse: The requested file for download.
@@ -123,96 +242,228 @@ async def download_file(userId: str, filename: str):
     try:
         if not userId:
             raise HTTPException(status_code=400, detail='User ID is required')
+        check_run_id(run_id)
 
-        file_path = Path('outputs') / userId / 'doc' / filename
+        if parse_document_name(filename)[0]:
+            file_path, digest = await get_cached_document(userId, filename, run_id)
+        else:
+            file_path, digest = Path('outputs') / userId / 'doc' / filename, None
 
         # Check if the file exists before attempting to download
-        if not file_path.exists():
-            print(f"File not found: {file_path}")
+        if file_path is None or not await run_io(file_path.exists):
+            print(f"File not found: {filename}")
             raise HTTPException(status_code=404, detail=f'File not found: {filename}')
 
+        headers = {"Content-Disposition": f"attachment; filename={filename}"}
+        if digest:
+            headers['ETag'] = f'"{digest}"'
+            headers['Cache-Control'] = 'private, no-cache'
+            if etag_matches(request.headers.get('if-none-match'), digest):
+                return Response(status_code=304, headers=headers)
+
         print(f"File found, sending: {file_path}")
 
         return FileResponse(
             path=file_path,
-            media_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+            media_type=media_type_for(filename),
             filename=filename,
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+            headers=headers
         )
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in download_file: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/run/analysis")
-def run_analysis(data: UserData):
+@app.get('/events/{userId}')
+async def progress_events(userId: str, request: Request):
+    """Stream live pipeline progress for a user as server-sent events.
+
+    Events are published while the SpyFu fetch, the crews and the blog
+    writer run. Reconnecting clients resume from ``Last-Event-ID``.
+
+    Args:
+        userId (str): Unique identifier for the user.
+        request (Request): Incoming request, used for the resume header.
+
+    Returns:
+        StreamingResponse: A ``text/event-stream`` of progress events.
+    """
+    last_event_id = request.headers.get('last-event-id', '0')
+    return StreamingResponse(
+        stream_events(userId, request, int(last_event_id) if last_event_id.isdigit() else 0),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.get('/bundle/{userId}')
+async def download_bundle(userId: str, request: Request, run_id: Optional[str] = None):
+    """Endpoint to download all of a user's DOCX and markdown files as one ZIP.
+
+    The archive is streamed from disk in chunks. Its layout is computed up
+    front, so it has a fixed size and ETag and supports single byte-range
+    requests for resuming interrupted downloads.
+
+    Args:
+        userId (str): Unique identifier for the user.
+        request (Request): Incoming request, used for range and conditional headers.
+        run_id (str): Bundle only this run; by default the latest documents
+            and the markdown of every run.
+
+    Returns:
+        StreamingResponse: The ZIP archive, or the requested part of it.
+    """
+    try:
+        if not userId:
+            raise HTTPException(status_code=400, detail='User ID is required')
+        check_run_id(run_id)
+
+        documents = await render_user_documents(userId, list(DOCUMENT_SOURCES), ('docx',), run_id)
+        artifacts = await run_io(collect_artifacts, userId, documents, run_id)
+        if not artifacts:
+            raise HTTPException(status_code=404, detail='No files to download')
+        bundle = await run_io(ZipBundle, artifacts)
+
+        headers = {
+            'Content-Disposition': 'attachment; filename=seo_outputs.zip',
+            'Accept-Ranges': 'bytes',
+            'ETag': f'"{bundle.etag}"',
+            'Cache-Control': 'private, no-cache'
+        }
+        if etag_matches(request.headers.get('if-none-match'), bundle.etag):
+            return Response(status_code=304, headers=headers)
+
+        byte_range = parse_range(request.headers.get('range'), bundle.size)
+        if_range = request.headers.get('if-range')
+        if byte_range and if_range and not etag_matches(if_range, bundle.etag):
+            byte_range = None
+
+        if byte_range == (None, None):
+            headers['Content-Range'] = f'bytes */{bundle.size}'
+            return Response(status_code=416, headers=headers)
+
+        if byte_range:
+            start, end = byte_range
+            headers['Content-Range'] = f'bytes {start}-{end}/{bundle.size}'
+            headers['Content-Length'] = str(end - start + 1)
+            return StreamingResponse(
+                bundle.iter_bytes(start, end),
+                status_code=206,
+                media_type='application/zip',
+                headers=headers
+            )
+
+        headers['Content-Length'] = str(bundle.size)
+        return StreamingResponse(bundle.iter_bytes(), media_type='application/zip', headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in download_bundle: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/render/{userId}")
+async def render_documents(userId: str, data: RenderData, run_id: Optional[str] = None):
+    """Render all of a user's documents in parallel on the rendering pool.
+
+    Args:
+        userId (str): Unique identifier for the user.
+        data (RenderData): Formats to produce for each document.
+        run_id (str): Run to render; by default each document's latest.
+
+    Returns:
+        JSONResponse: Download names of the rendered files per document.
+    """
+    try:
+        unknown = [fmt for fmt in data.formats if fmt not in RENDER_FORMATS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unsupported formats: {', '.join(unknown)}")
+        check_run_id(run_id)
+
+        rendered = await render_user_documents(userId, list(DOCUMENT_SOURCES), tuple(data.formats), run_id)
+        files = {
+            name: {fmt: f'{name}.{fmt}' for fmt in paths}
+            for name, paths in rendered.items()
+        }
+        return JSONResponse(content={'status': 'success', 'files': files})
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in render_documents: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/run/analysis", dependencies=[Depends(admission('analysis'))])
+@profiled('analysis')
+async def run_analysis(data: UserData):
     """Run the analysis process for the given user data.
 
+    The SpyFu fetch is awaited on the event loop; the crew runs on the
+    crew executor. Data and analyses refreshed off-peak for tracked
+    institutions are reused while fresh.
+
     Args:
         data (UserData): User data containing institution name and domain URL.
 
     Returns:
         JSONResponse: Result of the analysis process.
     """
+    # Use the client's ID if it already subscribed to progress events,
+    # otherwise generate a unique user ID
+    try:
+        userId = str(uuid.UUID(data.userId)) if data.userId else str(uuid.uuid4())
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Invalid userId')
+
     try:
         institution_name = data.institution_name
         domain_url = data.domain_url
 
-        # Generate a unique user ID
-        userId = str(uuid.uuid4())
-
-        create_user_directory(userId)
+        await run_io(create_user_directory, userId)
 
         output_dir = Path('outputs') / userId
 
-        # Start the analysis process in a separate thread
-        result = Thread(target=run_analysis_crew, args=(userId, institution_name, domain_url, output_dir))
-        result.start()
-        result.join()
+        # Run the analysis crew; its output is cleaned and saved as it is produced
+        async with pipeline_run_async(userId, 'analysis', institution_name=institution_name, domain_url=domain_url) as run_id:
+            with deadline():
+                await fetch_spyfu_stage(userId, domain_url, output_dir, run_id)
+                # An off-peak analysis of a tracked institution is served while fresh
+                artifacts = await run_io(reuse_tracked_analysis, userId, institution_name, domain_url, run_id)
+                if artifacts is None:
+                    artifacts = await run_crew(
+                        run_analysis_crew, userId, institution_name, domain_url, output_dir, run_id, fetch=False
+                    )
 
         print("Analysis crew run complete")
+        # Prepare the SEO stage while the user chooses keywords
+        speculator.start(userId)
+
+        markdown_content = {key: artifact['content'] for key, artifact in artifacts.items()}
+        sections = {key: artifact['metadata']['sections'] for key, artifact in artifacts.items()}
 
-        # Clean the analysis markdown file
-        analysis_path = output_dir / 'crew' / '1_analysis.md'
-        if analysis_path.exists():
-            with open(analysis_path, 'r', encoding='utf-8') as f:
-                analysis_content = f.readlines()
-            analysis_content = [line for line in analysis_content if line.strip() != '```markdown' and line.strip() != '```']
-            with open(analysis_path, 'w', encoding='utf-8') as f:
-                f.writelines(analysis_content)
-
-        # Serve the analysis markdown file
-        markdown_content = {}
-        if analysis_path.exists():
-            with open(analysis_path, 'r', encoding='utf-8') as f:
-                markdown_content['analysis'] = f.read()
-
-        # Convert the analysis markdown file to a DOCX file
-        docx_files = {}
-        for file_info in [
-            ('1_analysis.md', 'analysis.docx', 'analysis')
-        ]:
-            md_file = output_dir / 'crew' / file_info[0]
-            if md_file.exists():
-                print(f"Converting {md_file} to {file_info[1]}")
-                if convert_markdown_to_docx(md_file, file_info[1], userId):
-                    docx_files[file_info[2]] = file_info[1]
-            else:
-                print(f"Warning: {md_file} not found")
+        # DOCX files are rendered on demand by /download
+        docx_files = await run_io(available_docx_files, userId, {'analysis': 'analysis.docx'}, run_id)
 
         return JSONResponse(content={
             'status': 'success',
             'message': 'Analysis completed successfully',
             'userId': userId,
+            'runId': run_id,
             'docxFiles': docx_files,
-            'markdown': markdown_content
+            'markdown': markdown_content,
+            'sections': sections
         })
 
+    except (CircuitOpen, DeadlineExceeded, ProviderBusy) as e:
+        print(f"Error in /run/analysis: {str(e)}")
+        raise upstream_unavailable(e)
+    except BudgetExceeded as e:
+        print(f"Error in /run/analysis: {str(e)}")
+        raise over_budget(e)
     except Exception as e:
         print(f"Error in /run/analysis: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/keywords")
-def get_keywords(userId: str):
+async def get_keywords(userId: str):
     """Retrieve available keywords for the specified user.
 
     Args:
@@ -226,15 +477,55 @@ def get_keywords(userId: str):
             raise HTTPException(status_code=400, detail='User ID is required')
 
         # Fetch available keywords using the function from main.py
-        keywords_result = get_available_keywords(userId)
+        keywords_result = await run_io(get_available_keywords, userId)
 
         return JSONResponse(content=keywords_result)
     except Exception as e:
         print(f"Error in get_keywords: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/keywords/search")
+async def search_keywords(userId: str, q: str, limit: int = 10):
+    """Typeahead search over the user's own and competitors' keywords.
+
+    Args:
+        userId (str): Unique identifier for the user.
+        q (str): What the user typed; matches the start of any word, or
+            similar spellings.
+        limit (int): Maximum results, at most 50.
+
+    Returns:
+        JSONResponse: Matching keywords with search volume and domains,
+        prefix matches first by search volume.
+    """
+    try:
+        # Searching a loaded index is quick enough for the event loop
+        index = keyword_indexes.loaded(userId) or await run_io(keyword_indexes.get, userId)
+        if index is None:
+            return JSONResponse(content={'status': 'error', 'message': 'No SpyFu data for this user'})
+        return JSONResponse(content={'status': 'success', 'results': index.search(q, max(1, min(limit, 50)))})
+    except Exception as e:
+        print(f"Error in search_keywords: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/keywords/clusters/{userId}")
+async def keyword_clusters(userId: str):
+    """Retrieve the topic clusters of the user's saved keyword selection.
+
+    Args:
+        userId (str): Unique identifier for the user.
+
+    Returns:
+        JSONResponse: Clusters with their head term, keywords and total search volume.
+    """
+    try:
+        return JSONResponse(content=await run_io(get_keyword_clusters, userId))
+    except Exception as e:
+        print(f"Error in keyword_clusters: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/keywords/save/{userId}")
-def save_keywords(userId: str, data: KeywordsData):
+async def save_keywords(userId: str, data: KeywordsData):
     """Save keywords for the specified user.
 
     Args:
@@ -250,15 +541,18 @@ def save_keywords(userId: str, data: KeywordsData):
         if not userId:
             raise HTTPException(status_code=400, detail='User ID is required')
 
-        save_keyword_details(userId, keywords)
+        await run_io(save_keyword_details, userId, keywords)
+        # Prefetch for the topics actually selected
+        speculator.start(userId)
         return JSONResponse(content={'status': 'success'})
     except Exception as e:
         print(f"Error in save_keywords: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/run/seo/{userId}")
-def run_seo(userId: str, data: UserData):
-    """Run the SEO process for the given user data.
+@app.post("/run/seo/{userId}", dependencies=[Depends(admission('seo'))])
+@profiled('seo')
+async def run_seo(userId: str, data: UserData):
+    """Run the SEO process for the given user data on the crew executor.
 
     Args:
         userId (str): Unique identifier for the user.
@@ -270,69 +564,46 @@ def run_seo(userId: str, data: UserData):
     try:
         institution_name = data.institution_name
         domain_url = data.domain_url
-        userId = "0d715b5b-c5b7-4919-961a-237d793267e1"
 
         if not userId:
             raise HTTPException(status_code=400, detail='User ID is required')
+        speculator.claim(userId)
 
-        # Start the SEO process in a separate thread
-        result = Thread(target=run_seo_crew, args=(userId, institution_name, domain_url))
-        result.start()
-        result.join()
-
-        crew_dir = Path('outputs') / userId / 'crew'
-
-        # List of markdown files to clean
-        markdown_files = [
-            ('2_ad_copies.md', 'ad'),
-            ('3_blog_post_outlines.md', 'outlines')
-        ]
-        for file_name, _ in markdown_files:
-            file_path = crew_dir / file_name
-            if file_path.exists():
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.readlines()
-                content = [line for line in content if line.strip() != '```markdown' and line.strip() != '```']
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.writelines(content)
-
-        # Serve the SEO markdown files
-        markdown_content = {}
-        markdown_files = {
-            'ad': crew_dir / '2_ad_copies.md',
-            'outlines': crew_dir / '3_blog_post_outlines.md'
-        }
-        for key, path in markdown_files.items():
-            if path.exists():
-                with open(path, 'r', encoding='utf-8') as f:
-                    markdown_content[key] = f.read()
-
-        # Convert the SEO markdown files to DOCX files
-        docx_files = {}
-        file_info = [
-            ('2_ad_copies.md', 'ad_copies.docx', 'ad'),
-            ('3_blog_post_outlines.md', 'blog_post_outlines.docx', 'outlines')
-        ]
-        for file_info in file_info:
-            md_file = crew_dir / file_info[0]
-            if md_file.exists():
-                print(f"Converting {md_file} to {file_info[1]}")
-                if convert_markdown_to_docx(md_file, file_info[1], userId):
-                    docx_files[file_info[2]] = file_info[1]
-            else:
-                print(f"Warning: {md_file} not found")
+        # Run the SEO crew in its own run namespace; its outputs are cleaned
+        # and saved as they are produced
+        async with pipeline_run_async(userId, 'seo', institution_name=institution_name, domain_url=domain_url) as run_id:
+            with deadline():
+                artifacts = await run_crew(run_seo_crew, userId, institution_name, domain_url, run_id)
+
+        markdown_content = {key: artifact['content'] for key, artifact in artifacts.items()}
+        sections = {key: artifact['metadata']['sections'] for key, artifact in artifacts.items()}
+
+        # DOCX files are rendered on demand by /download
+        docx_files = await run_io(available_docx_files, userId, {
+            'ad': 'ad_copies.docx',
+            'outlines': 'blog_post_outlines.docx'
+        }, run_id)
 
         return JSONResponse(content={
             'status': 'success',
+            'runId': run_id,
             'markdown': markdown_content,
+            'sections': sections,
             'docxFiles': docx_files
         })
+    except (CircuitOpen, DeadlineExceeded, ProviderBusy) as e:
+        print(f"Error in /run/seo: {str(e)}")
+        raise upstream_unavailable(e)
+    except BudgetExceeded as e:
+        print(f"Error in /run/seo: {str(e)}")
+        raise over_budget(e)
     except Exception as e:
         print(f"Error in /run/seo: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/generate-blog/{user_id}")
-def generate_blog_endpoint(user_id: str, data: OutlineData):
+@app.post("/generate-blog/{user_id}", dependencies=[Depends(admission('blog'))])
+@profiled('blog')
+async def generate_blog_endpoint(user_id: str, data: OutlineData):
     """Generate a blog post based on the provided outline.
 
     Args:
@@ -350,45 +621,84 @@ def generate_blog_endpoint(user_id: str, data: OutlineData):
         if not outline:
             raise HTTPException(status_code=400, detail="Empty outline")
 
-        # Create user-specific directories if they don't exist
-        user_dir = Path('outputs') / str(user_id)
-        blogs_dir = user_dir / 'blogs'
-        blogs_dir.mkdir(parents=True, exist_ok=True)
-
         print(f"Generating blog for user {user_id} with outline: {outline}")
 
-        # Generate blog using the provided outline
-        result = generate_blog(outline, user_id)
-
-        if result['status'] == 'success':
-            markdown_content = ""
-            blog_path = blogs_dir / 'blog_post.md'
-            if blog_path.exists():
-                with open(blog_path, 'r', encoding='utf-8') as f:
-                    markdown_content = f.read()
-
-            output_filename = 'blog_post.docx'
-            if blog_path.exists():
-                convert_markdown_to_docx(blog_path, output_filename, user_id)
-
-                return JSONResponse(content={
-                    'status': 'success',
-                    'message': 'Blog post generated successfully',
-                    'markdown': markdown_content,
-                    'docxFile': output_filename
-                })
-            else:
-                raise HTTPException(status_code=500, detail='Blog file not generated')
+        # Generate blog using the provided outline, in its own run namespace
+        # so concurrent blogs of one user do not overwrite each other
+        async with pipeline_run_async(user_id, 'blog', outline=outline[:200]) as run_id:
+            with deadline():
+                result = await generate_blog(outline, user_id, run_id)
+            if result['status'] != 'success':
+                raise HTTPException(status_code=500, detail=result.get('message', 'Failed to generate blog post'))
+
+        if await run_io(get_storage().exists, run_dir(user_id, run_id) / 'blogs' / 'blog_post.md'):
+            return JSONResponse(content={
+                'status': 'success',
+                'message': 'Blog post generated successfully',
+                'runId': run_id,
+                'markdown': result['content'],
+                'sections': result['metadata']['sections'],
+                'docxFile': 'blog_post.docx'
+            })
         else:
-            raise HTTPException(status_code=500, detail=result.get('message', 'Failed to generate blog post'))
+            raise HTTPException(status_code=500, detail='Blog file not generated')
+    except (CircuitOpen, DeadlineExceeded, ProviderBusy) as e:
+        print(f"Error in generate_blog_endpoint: {str(e)}")
+        raise upstream_unavailable(e)
+    except BudgetExceeded as e:
+        print(f"Error in generate_blog_endpoint: {str(e)}")
+        raise over_budget(e)
     except Exception as e:
         print(f"Error in generate_blog_endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/runs/{userId}")
+async def get_runs(userId: str):
+    """List a user's pipeline runs and the files each produced.
+
+    Args:
+        userId (str): Unique identifier for the user.
+
+    Returns:
+        JSONResponse: The user's runs, oldest first.
+    """
+    try:
+        return JSONResponse(content={'status': 'success', 'runs': await run_io(list_runs, userId)})
+    except Exception as e:
+        print(f"Error in get_runs: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/usage/{userId}")
+async def get_usage(userId: str, run_id: Optional[str] = None):
+    """Report a user's LLM token usage and cost per run, stage and model.
+
+    Args:
+        userId (str): Unique identifier for the user.
+        run_id (str): Only report this run.
+
+    Returns:
+        JSONResponse: Total and today's usage, usage per run (with its
+        stages) and per model, and the configured token budgets.
+    """
+    check_run_id(run_id)
+    try:
+        usage = await run_io(get_usage_ledger().summary, userId, run_id)
+        return JSONResponse(content={
+            'status': 'success',
+            'usage': usage,
+            'budgets': await run_io(budget_status, userId)
+        })
+    except Exception as e:
+        print(f"Error in get_usage: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.delete("/cleanup/{user_id}")
-def cleanup_user_data(user_id: str):
+async def cleanup_user_data(user_id: str):
     """Clean up all data associated with the specified user.
 
+    The user's directory is moved out of ``outputs/`` straight away and
+    deleted in the background, so the request does not wait for the disk.
+
     Args:
         user_id (str): Unique identifier for the user.
 
@@ -397,17 +707,8 @@ def cleanup_user_data(user_id: str):
     """
     try:
         print(f"Cleaning up user data for {user_id}")
-        user_dir = Path('outputs') / str(user_id)
-        if user_dir.exists():
-            try:
-                shutil.rmtree(user_dir)
-                print(f"Successfully deleted directory: {user_dir}")
-            except PermissionError as pe:
-                print(f"Permission error while deleting: {pe}")
-                os.system(f'rm -rf "{user_dir}"')
-            except Exception as e:
-                print(f"Error while deleting directory: {e}")
-                raise
+        await run_io(discard_user_directory, user_id)
+        forget_user(user_id)
 
         print(f"User data cleaned up successfully for {user_id}")
         return JSONResponse(content={
@@ -418,8 +719,100 @@ def cleanup_user_data(user_id: str):
         print(f"Error in cleanup_user_data: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.on_event("startup")
+def startup():
+    """Start background services."""
+    start_global_sampler()
+    # Users evicted by the janitor's thread are forgotten on the event loop
+    loop = asyncio.get_running_loop()
+    janitor.on_evict = lambda user_id: loop.call_soon_threadsafe(forget_user, user_id)
+    janitor.start()
+    refresher.start()
+    warm_render_pool()
+    warm_crew_templates()
+
+@app.on_event("shutdown")
+def shutdown():
+    """Stop background workers when the server shuts down."""
+    shutdown_render_pool()
+    speculator.discard_all()
+    shutdown_executors()
+    stop_global_sampler()
+    janitor.stop()
+    refresher.stop()
+
+@app.get("/debug/profile")
+async def sampled_profile(reset: bool = False):
+    """Return the always-on sampler's aggregated stacks.
+
+    Only available when the server runs with ``PROFILE_SAMPLER`` enabled.
+
+    Args:
+        reset (bool): Clear the aggregate after reading it.
+
+    Returns:
+        PlainTextResponse: Collapsed stacks, one ``stack count`` per line.
+    """
+    profile = global_profile(reset=reset)
+    if profile is None:
+        raise HTTPException(status_code=404, detail='Sampling profiler is not enabled')
+    return PlainTextResponse(profile)
+
+@app.get("/admission")
+async def admission_load():
+    """Report running and queued pipeline requests per endpoint.
+
+    Returns:
+        JSONResponse: Limit, active, queued and queue size per endpoint,
+        and users whose SEO stage is being prepared speculatively.
+    """
+    return JSONResponse(content={
+        'status': 'success',
+        'pools': admission_status(),
+        'speculation': speculator.status()
+    })
+
+@app.get("/routing")
+async def routing_status():
+    """Report rolling LLM latency and error rates per model.
+
+    Returns:
+        JSONResponse: Whether routing and hedging are on, samples, error
+        rate and p50/p95 latency per model, and each upstream's circuit state.
+    """
+    return JSONResponse(content={
+        'status': 'success',
+        'routing': model_router.enabled,
+        'hedge_percentile': model_router.hedge_percentile,
+        'models': model_router.status(),
+        'circuits': breaker_status()
+    })
+
+@app.get("/refresh")
+async def refresh_status():
+    """Report the tracked institutions and when each was last refreshed.
+
+    Returns:
+        JSONResponse: Whether the scheduler is on, its hours, and the last
+        SpyFu and analysis refresh per institution.
+    """
+    try:
+        return JSONResponse(content={'status': 'success', **await run_io(refresher.status)})
+    except Exception as e:
+        print(f"Error in refresh_status: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/metrics")
+async def metrics():
+    """Expose latency, token and I/O metrics in the Prometheus text format.
+
+    Returns:
+        PlainTextResponse: The metrics exposition.
+    """
+    return PlainTextResponse(render_metrics(), media_type='text/plain; version=0.0.4')
+
 @app.get("/")
-def index():
+async def index():
     """Index endpoint to check API status.
 
     Returns:
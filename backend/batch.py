@@ -0,0 +1,259 @@
+"""Run the SEO pipeline for many institutions at once.
+
+Reads a CSV or JSONL file with one institution per row
+(``institution_name``, ``domain_url`` and optional ``keywords``) and, for
+each row, fetches SpyFu data and runs the analysis crew, saves the keyword
+selection and runs the SEO crew. Rows run in parallel worker processes
+that share the provider call limits. Progress is checkpointed per row and
+stage, so running the same command again resumes an interrupted batch.
+Run from the backend directory:
+
+    python main.py institutions.csv --workers 4
+
+CSV keywords are separated by ``;``. Rows without keywords get the
+competitors' highest-volume keywords.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import multiprocessing
+import argparse
+import hashlib
+import json
+import time
+import uuid
+import csv
+import os
+
+ROW_STAGES = ('analysis', 'keywords', 'seo')
+
+def read_rows(path):
+    """Read institutions from a CSV or JSONL file.
+
+    Returns:
+        list: One dict per row with ``institution_name``, ``domain_url``,
+        ``keywords`` (list) and optional ``user_id``.
+
+    Raises:
+        ValueError: If a row lacks a name or domain.
+    """
+    path = Path(path)
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.suffix.lower() in ('.jsonl', '.ndjson'):
+            records = [json.loads(line) for line in f if line.strip()]
+        else:
+            records = list(csv.DictReader(f))
+
+    rows = []
+    for number, record in enumerate(records, 1):
+        keywords = record.get('keywords') or []
+        if isinstance(keywords, str):
+            keywords = keywords.split(';')
+        row = {
+            'institution_name': (record.get('institution_name') or '').strip(),
+            'domain_url': (record.get('domain_url') or '').strip(),
+            'keywords': [keyword.strip() for keyword in keywords if keyword.strip()],
+            'user_id': (record.get('user_id') or '').strip() or None
+        }
+        if not row['institution_name'] or not row['domain_url']:
+            raise ValueError(f'Row {number} of {path} needs institution_name and domain_url')
+        rows.append(row)
+    return rows
+
+def row_key(row):
+    """Stable identifier of a row across runs of the same batch."""
+    text = f"{row['institution_name']}|{row['domain_url']}".lower()
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+def _write_json(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    tmp_path.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding='utf-8')
+    os.replace(tmp_path, path)
+
+class Checkpoint:
+    """Per-row progress files of a batch, in ``<state_dir>/rows``.
+
+    Each worker only writes the files of its own rows, so no locking is
+    needed between processes.
+    """
+
+    def __init__(self, state_dir):
+        self.rows_dir = Path(state_dir) / 'rows'
+
+    def load(self, key):
+        try:
+            return json.loads((self.rows_dir / f'{key}.json').read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return None
+
+    def save(self, key, state):
+        _write_json(self.rows_dir / f'{key}.json', state)
+
+def top_keywords(user_id, count):
+    """The competitors' highest-volume keywords of a user's SpyFu data."""
+    from storage import get_storage
+    rankings = json.loads(get_storage().read_text(f'outputs/{user_id}/data/competitor_rankings.json'))
+    volumes = {}
+    for data in rankings.values():
+        for result in data.get('results', []):
+            if result.get('keyword'):
+                volumes[result['keyword']] = max(volumes.get(result['keyword'], 0), result.get('searchVolume') or 0)
+    return sorted(volumes, key=lambda keyword: -volumes[keyword])[:count]
+
+def run_row(row, state_dir, keyword_count):
+    """Run the pipeline for one row, skipping stages already checkpointed.
+
+    Runs in a worker process.
+
+    Args:
+        row (dict): A row from ``read_rows``.
+        state_dir (Path): The batch's state directory.
+        keyword_count (int): Keywords to select when the row has none.
+
+    Returns:
+        dict: The row's final state, with per-stage timings and run IDs.
+    """
+    from main import run_analysis_crew, run_seo_crew, write_keyword_details
+    from resilience import deadline
+    from runs import pipeline_run
+
+    checkpoint = Checkpoint(state_dir)
+    key = row_key(row)
+    state = checkpoint.load(key) or {
+        'key': key,
+        'institution_name': row['institution_name'],
+        'domain_url': row['domain_url'],
+        # Derived from the row key so a resumed row finds its earlier outputs,
+        # and rows sharing a domain (e.g. two campuses) do not share a directory
+        'user_id': row['user_id'] or str(uuid.uuid5(uuid.NAMESPACE_URL, f'batch-row:{key}')),
+        'stages': {}
+    }
+    state.update(status='running', error=None)
+    user_id = state['user_id']
+    institution_name, domain_url = row['institution_name'], row['domain_url']
+
+    try:
+        for stage in ROW_STAGES:
+            if stage in state['stages']:
+                continue
+            start = time.perf_counter()
+            result = {}
+            if stage == 'analysis':
+                with pipeline_run(user_id, 'analysis', institution_name=institution_name, domain_url=domain_url) as run_id, deadline():
+                    run_analysis_crew(user_id, institution_name, domain_url, Path('outputs') / user_id, run_id)
+                result['run_id'] = run_id
+            elif stage == 'keywords':
+                keywords = row['keywords'] or top_keywords(user_id, keyword_count)
+                # Raises, so a failed save is retried on resume rather than checkpointed
+                write_keyword_details(user_id, keywords)
+                result['keywords'] = keywords
+            else:
+                with pipeline_run(user_id, 'seo', institution_name=institution_name, domain_url=domain_url) as run_id, deadline():
+                    run_seo_crew(user_id, institution_name, domain_url, run_id)
+                result['run_id'] = run_id
+            state['stages'][stage] = {'seconds': round(time.perf_counter() - start, 3), **result}
+            checkpoint.save(key, state)
+        state['status'] = 'success'
+    except Exception as e:
+        print(f"Error running batch row {row['institution_name']}: {str(e)}")
+        state.update(status='error', error=str(e))
+    checkpoint.save(key, state)
+    return state
+
+def _init_worker(provider_slots, workdir):
+    """Share the parent's provider semaphores with this worker process."""
+    from admission import share_provider_limits
+    os.chdir(workdir)
+    share_provider_limits(provider_slots)
+
+def run_batch(rows, state_dir, workers=2, keyword_count=5):
+    """Run rows across worker processes, resuming from their checkpoints.
+
+    Args:
+        rows (list): Rows from ``read_rows``.
+        state_dir (Path): Where checkpoints and the report are written.
+        workers (int): Rows processed at once.
+        keyword_count (int): Keywords to select for rows without any.
+
+    Returns:
+        list: Final state per row, in input order.
+    """
+    from admission import PROVIDER_LIMITS
+
+    checkpoint = Checkpoint(state_dir)
+    states = {}
+    pending = []
+    for row in rows:
+        state = checkpoint.load(row_key(row))
+        if state and state.get('status') == 'success':
+            states[row_key(row)] = state
+        else:
+            pending.append(row)
+    print(f"{len(rows) - len(pending)} of {len(rows)} rows already done, running {len(pending)}")
+
+    # Spawned workers import the crews afresh instead of inheriting this
+    # process's threads; the semaphores are passed on at startup
+    context = multiprocessing.get_context('spawn')
+    provider_slots = {name: context.BoundedSemaphore(max(limit, 1)) for name, limit in PROVIDER_LIMITS.items()}
+    with ProcessPoolExecutor(
+        max_workers=max(workers, 1), mp_context=context,
+        initializer=_init_worker, initargs=(provider_slots, os.getcwd())
+    ) as pool:
+        futures = {pool.submit(run_row, row, state_dir, keyword_count): row for row in pending}
+        for future in as_completed(futures):
+            row = futures[future]
+            try:
+                state = future.result()
+            except Exception as e:
+                # The worker died; the row resumes from its last checkpoint next time
+                state = {**(checkpoint.load(row_key(row)) or {}), 'status': 'error', 'error': str(e)}
+            states[row_key(row)] = state
+            print(f"[{len(states)}/{len(rows)}] {row['institution_name']}: {state['status']}")
+
+    return [states[row_key(row)] for row in rows]
+
+def write_report(states, state_dir, wall_seconds):
+    """Print per-row stage timings and save them as ``report.json`` and ``report.csv``.
+
+    Returns:
+        dict: The report.
+    """
+    print(f"\n{'institution':<40} {'status':<8} " + ' '.join(f'{stage + " s":>10}' for stage in ROW_STAGES))
+    lines = []
+    for state in states:
+        seconds = [state.get('stages', {}).get(stage, {}).get('seconds') for stage in ROW_STAGES]
+        lines.append([state.get('institution_name'), state.get('domain_url'), state.get('user_id'),
+                      state.get('status'), *seconds, state.get('error') or ''])
+        print(f"{state.get('institution_name', '')[:40]:<40} {state.get('status', ''):<8} "
+              + ' '.join(f'{value:>10.1f}' if value is not None else f'{"-":>10}' for value in seconds))
+
+    completed = sum(state.get('status') == 'success' for state in states)
+    print(f"\n{completed}/{len(states)} rows completed in {wall_seconds:.1f}s")
+
+    report = {'rows': states, 'completed': completed, 'failed': len(states) - completed, 'wall_seconds': wall_seconds}
+    _write_json(Path(state_dir) / 'report.json', report)
+    with open(Path(state_dir) / 'report.csv', 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['institution_name', 'domain_url', 'user_id', 'status',
+                         *(f'{stage}_seconds' for stage in ROW_STAGES), 'error'])
+        writer.writerows(lines)
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('input', type=Path, help='CSV or JSONL file of institutions')
+    parser.add_argument('--workers', type=int, default=2, help='Rows processed at once')
+    parser.add_argument('--keywords', type=int, default=5, help='Keywords to select for rows without any')
+    parser.add_argument('--state-dir', type=Path, help='Checkpoints and report (default: batches/<input name>)')
+    args = parser.parse_args(argv)
+
+    rows = read_rows(args.input)
+    state_dir = args.state_dir or Path('batches') / args.input.stem
+    start = time.perf_counter()
+    states = run_batch(rows, state_dir, args.workers, args.keywords)
+    report = write_report(states, state_dir, time.perf_counter() - start)
+    print(f"Report written to {state_dir / 'report.json'}")
+    return 0 if not report['failed'] else 1
+
+if __name__ == '__main__':
+    raise SystemExit(main())
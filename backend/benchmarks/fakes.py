@@ -0,0 +1,217 @@
+"""Deterministic offline stand-ins for the LLM providers used by the backend.
+
+``install_fakes`` patches ``litellm.completion``, the google-genai client
+used by ``blog_writer`` and the website search tool of the SEO crew, so the
+full pipeline runs without network access. Responses have a configurable
+delay and length and depend only on the prompt and the seed.
+
+Install the fakes before importing the app: the provider limits, retries,
+circuit breakers, routing and token budgets that ``main`` wraps around
+crewai's LLM calls then run on top of them, as in production.
+"""
+from types import SimpleNamespace
+import functools
+import threading
+import asyncio
+import hashlib
+import random
+import time
+
+FILLER = (
+    'students', 'programme', 'placements', 'faculty', 'industry', 'campus', 'career',
+    'management', 'leadership', 'analytics', 'recruiters', 'curriculum', 'alumni',
+    'internship', 'research', 'global', 'exposure', 'learning', 'outcomes', 'growth'
+)
+
+class FakeModel:
+    """Generates canned markdown with simulated provider latency.
+
+    Args:
+        latency (float): Mean seconds per call.
+        jitter (float): Relative delay spread, e.g. 0.5 for ±50%.
+        words (int): Approximate words of body text per response.
+        seed (int): Seed for delays and generated text.
+    """
+
+    def __init__(self, latency=1.0, jitter=0.5, words=600, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.words = words
+        self.seed = seed
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _rng(self, prompt):
+        digest = hashlib.sha256(f'{self.seed}:{prompt}'.encode()).hexdigest()
+        return random.Random(int(digest[:16], 16))
+
+    def delay(self, prompt):
+        """Count a call and return its simulated latency in seconds."""
+        with self._lock:
+            self.calls += 1
+        return max(self.latency * self._rng(prompt).uniform(1 - self.jitter, 1 + self.jitter), 0)
+
+    def _prose(self, rng, words):
+        sentences = []
+        while words > 0:
+            length = min(words, rng.randint(8, 16))
+            sentence = ' '.join(rng.choice(FILLER) for _ in range(length))
+            sentences.append(sentence.capitalize() + '.')
+            words -= length
+        return ' '.join(sentences)
+
+    def _table(self, rng, rows):
+        lines = ['| Keyword | Top Ranked URL | Rank | Search Volume | Keyword Difficulty |', '|---|---|---|---|---|']
+        for index in range(rows):
+            keyword = ' '.join(rng.sample(FILLER, 3))
+            lines.append(
+                f'| {keyword} | [Link](https://example.edu/{index}) | {rng.randint(1, 100)} '
+                f'| {rng.randint(50, 3000)} | {rng.randint(1, 90)} |'
+            )
+        return '\n'.join(lines)
+
+    def markdown(self, prompt):
+        """Return a response shaped like the artifact the prompt asks for."""
+        rng = self._rng(prompt)
+        lowered = prompt.lower()
+        section_words = max(self.words // 5, 10)
+
+        if 'blog outline' in lowered and 'blog post outlines' in lowered:
+            parts = [
+                f'# Blog Outline {index + 1}: {" ".join(rng.sample(FILLER, 4)).title()}\n\n'
+                f'**Target Keyword**: {" ".join(rng.sample(FILLER, 3))}\n\n'
+                f'## Introduction\n{self._prose(rng, section_words // 2)}\n\n'
+                f'## Key Points\n- {self._prose(rng, 12)}\n- {self._prose(rng, 12)}\n'
+                for index in range(5)
+            ]
+            return '\n'.join(parts)
+        if 'ad cop' in lowered:
+            ads = []
+            for platform in ('Google Ads', 'Meta Ads'):
+                ads.append(f'## {platform} Copies')
+                for index in range(5):
+                    ads.append(
+                        f'### Variation {index + 1}\n- **Headline**: {" ".join(rng.sample(FILLER, 3)).title()}\n'
+                        f'- **Description**: {self._prose(rng, 12)}\n'
+                    )
+            return '# Ad Copies\n\n' + '\n'.join(ads) + f'\n## Best Practices\n{self._prose(rng, section_words)}\n'
+        if 'keyword' in lowered and 'competitor' in lowered:
+            sections = ['# SEO Keyword Performance Analysis', '## 1. Competitor Keyword Analysis']
+            for index in range(5):
+                sections.append(f'### Competitor {index + 1}\n{self._table(rng, 10)}\n\n{self._prose(rng, section_words // 5)}')
+            sections.append(f'## 2. User Keyword Analysis\n{self._table(rng, 10)}')
+            sections.append(f'## 3. Comparative Analysis\n{self._prose(rng, section_words)}')
+            sections.append(f'## 4. Strategic Recommendations\n{self._prose(rng, section_words)}')
+            return '\n\n'.join(sections) + '\n'
+        title = ' '.join(rng.sample(FILLER, 5)).title()
+        body = '\n\n'.join(
+            f'## {" ".join(rng.sample(FILLER, 3)).title()}\n{self._prose(rng, section_words)}' for _ in range(5)
+        )
+        return (
+            f'# {title}\n\n**Meta Description**: {self._prose(rng, 20)}\n'
+            f'**Target Keyword**: {" ".join(rng.sample(FILLER, 3))}\n**Word Count**: {self.words}\n\n{body}\n'
+        )
+
+    def complete(self, prompt):
+        """Sleep for the simulated latency and return a markdown response."""
+        text = self.markdown(prompt)
+        time.sleep(self.delay(prompt))
+        return text
+
+def _prompt_text(messages):
+    if isinstance(messages, str):
+        return messages
+    return '\n'.join(str(message.get('content', '')) for message in messages)
+
+def install_fake_llm(model):
+    """Answer every ``litellm.completion`` from ``model``.
+
+    The reply uses the ReAct final-answer form the crew agents parse. It
+    is passed to litellm as its ``mock_response``, with the simulated
+    latency and token usage, so litellm's callbacks, the LLM metrics and
+    the usage ledger see it like a provider's response.
+    """
+    import litellm
+    completion = litellm.completion
+    if getattr(completion, 'fake', False):
+        return
+
+    @functools.wraps(completion)
+    def fake_completion(*args, **kwargs):
+        prompt = _prompt_text(kwargs.get('messages') or (args[1] if len(args) > 1 else ''))
+        answer = f'Thought: I now know the final answer\nFinal Answer: {model.markdown(prompt)}'
+        prompt_tokens, completion_tokens = len(prompt.split()), len(answer.split())
+        kwargs['mock_delay'] = model.delay(prompt)
+        kwargs['mock_response'] = {
+            'model': kwargs.get('model') or args[0],
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': answer}}],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens
+            }
+        }
+        return completion(*args, **kwargs)
+
+    fake_completion.fake = True
+    litellm.completion = fake_completion
+
+def install_fake_genai(model):
+    """Replace the google-genai client used by ``blog_writer``."""
+    import blog_writer
+
+    class Models:
+        def generate_content(self, model_name=None, contents=None, config=None, **kwargs):
+            prompt = contents if isinstance(contents, str) else str(contents[-1])
+            text = model.complete(prompt)
+            return SimpleNamespace(
+                text=text,
+                candidates=[SimpleNamespace(
+                    content=SimpleNamespace(parts=[SimpleNamespace(text=text, executable_code=None)]),
+                    finish_reason='STOP',
+                    grounding_metadata=None
+                )],
+                usage_metadata=SimpleNamespace(
+                    prompt_token_count=len(prompt.split()),
+                    candidates_token_count=len(text.split())
+                )
+            )
+
+    class AsyncModels:
+        async def generate_content(self, model_name=None, contents=None, config=None, **kwargs):
+            # Like google-genai 0.3, which runs its sync request on a thread
+            return await asyncio.to_thread(Models().generate_content, model_name, contents, config, **kwargs)
+
+    class Client:
+        def __init__(self, *args, **kwargs):
+            self.models = Models()
+            self.aio = SimpleNamespace(models=AsyncModels())
+
+    blog_writer.genai.Client = Client
+
+def install_fake_website_search():
+    """Replace the SEO crew's website search tool, which embeds pages on creation."""
+    from crewai.tools import BaseTool
+    import seo_crew
+
+    class FakeWebsiteSearchTool(BaseTool):
+        name: str = "Search a specific website's content"
+        description: str = "Semantic search over a website (offline stand-in)."
+        website: str = ''
+
+        def _run(self, search_query: str = '', **kwargs) -> str:
+            return f'Relevant content from {self.website} about {search_query}.'
+
+    seo_crew.WebsiteSearchTool = FakeWebsiteSearchTool
+
+def install_fakes(latency=1.0, jitter=0.5, words=600, seed=0):
+    """Install all offline provider fakes; call before importing the app.
+
+    Returns:
+        FakeModel: The shared model, whose ``calls`` counts LLM requests.
+    """
+    model = FakeModel(latency, jitter, words, seed)
+    install_fake_llm(model)
+    install_fake_genai(model)
+    install_fake_website_search()
+    return model
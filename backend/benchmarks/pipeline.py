@@ -0,0 +1,215 @@
+"""Offline end-to-end benchmark of the API pipeline.
+
+Starts the SpyFu stand-in, installs the fake LLM providers, serves the
+FastAPI app with uvicorn in-process and drives virtual users through
+analysis -> keywords -> SEO -> blog (-> download) at a given concurrency.
+Reports p50/p95 latency and throughput per stage. Run from the backend
+directory:
+
+    python -m benchmarks.pipeline --users 8 --concurrency 4 --llm-latency 0.5
+
+With ``--replay`` the SpyFu and LLM calls are served from a cassette
+recorded with ``CASSETTE_MODE=record`` instead, keeping real payloads and
+(scaled) timing:
+
+    python -m benchmarks.pipeline --replay cassettes/session.jsonl --users 100 --concurrency 50
+"""
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+from threading import Thread
+from pathlib import Path
+import argparse
+import tempfile
+import socket
+import json
+import time
+import uuid
+import sys
+import os
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+STAGES = ('analysis', 'keywords', 'save_keywords', 'seo', 'blog', 'download')
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(values)
+    index = max(int(round(fraction * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+class Client:
+    """Minimal JSON client for the API under test."""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url
+        self.timeout = timeout
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = Request(
+            self.base_url + path, data=data, method=method,
+            headers={'Content-Type': 'application/json', 'Accept': 'application/json'}
+        )
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                payload = response.read()
+        except HTTPError as e:
+            raise RuntimeError(f'{method} {path} -> {e.code}: {e.read()[:200]!r}') from None
+        if response.headers.get_content_type() == 'application/json':
+            return json.loads(payload)
+        return payload
+
+def run_user(client, index, keywords_per_user, download, institution_name=None, domain_url=None):
+    """Drive one virtual user through the pipeline.
+
+    Returns:
+        dict: ``stage -> seconds`` for completed stages, plus ``error``
+        when a stage failed.
+    """
+    timings = {}
+    user_id = str(uuid.uuid4())
+    institution = {
+        'institution_name': institution_name or f'Benchmark Institute {index}',
+        'domain_url': domain_url or f'bench{index}.edu.in'
+    }
+
+    def timed(stage, method, path, body=None):
+        start = time.perf_counter()
+        result = client.request(method, path, body)
+        timings[stage] = time.perf_counter() - start
+        return result
+
+    try:
+        timed('analysis', 'POST', '/run/analysis', {**institution, 'userId': user_id})
+        keywords = timed('keywords', 'GET', f'/keywords?userId={user_id}')['keywords']
+        selected = [keyword for domain in sorted(keywords) for keyword in keywords[domain]][:keywords_per_user]
+        timed('save_keywords', 'POST', f'/keywords/save/{user_id}', {'keywords': selected})
+        seo = timed('seo', 'POST', f'/run/seo/{user_id}', {**institution, 'userId': user_id})
+        outlines = [part for part in seo['markdown'].get('outlines', '').split('# Blog Outline') if part.strip()]
+        timed('blog', 'POST', f'/generate-blog/{user_id}', {'outline': outlines[0] if outlines else 'MBA admissions'})
+        if download:
+            timed('download', 'GET', f'/download/{user_id}/analysis.docx')
+    except Exception as e:
+        timings['error'] = str(e)
+    return timings
+
+def report(results, wall_seconds):
+    """Print per-stage latency percentiles and throughput."""
+    print(f"\n{'stage':<14} {'n':>4} {'p50 s':>8} {'p95 s':>8} {'mean s':>8} {'max s':>8} {'req/s':>8}")
+    summary = {}
+    for stage in STAGES:
+        values = [timing[stage] for timing in results if stage in timing]
+        if not values:
+            continue
+        summary[stage] = {
+            'n': len(values),
+            'p50': percentile(values, 0.5),
+            'p95': percentile(values, 0.95),
+            'mean': sum(values) / len(values),
+            'max': max(values),
+            'throughput': len(values) / wall_seconds
+        }
+        row = summary[stage]
+        print(
+            f"{stage:<14} {row['n']:>4} {row['p50']:>8.3f} {row['p95']:>8.3f} "
+            f"{row['mean']:>8.3f} {row['max']:>8.3f} {row['throughput']:>8.2f}"
+        )
+    errors = [timing['error'] for timing in results if 'error' in timing]
+    completed = len(results) - len(errors)
+    print(f"\n{completed}/{len(results)} users completed in {wall_seconds:.2f}s "
+          f"({completed / wall_seconds:.2f} pipelines/s)")
+    for error in errors[:5]:
+        print(f"  error: {error}")
+    return {'stages': summary, 'errors': errors, 'wall_seconds': wall_seconds}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=4, help='Virtual users (pipelines) to run')
+    parser.add_argument('--concurrency', type=int, default=2, help='Users in flight at once')
+    parser.add_argument('--keywords', type=int, default=5, help='Keywords each user selects')
+    parser.add_argument('--llm-latency', type=float, default=0.5, help='Mean fake LLM latency in seconds')
+    parser.add_argument('--llm-words', type=int, default=600, help='Approximate words per fake LLM response')
+    parser.add_argument('--spyfu-latency', type=float, default=0.2, help='Mean SpyFu stand-in latency in seconds')
+    parser.add_argument('--spyfu-results', type=int, default=10, help='Rows per SpyFu keyword response')
+    parser.add_argument('--spyfu-padding', type=int, default=0, help='Filler bytes per SpyFu keyword row')
+    parser.add_argument('--jitter', type=float, default=0.5, help='Relative latency spread of the fakes')
+    parser.add_argument('--download', action='store_true', help='Also time a DOCX download per user')
+    parser.add_argument('--replay', type=Path, help='Replay SpyFu and LLM calls from this cassette')
+    parser.add_argument('--replay-speed', type=float, default=1.0, help='Replay speed-up; 0 skips recorded delays')
+    parser.add_argument('--institution', help='Institution every user analyses, e.g. the recorded one')
+    parser.add_argument('--domain', help='Domain every user analyses, e.g. the recorded one')
+    parser.add_argument('--timeout', type=float, default=600)
+    parser.add_argument('--workdir', type=Path, help='Where outputs/ is written (default: a temp dir)')
+    parser.add_argument('--json', type=Path, help='Write the summary as JSON to this file')
+    args = parser.parse_args()
+
+    from benchmarks.spyfu_standin import SpyfuStandIn
+    standin = SpyfuStandIn(
+        latency=args.spyfu_latency, jitter=args.jitter,
+        results=args.spyfu_results, padding=args.spyfu_padding
+    ).start()
+
+    # Configure the app for offline use before it is imported
+    os.environ.setdefault('ALLOWED_ORIGINS', 'http://localhost')
+    os.environ['SPYFU_BASE_URL'] = standin.base_url
+    if args.replay:
+        os.environ['CASSETTE_MODE'] = 'replay'
+        os.environ['CASSETTE_PATH'] = str(args.replay.resolve())
+        os.environ['CASSETTE_SPEED'] = str(args.replay_speed)
+    for key in ('SPYFU_API_ID', 'SPYFU_SECRET_KEY', 'OPENAI_API_KEY', 'ANTHROPIC_API_KEY',
+                'GEMINI_API_KEY', 'SERPER_API_KEY'):
+        os.environ.setdefault(key, 'offline-benchmark')
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    import uvicorn
+    from benchmarks.fakes import FakeModel, install_fake_website_search, install_fakes
+
+    # The fakes go in before the app, beneath the wrappers main.py installs
+    if args.replay:
+        # The website search tool embeds pages when it is created, before any call can be replayed
+        model = FakeModel()
+        install_fake_website_search()
+    else:
+        model = install_fakes(args.llm_latency, args.jitter, args.llm_words)
+    from app import app
+
+    json_path = args.json.resolve() if args.json else None
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix='seo-bench-'))
+    workdir.mkdir(parents=True, exist_ok=True)
+    os.chdir(workdir)
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning'))
+    Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    client = Client(f'http://127.0.0.1:{port}', args.timeout)
+    print(f"Running {args.users} users at concurrency {args.concurrency} (outputs in {workdir})")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(
+            lambda index: run_user(client, index, args.keywords, args.download, args.institution, args.domain),
+            range(args.users)
+        ))
+    wall_seconds = time.perf_counter() - start
+
+    summary = report(results, wall_seconds)
+    summary.update({'llm_calls': model.calls, 'spyfu_requests': standin.requests, 'args': {
+        key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()
+    }})
+    print(f"Fake LLM calls: {model.calls}, SpyFu requests: {standin.requests}")
+    if json_path:
+        json_path.write_text(json.dumps(summary, indent=2), encoding='utf-8')
+
+    server.should_exit = True
+    standin.stop()
+
+if __name__ == '__main__':
+    main()
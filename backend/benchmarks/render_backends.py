@@ -0,0 +1,102 @@
+"""Compare DOCX rendering backends on real crew outputs.
+
+Each backend runs in a fresh process so import cost and peak RSS are
+measured in isolation. Run from the backend directory:
+
+    python -m benchmarks.render_backends --iterations 20
+    python -m benchmarks.render_backends outputs/<userId>/runs/<runId>/crew/1_analysis.md
+"""
+from pathlib import Path
+import multiprocessing
+import argparse
+import resource
+import tempfile
+import time
+import sys
+
+BACKENDS = ('spire', 'python-docx')
+
+def _default_inputs():
+    """Find the latest analysis and ad copy outputs of previous runs.
+
+    Looks in run namespaces, then in users' directories for outputs
+    written before runs were namespaced.
+    """
+    inputs = []
+    for name in ('1_analysis.md', '2_ad_copies.md'):
+        found = [*Path('outputs').glob(f'*/runs/*/crew/{name}'), *Path('outputs').glob(f'*/crew/{name}')]
+        inputs.extend(sorted(found, key=lambda path: -path.stat().st_mtime)[:1])
+    return inputs
+
+def _run_backend(backend, inputs, iterations, queue):
+    """Render every input ``iterations`` times and report timings."""
+    start = time.perf_counter()
+    if backend == 'spire':
+        from spire.doc import Document, FileFormat
+
+        def render(markdown_file, output_path):
+            doc = Document()
+            doc.LoadFromFile(str(markdown_file))
+            doc.SaveToFile(str(output_path), FileFormat.Docx2016)
+            doc.Dispose()
+    else:
+        from docx_renderer import render_markdown_to_docx as render
+    import_seconds = time.perf_counter() - start
+
+    per_file = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = Path(tmp) / 'out.docx'
+        for markdown_file in inputs:
+            timings = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                render(markdown_file, output_path)
+                timings.append(time.perf_counter() - start)
+            per_file[str(markdown_file)] = timings
+
+    # ru_maxrss is reported in KiB on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put({'import_seconds': import_seconds, 'per_file': per_file, 'peak_rss_mb': peak_rss_mb})
+
+def benchmark(backend, inputs, iterations):
+    """Benchmark one backend in a fresh spawned process.
+
+    Args:
+        backend (str): One of ``BACKENDS``.
+        inputs (list): Markdown files to render.
+        iterations (int): Renders per file.
+
+    Returns:
+        dict: Import time, per-file timings and peak RSS of the process.
+    """
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_run_backend, args=(backend, inputs, iterations, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('inputs', nargs='*', type=Path, help='Markdown files (default: latest crew outputs)')
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    args = parser.parse_args()
+
+    inputs = args.inputs or _default_inputs()
+    if not inputs:
+        sys.exit('No inputs given and no outputs/*/runs/*/crew/{1_analysis,2_ad_copies}.md found')
+
+    print(f"{'backend':<12} {'file':<24} {'mean ms':>9} {'docs/s':>8} {'import s':>9} {'peak MB':>8}")
+    for backend in args.backends:
+        result = benchmark(backend, inputs, args.iterations)
+        for markdown_file, timings in result['per_file'].items():
+            mean = sum(timings) / len(timings)
+            print(
+                f"{backend:<12} {Path(markdown_file).name:<24} {mean * 1000:>9.1f} "
+                f"{1 / mean:>8.1f} {result['import_seconds']:>9.2f} {result['peak_rss_mb']:>8.1f}"
+            )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""Local stand-in for the SpyFu endpoints used by SpyfuTool.
+
+Serves getTopCompetitors and getNewlyRankedKeywords with deterministic,
+domain-seeded data, a configurable response delay and payload size. Point
+the backend at it with ``SPYFU_BASE_URL=http://127.0.0.1:<port>``:
+
+    python -m benchmarks.spyfu_standin --port 8765 --latency 0.4 --results 50
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import threading
+import argparse
+import hashlib
+import random
+import json
+import time
+
+WORDS = (
+    'mba', 'pgdm', 'college', 'colleges', 'best', 'top', 'jaipur', 'lucknow', 'noida',
+    'indore', 'fees', 'placement', 'admission', 'ranking', 'business', 'school',
+    'management', 'executive', 'online', 'course', 'eligibility', 'cat', 'cutoff',
+    'scholarship', 'finance', 'marketing', 'hr', 'analytics', 'india', 'private'
+)
+
+def _rng(*parts):
+    seed = hashlib.sha256(':'.join(map(str, parts)).encode()).hexdigest()
+    return random.Random(int(seed[:16], 16))
+
+def top_competitors(domain, page_size):
+    """Build a getTopCompetitors response for a domain."""
+    rng = _rng('competitors', domain)
+    results = [
+        {
+            'domain': f'competitor{index}-{rng.randrange(10**6):06d}.edu.in',
+            'commonTerms': rng.randrange(10, 500),
+            'rank': index + 1
+        }
+        for index in range(page_size)
+    ]
+    return {'resultCount': len(results), 'results': results}
+
+def newly_ranked_keywords(domain, page_size, padding):
+    """Build a getNewlyRankedKeywords response for a domain.
+
+    Args:
+        domain (str): Queried domain; seeds the generated keywords.
+        page_size (int): Number of results.
+        padding (int): Bytes of filler per result, to model heavy payloads.
+    """
+    rng = _rng('rankings', domain)
+    results = []
+    for index in range(page_size):
+        keyword = ' '.join(rng.sample(WORDS, rng.randint(2, 4)))
+        results.append({
+            'keyword': keyword,
+            'topRankedUrl': f'https://{domain}/{keyword.replace(" ", "-")}',
+            'rank': rng.randint(1, 100),
+            'rankChange': rng.randint(-20, 20),
+            'searchVolume': rng.choice((50, 90, 140, 260, 480, 880, 1600, 2900)),
+            'keywordDifficulty': rng.randint(1, 90),
+            'seoClicks': rng.randint(0, 400),
+            'cpc': round(rng.uniform(0.1, 3.0), 2),
+            'serpFeatures': 'x' * padding
+        })
+    return {'resultCount': len(results), 'results': results}
+
+class SpyfuStandIn:
+    """A SpyFu API stand-in running on a background thread.
+
+    Args:
+        host (str): Interface to bind.
+        port (int): Port to bind; 0 picks a free port.
+        latency (float): Mean response delay in seconds.
+        jitter (float): Relative delay spread, e.g. 0.5 for ±50%.
+        results (int): Rows per keyword response.
+        competitors (int): Rows per competitor response.
+        padding (int): Filler bytes per keyword row.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.3, jitter=0.5,
+                 results=10, competitors=5, padding=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.results = results
+        self.competitors = competitors
+        self.padding = padding
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(0)
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _delay(self):
+        with self._lock:
+            self.requests += 1
+            spread = self._random.uniform(1 - self.jitter, 1 + self.jitter)
+        time.sleep(max(self.latency * spread, 0))
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                if url.path.endswith('/getTopCompetitors'):
+                    body = top_competitors(query.get('domain', ''), standin.competitors)
+                elif url.path.endswith('/getNewlyRankedKeywords'):
+                    body = newly_ranked_keywords(query.get('query', ''), standin.results, standin.padding)
+                else:
+                    self.send_error(404)
+                    return
+                standin._delay()
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """Serve requests on a daemon thread."""
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Shut the server down."""
+        self.server.shutdown()
+        self.server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.3)
+    parser.add_argument('--jitter', type=float, default=0.5)
+    parser.add_argument('--results', type=int, default=10)
+    parser.add_argument('--competitors', type=int, default=5)
+    parser.add_argument('--padding', type=int, default=0)
+    args = parser.parse_args()
+
+    standin = SpyfuStandIn(
+        args.host, args.port, args.latency, args.jitter,
+        args.results, args.competitors, args.padding
+    )
+    print(f'SpyFu stand-in listening on {standin.base_url}')
+    try:
+        standin.server.serve_forever()
+    except KeyboardInterrupt:
+        standin.server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,26 @@
 from pathlib import Path
+import asyncio
 import json
+import time
 import os
 from dotenv import load_dotenv
+from postprocess import process_markdown, write_artifact
+from events import ProgressReporter
+from metrics import GEMINI_REQUEST_SECONDS, record_llm_usage
+from cassettes import genai_client
+from admission import provider_slot_async
+from executors import run_io
+from runs import run_dir
+from routing import model_router
+from resilience import LLM_TIMEOUT, CircuitOpen, DeadlineExceeded, ProviderBusy, resilient_call_async
+from usage import BudgetExceeded, budget_model, estimate_tokens, record_call, usage_scope
 from google import genai
 from google.genai.types import Tool, GenerateContentConfig, GoogleSearch
 
 load_dotenv()
 
+GEMINI_MODEL = 'gemini-2.0-flash-exp'
+
 def show_json(obj):
     print(json.dumps(obj.model_dump(exclude_none=True), indent=2))
 
@@ -17,25 +31,79 @@ def show_parts(r: genai.types.GenerateContentResponse, path: str, filename: str)
         print(f'{finish_reason=}')
         return
 
-    with open(path / filename, 'w', encoding='utf-8') as f:
-        for part in r.candidates[0].content.parts:
-            if part.text:
-                f.write(part.text)
-            elif part.executable_code:
-                f.write(f'```python\n{part.executable_code.code}\n```\n')
-            else:
-                f.write(show_json(part) + '\n')
-
-        # Write search metadata if available
-        grounding_metadata = r.candidates[0].grounding_metadata
-        if grounding_metadata and grounding_metadata.search_entry_point:
-            f.write("\n--- Search Results Used ---\n")
-            f.write(grounding_metadata.search_entry_point.rendered_content + '\n')
-
-def generate_blog(blog_outline, user_id):
-    """Generate a blog post from an outline using Gemini with Google Search"""
+    chunks = []
+    for part in r.candidates[0].content.parts:
+        if part.text:
+            chunks.append(part.text)
+        elif part.executable_code:
+            chunks.append(f'```python\n{part.executable_code.code}\n```\n')
+        else:
+            chunks.append(json.dumps(part.model_dump(exclude_none=True), indent=2) + '\n')
+
+    # Write search metadata if available
+    grounding_metadata = r.candidates[0].grounding_metadata
+    if grounding_metadata and grounding_metadata.search_entry_point:
+        chunks.append("\n--- Search Results Used ---\n")
+        chunks.append(grounding_metadata.search_entry_point.rendered_content + '\n')
+
+    write_artifact(path / filename, ''.join(chunks))
+
+async def record_usage(response, model, seconds):
+    """Add a Gemini response's token usage to the LLM token metrics and the usage ledger."""
+    usage = response.usage_metadata
+    if usage:
+        model = getattr(response, 'model_version', None) or model
+        record_llm_usage(model, usage.prompt_token_count, usage.candidates_token_count)
+        await run_io(record_call, model, usage.prompt_token_count, usage.candidates_token_count, seconds)
+
+async def generate_content(client, **kwargs):
+    """Call ``generate_content`` on the model the router picks for Gemini.
+
+    Uses the client's async API (``client.aio``). Each attempt is retried
+    on transient errors and abandoned after ``LLM_TIMEOUT``; the genai
+    client has no request timeout of its own. The call is checked against
+    the token budgets first and its usage is recorded in the ledger.
+
+    Raises:
+        BudgetExceeded: If the call would exceed a token budget.
+    """
+    config = kwargs.get('config')
+    tokens = estimate_tokens(kwargs.get('contents')) + (getattr(config, 'max_output_tokens', None) or 0)
+    requested = await run_io(budget_model, GEMINI_MODEL, tokens)
+
+    async def attempt(model):
+        async with provider_slot_async('gemini'):
+            return await client.aio.models.generate_content(model=model, **kwargs)
+
+    start = time.perf_counter()
+    response = await model_router.acall(
+        requested, lambda model: resilient_call_async('gemini', lambda timeout: attempt(model), LLM_TIMEOUT)
+    )
+    await record_usage(response, requested, time.perf_counter() - start)
+    return response
+
+async def generate_blog(blog_outline, user_id, run_id=None):
+    """Generate a blog post from an outline using Gemini with Google Search.
+
+    Outputs are saved in the run's namespace when a run ID is given, so
+    several blogs can be generated for one user at the same time. Runs on
+    the event loop; artifacts are written on the I/O executor. Errors
+    other than those raised are returned as an ``error`` status.
+
+    Raises:
+        BudgetExceeded: If a Gemini call would exceed a token budget.
+        CircuitOpen: If Gemini's circuit is open.
+        DeadlineExceeded: If the request's deadline passes.
+        ProviderBusy: If no Gemini call slot frees up in time.
+    """
+    with usage_scope(user_id, run_id, 'blog'):
+        return await _write_blog(blog_outline, user_id, run_id)
+
+async def _write_blog(blog_outline, user_id, run_id):
+    progress = ProgressReporter(user_id, 'blog', run_id)
+    progress.start()
     try:
-        client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+        client = genai_client(lambda: genai.Client(api_key=os.getenv("GEMINI_API_KEY")))
         google_search_tool = Tool(google_search=GoogleSearch())
 
         # First, perform a search to gather information
@@ -51,20 +119,22 @@ def generate_blog(blog_outline, user_id):
         """
 
         # Generate content with explicit search step
-        search_response = client.models.generate_content(
-            model='gemini-2.0-flash-exp',
-            contents=search_prompt,
-            config=GenerateContentConfig(
-                tools=[google_search_tool],
-                response_modalities=["TEXT"],
-                temperature=0.3,  # Lower temperature for factual search
+        progress.step('search_started')
+        with GEMINI_REQUEST_SECONDS.time(step='search'):
+            search_response = await generate_content(
+                client,
+                contents=search_prompt,
+                config=GenerateContentConfig(
+                    tools=[google_search_tool],
+                    response_modalities=["TEXT"],
+                    temperature=0.3,  # Lower temperature for factual search
+                )
             )
-        )
 
         # Save search results
-        output_dir = Path('outputs') / str(user_id) / 'blogs'
-        output_dir.mkdir(parents=True, exist_ok=True)
-        show_parts(search_response, output_dir, 'search_logs.md')
+        output_dir = (run_dir(user_id, run_id) if run_id else Path('outputs') / str(user_id)) / 'blogs'
+        await run_io(show_parts, search_response, output_dir, 'search_logs.md')
+        progress.step('search_finished')
 
         # Use the search results in the blog generation
         blog_prompt = """
@@ -102,38 +172,46 @@ def generate_blog(blog_outline, user_id):
         prompt = blog_prompt.format(outline=blog_outline)
 
         # Generate the final blog content
-        blog_response = client.models.generate_content(
-            model='gemini-2.0-flash-exp',
-            contents=[
-                search_response,  # Include search results
-                prompt            # Include blog prompt
-            ],
-            config=GenerateContentConfig(
-                response_modalities=["TEXT"],
-                temperature=0.7,
-                candidate_count=1,
-                max_output_tokens=4000,
+        progress.step('write_started')
+        with GEMINI_REQUEST_SECONDS.time(step='write'):
+            blog_response = await generate_content(
+                client,
+                contents=[
+                    search_response,  # Include search results
+                    prompt            # Include blog prompt
+                ],
+                config=GenerateContentConfig(
+                    response_modalities=["TEXT"],
+                    temperature=0.7,
+                    candidate_count=1,
+                    max_output_tokens=4000,
+                )
             )
-        )
 
-        show_parts(blog_response, output_dir, 'blog_logs.md')
-        blog_content = blog_response.text
+        await run_io(show_parts, blog_response, output_dir, 'blog_logs.md')
+        blog_content, metadata = process_markdown(blog_response.text)
 
         # Save the final blog content
         blog_path = output_dir / 'blog_post.md'
-        with open(blog_path, 'w', encoding='utf-8') as f:
-            f.write(blog_content)
+        await run_io(write_artifact, blog_path, blog_content)
 
         print(f"✓ Blog saved to: {blog_path}")
+        progress.finish(words=metadata.get('words'))
 
         return {
             'status': 'success',
             'message': 'Blog post generated successfully with Google Search integration',
-            'content': blog_content
+            'content': blog_content,
+            'metadata': metadata
         }
 
+    except (BudgetExceeded, CircuitOpen, DeadlineExceeded, ProviderBusy) as e:
+        print(f"Error generating blog: {str(e)}")
+        progress.fail(e)
+        raise
     except Exception as e:
         print(f"Error generating blog: {str(e)}")
+        progress.fail(e)
         return {
             'status': 'error',
             'message': str(e)
@@ -141,4 +219,4 @@ def generate_blog(blog_outline, user_id):
 
 if __name__ == "__main__":
     blog_outline = input("Enter the blog outline: ")
-    generate_blog(blog_outline, "0d715b5b-c5b7-4919-961a-237d793267e1")
+    asyncio.run(generate_blog(blog_outline, "0d715b5b-c5b7-4919-961a-237d793267e1"))
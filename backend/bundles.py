@@ -0,0 +1,170 @@
+from pathlib import Path
+from storage import get_storage
+from runs import list_runs, run_dir
+import hashlib
+import struct
+import zlib
+import time
+import re
+
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+def _dos_datetime(mtime):
+    """Convert a POSIX timestamp to the ZIP (DOS) date and time fields."""
+    t = time.localtime(max(mtime, 315532800))  # DOS time starts in 1980
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+def _crc32(path):
+    """Compute the CRC-32 of a file in constant memory."""
+    crc = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+def collect_artifacts(userId, documents, run_id=None):
+    """List the files that make up a user's bundle.
+
+    Args:
+        userId (str): Unique identifier for the user.
+        documents (dict): ``name -> {fmt: path}`` of rendered documents.
+        run_id (str): Include only this run's markdown; by default the
+            markdown of every run is included under ``markdown/<runId>/``.
+
+    Returns:
+        list: ``(archive_name, path)`` pairs in archive order.
+    """
+    artifacts = []
+    for name, paths in sorted(documents.items()):
+        for fmt, path in sorted(paths.items()):
+            artifacts.append((f'{name}.{fmt}', Path(path)))
+
+    if run_id:
+        sources = [('markdown', run_dir(userId, run_id))]
+    else:
+        sources = [('markdown', Path('outputs') / userId)] + [
+            (f"markdown/{entry['run_id']}", run_dir(userId, entry['run_id'])) for entry in list_runs(userId)
+        ]
+    storage = get_storage()
+    for prefix, base_dir in sources:
+        for folder in ('crew', 'blogs'):
+            for path in storage.list(base_dir / folder):
+                if path.suffix == '.md':
+                    artifacts.append((f'{prefix}/{folder}/{path.name}', storage.fetch(path)))
+    return artifacts
+
+class ZipBundle:
+    """A ZIP archive laid out up front so any byte range can be streamed.
+
+    Entries are stored uncompressed (DOCX is already deflated), and every
+    header is computed before streaming starts. The archive size is
+    therefore known, the bytes are deterministic for unchanged inputs, and
+    a resumed download can start at any offset without building the
+    preceding bytes. File contents are read from disk in chunks, so memory
+    use does not depend on bundle size.
+    """
+
+    def __init__(self, artifacts):
+        """Lay out the archive for the given files.
+
+        Args:
+            artifacts (list): ``(archive_name, path)`` pairs.
+        """
+        self.segments = []
+        central = []
+        offset = 0
+        fingerprint = hashlib.sha256()
+
+        for name, path in artifacts:
+            stat = path.stat()
+            if stat.st_size >= 0xFFFFFFFF:
+                raise ValueError(f"{name} is too large for a bundle")
+            encoded = name.encode('utf-8')
+            crc = _crc32(path)
+            dos_time, dos_date = _dos_datetime(stat.st_mtime)
+            fingerprint.update(f'{name}:{stat.st_size}:{crc}:{dos_time}:{dos_date}\n'.encode('utf-8'))
+
+            header = struct.pack(
+                '<IHHHHHIIIHH', 0x04034B50, 20, 0x0800, 0, dos_time, dos_date,
+                crc, stat.st_size, stat.st_size, len(encoded), 0
+            ) + encoded
+            central.append(struct.pack(
+                '<IHHHHHHIIIHHHHHII', 0x02014B50, 20, 20, 0x0800, 0, dos_time, dos_date,
+                crc, stat.st_size, stat.st_size, len(encoded), 0, 0, 0, 0, 0, offset
+            ) + encoded)
+
+            self.segments.append((offset, header, None, len(header)))
+            offset += len(header)
+            self.segments.append((offset, None, path, stat.st_size))
+            offset += stat.st_size
+
+        directory = b''.join(central)
+        end_record = struct.pack(
+            '<IHHHHIIH', 0x06054B50, 0, 0, len(central), len(central),
+            len(directory), offset, 0
+        )
+        self.segments.append((offset, directory + end_record, None, len(directory) + len(end_record)))
+        self.size = offset + len(directory) + len(end_record)
+        self.etag = fingerprint.hexdigest()
+
+    def iter_bytes(self, start=0, end=None):
+        """Yield the archive bytes in ``[start, end]`` in chunks.
+
+        Args:
+            start (int): First byte offset, inclusive.
+            end (int): Last byte offset, inclusive; defaults to the last byte.
+
+        Yields:
+            bytes: Consecutive chunks of the requested range.
+        """
+        end = self.size - 1 if end is None else end
+        for offset, data, path, length in self.segments:
+            seg_start = max(start, offset)
+            seg_end = min(end, offset + length - 1)
+            if seg_start > seg_end:
+                continue
+            if data is not None:
+                yield data[seg_start - offset:seg_end - offset + 1]
+                continue
+            remaining = seg_end - seg_start + 1
+            with open(path, 'rb') as f:
+                f.seek(seg_start - offset)
+                while remaining:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise IOError(f"{path} changed while streaming")
+                    remaining -= len(chunk)
+                    yield chunk
+
+def parse_range(range_header, size):
+    """Parse a single-range ``Range`` header.
+
+    Args:
+        range_header (str): Raw header value, may be None.
+        size (int): Total size of the representation.
+
+    Returns:
+        tuple: ``(start, end)`` inclusive offsets, None if the header is
+        absent or not a single byte range, or ``(None, None)`` if the range
+        is unsatisfiable.
+    """
+    if not range_header:
+        return None
+    match = RANGE_RE.match(range_header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return None, None
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return None, None
+    return start, end
@@ -0,0 +1,431 @@
+from collections import defaultdict
+from pathlib import Path
+import functools
+import threading
+import asyncio
+import hashlib
+import json
+import time
+import re
+import os
+
+from metrics import CASSETTE_REQUESTS
+
+# Capture upstream traffic ('record'), serve it back offline ('replay') or pass through ('')
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "").lower()
+CASSETTE_PATH = Path(os.getenv("CASSETTE_PATH", "cassettes/session.jsonl"))
+# Replay speed-up: 1 keeps the recorded timing, 10 is ten times faster, 0 answers immediately
+CASSETTE_SPEED = float(os.getenv("CASSETTE_SPEED", "1"))
+# Fail on unrecorded requests instead of serving the channel's recordings in turn
+CASSETTE_STRICT = os.getenv("CASSETTE_STRICT", "").lower() in ("1", "true", "yes")
+
+REDACTED = '[REDACTED]'
+SECRET_FIELDS = {'authorization', 'api_key', 'api-key', 'x-api-key', 'x-goog-api-key', 'password', 'secret_key'}
+# Values of environment variables with these suffixes are scrubbed from recordings
+SECRET_ENV_SUFFIXES = ('KEY', 'SECRET', 'TOKEN', 'PASSWORD')
+ID_PATTERN = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', re.IGNORECASE)
+
+class CassetteMiss(LookupError):
+    """Raised in strict replay when a request has no recording."""
+
+def _secret_values():
+    values = {
+        value for name, value in os.environ.items()
+        if name.upper().endswith(SECRET_ENV_SUFFIXES) and len(value) >= 8
+    }
+    return sorted(values, key=len, reverse=True)
+
+def redact(value, secrets=None):
+    """Remove credentials from a recorded request or response.
+
+    Fields with credential names are replaced, and the values of secret
+    environment variables (``*_KEY``, ``*_SECRET``, ...) are scrubbed from
+    every string.
+
+    Args:
+        value: JSON-compatible data.
+        secrets (list): Secret strings to scrub; defaults to the environment's.
+
+    Returns:
+        The redacted copy.
+    """
+    if secrets is None:
+        secrets = _secret_values()
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if str(key).lower() in SECRET_FIELDS else redact(item, secrets)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item, secrets) for item in value]
+    if isinstance(value, str):
+        for secret in secrets:
+            value = value.replace(secret, REDACTED)
+    return value
+
+def request_key(channel, request):
+    """Match key of a request.
+
+    User and run IDs are masked so a session recorded for one user replays
+    for any other.
+    """
+    text = ID_PATTERN.sub('<id>', json.dumps(request, sort_keys=True, default=str))
+    return hashlib.sha256(f'{channel}:{text}'.encode('utf-8')).hexdigest()
+
+class Cassette:
+    """A JSONL store of upstream request/response pairs.
+
+    Each line holds the channel (``spyfu``, ``llm``, ``tool``, ``genai``),
+    a route (endpoint, model or tool name), the redacted request and
+    response, and the original latency. Replay serves a request's
+    recordings in turn; requests that were never recorded get the route's
+    recordings in turn unless the cassette is strict, which lets a single
+    recorded session drive many concurrent users.
+
+    Args:
+        path (Path): JSONL file to append to or replay from.
+        mode (str): ``record`` or ``replay``.
+        speed (float): Replay speed-up; 0 disables the delays.
+        strict (bool): Raise ``CassetteMiss`` for unrecorded requests.
+    """
+
+    def __init__(self, path, mode, speed=1.0, strict=False):
+        self.path = Path(path)
+        self.mode = mode
+        self.speed = speed
+        self.strict = strict
+        self._lock = threading.Lock()
+        self._file = None
+        self._entries = defaultdict(list)
+        self._routes = defaultdict(list)
+        self._turns = defaultdict(int)
+        if mode == 'replay':
+            self._load()
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry['key']].append(entry)
+                    self._routes[(entry['channel'], entry['route'])].append(entry)
+        print(f"Replaying {sum(map(len, self._entries.values()))} recorded calls from {self.path}")
+
+    def _next(self, entries, turn_key):
+        with self._lock:
+            turn = self._turns[turn_key]
+            self._turns[turn_key] += 1
+        return entries[turn % len(entries)]
+
+    def record(self, channel, route, request, response, elapsed):
+        """Append one request/response pair, with credentials removed."""
+        secrets = _secret_values()
+        request = redact(request, secrets)
+        entry = {
+            'key': request_key(channel, request),
+            'channel': channel,
+            'route': route,
+            'request': request,
+            'response': redact(response, secrets),
+            'elapsed': round(elapsed, 4),
+            'recorded_at': time.time()
+        }
+        line = json.dumps(entry, ensure_ascii=False, default=str) + '\n'
+        with self._lock:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line)
+            self._file.flush()
+        CASSETTE_REQUESTS.inc(channel=channel, result='recorded')
+
+    def _lookup(self, channel, route, request):
+        """Find the recording to serve for a request.
+
+        Raises:
+            CassetteMiss: If nothing usable was recorded.
+        """
+        key = request_key(channel, redact(request))
+        if key in self._entries:
+            entry, result = self._next(self._entries[key], key), 'hit'
+        elif not self.strict and self._routes.get((channel, route)):
+            entry, result = self._next(self._routes[(channel, route)], (channel, route)), 'fallback'
+        else:
+            CASSETTE_REQUESTS.inc(channel=channel, result='miss')
+            raise CassetteMiss(f'No recording for {channel} call to {route}')
+        CASSETTE_REQUESTS.inc(channel=channel, result=result)
+        return entry
+
+    def _delay(self, entry):
+        return entry['elapsed'] / self.speed if self.speed > 0 else 0
+
+    def replay(self, channel, route, request):
+        """Return the recorded response for a request after its scaled delay.
+
+        Raises:
+            CassetteMiss: If nothing usable was recorded.
+        """
+        entry = self._lookup(channel, route, request)
+        time.sleep(self._delay(entry))
+        return entry['response']
+
+    def call(self, channel, route, request, live, encode=None, decode=None):
+        """Replay a call, or make it live and record it.
+
+        Args:
+            channel (str): Upstream the call goes to.
+            route (str): Endpoint, model or tool name, used for fallback matching.
+            request: JSON-compatible description of the call.
+            live (callable): Makes the real call.
+            encode (callable): Converts the live result to JSON-compatible data.
+            decode (callable): Rebuilds a result from recorded data.
+
+        Returns:
+            The live or replayed result.
+        """
+        if self.mode == 'replay':
+            response = self.replay(channel, route, request)
+            return decode(response) if decode else response
+
+        start = time.perf_counter()
+        result = live()
+        elapsed = time.perf_counter() - start
+        self.record(channel, route, request, encode(result) if encode else result, elapsed)
+        return result
+
+    async def acall(self, channel, route, request, live, encode=None, decode=None):
+        """``call`` for coroutines; ``live`` returns an awaitable.
+
+        Replay delays are awaited, so they do not block the event loop.
+        """
+        if self.mode == 'replay':
+            entry = self._lookup(channel, route, request)
+            await asyncio.sleep(self._delay(entry))
+            return decode(entry['response']) if decode else entry['response']
+
+        start = time.perf_counter()
+        result = await live()
+        elapsed = time.perf_counter() - start
+        self.record(channel, route, request, encode(result) if encode else result, elapsed)
+        return result
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+def get_cassette():
+    """Return the process cassette, or None when ``CASSETTE_MODE`` is unset."""
+    global _cassette
+    if CASSETTE_MODE not in ('record', 'replay'):
+        return None
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette(CASSETTE_PATH, CASSETTE_MODE, CASSETTE_SPEED, CASSETTE_STRICT)
+    return _cassette
+
+class _Response:
+    """The part of ``http.client.HTTPResponse`` SpyfuTool reads."""
+
+    def __init__(self, status, body, headers=None):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+    def read(self):
+        return self.body
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+def _encode_response(response):
+    return {'status': response.status, 'body': response.body.decode('utf-8', 'replace')}
+
+def _decode_response(data):
+    return _Response(data['status'], data['body'].encode('utf-8'))
+
+class CassetteConnection:
+    """Drop-in for an ``http.client`` connection that records or replays.
+
+    The real connection is only opened when a request goes live, so replay
+    needs no network access or credentials.
+
+    Args:
+        channel (str): Cassette channel of the upstream.
+        connect (callable): Opens the real connection.
+        cassette (Cassette): Where calls are recorded or replayed from.
+    """
+
+    def __init__(self, channel, connect, cassette):
+        self.channel = channel
+        self.connect = connect
+        self.cassette = cassette
+        self._connection = None
+        self._response = None
+
+    def request(self, method, url, body=None, headers=None):
+        def live():
+            self._connection = self.connect()
+            self._connection.request(method, url, body=body, headers=headers or {})
+            response = self._connection.getresponse()
+            return _Response(response.status, response.read())
+
+        self._response = self.cassette.call(
+            self.channel, url.split('?')[0], {'method': method, 'url': url, 'body': body}, live,
+            encode=_encode_response,
+            decode=_decode_response
+        )
+
+    def getresponse(self):
+        return self._response
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+
+def http_connection(channel, connect):
+    """Open an HTTP connection through the cassette when one is active.
+
+    Args:
+        channel (str): Cassette channel, e.g. ``spyfu``.
+        connect (callable): Opens the real ``http.client`` connection.
+    """
+    cassette = get_cassette()
+    if cassette is None:
+        return connect()
+    return CassetteConnection(channel, connect, cassette)
+
+async def http_request_async(channel, method, url, send):
+    """Make an async HTTP request through the cassette when one is active.
+
+    Recordings are shared with ``http_connection``, so a session recorded
+    through either replays through both.
+
+    Args:
+        channel (str): Cassette channel, e.g. ``spyfu``.
+        method (str): HTTP method.
+        url (str): Path and query string.
+        send (callable): Makes the real request; returns an awaitable of
+            ``(status, body, headers)``.
+
+    Returns:
+        A response with ``status``, ``read()`` and ``getheader()``.
+    """
+    async def live():
+        status, body, headers = await send()
+        return _Response(status, body, {name.lower(): value for name, value in headers.items()})
+
+    cassette = get_cassette()
+    if cassette is None:
+        return await live()
+    return await cassette.acall(
+        channel, url.split('?')[0], {'method': method, 'url': url, 'body': None}, live,
+        encode=_encode_response,
+        decode=_decode_response
+    )
+
+def record_tools(tools):
+    """Record or replay the results of crew tools, e.g. web searches.
+
+    Args:
+        tools (list): crewai tool instances.
+
+    Returns:
+        list: The same tools, wrapped when a cassette is active.
+    """
+    cassette = get_cassette()
+    if cassette is None:
+        return tools
+    for tool in tools:
+        run = tool._run
+
+        def recorded_run(*args, _run=run, _name=tool.name, **kwargs):
+            request = {'tool': _name, 'args': list(args), 'kwargs': kwargs}
+            return cassette.call('tool', _name, request, lambda: _run(*args, **kwargs))
+
+        # Set on the instance directly; pydantic would reject the assignment
+        object.__setattr__(tool, '_run', recorded_run)
+    return tools
+
+def _dump(value):
+    if hasattr(value, 'model_dump'):
+        return value.model_dump(mode='json', exclude_none=True)
+    if isinstance(value, (list, tuple)):
+        return [_dump(item) for item in value]
+    return value
+
+def _genai_request(model, contents, config):
+    return {'model': model, 'contents': _dump(contents), 'config': _dump(config)}
+
+def _genai_response(data):
+    from google.genai.types import GenerateContentResponse
+    return GenerateContentResponse.model_validate(data)
+
+class _GenaiModels:
+    def __init__(self, models, cassette):
+        self._models = models
+        self._cassette = cassette
+
+    def generate_content(self, model, contents, config=None, **kwargs):
+        return self._cassette.call(
+            'genai', model, _genai_request(model, contents, config),
+            lambda: self._models.generate_content(model=model, contents=contents, config=config, **kwargs),
+            encode=_dump,
+            decode=_genai_response
+        )
+
+class _AsyncGenaiModels(_GenaiModels):
+    async def generate_content(self, model, contents, config=None, **kwargs):
+        return await self._cassette.acall(
+            'genai', model, _genai_request(model, contents, config),
+            lambda: self._models.generate_content(model=model, contents=contents, config=config, **kwargs),
+            encode=_dump,
+            decode=_genai_response
+        )
+
+class _AsyncGenaiClient:
+    def __init__(self, client, cassette):
+        self.models = _AsyncGenaiModels(client.models if client is not None else None, cassette)
+
+class _GenaiClient:
+    def __init__(self, client, cassette):
+        self.models = _GenaiModels(client.models if client is not None else None, cassette)
+        self.aio = _AsyncGenaiClient(client.aio if client is not None else None, cassette)
+
+def genai_client(connect):
+    """Create a google-genai client whose ``generate_content`` calls are recorded or replayed.
+
+    Calls through ``client.aio`` are recorded to the same channel.
+
+    Args:
+        connect (callable): Creates the real client; not called in replay.
+    """
+    cassette = get_cassette()
+    if cassette is None:
+        return connect()
+    return _GenaiClient(connect() if cassette.mode == 'record' else None, cassette)
+
+def install_cassette():
+    """Route crewai ``LLM.call`` through the cassette when one is active."""
+    cassette = get_cassette()
+    if cassette is None:
+        return
+    from crewai import LLM
+    call = LLM.call
+    if getattr(call, 'recorded', False):
+        return
+
+    @functools.wraps(call)
+    def recorded_call(self, messages, *args, **kwargs):
+        return cassette.call(
+            'llm', self.model, {'model': self.model, 'messages': messages},
+            lambda: call(self, messages, *args, **kwargs)
+        )
+
+    recorded_call.recorded = True
+    LLM.call = recorded_call
+    print(f"Cassette {cassette.mode} mode: {cassette.path}")
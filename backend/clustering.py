@@ -0,0 +1,112 @@
+from collections import Counter
+import math
+import re
+import os
+
+# Cosine similarity at which a keyword joins a cluster's head term; raise
+# it towards 1 to merge only keywords that are nearly identical
+KEYWORD_CLUSTER_THRESHOLD = float(os.getenv("KEYWORD_CLUSTER_THRESHOLD", "0.6"))
+
+# Words that do not change what a searcher is looking for
+STOPWORDS = {
+    'a', 'an', 'and', 'at', 'best', 'for', 'from', 'good', 'in', 'is', 'me', 'near',
+    'of', 'on', 'or', 'the', 'to', 'top', 'what', 'which', 'with'
+}
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+def _stem(word):
+    """Fold common English plurals, e.g. colleges -> college."""
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+def normalize(keyword):
+    """Content words of a keyword, lowercased and singularised."""
+    words = [_stem(word) for word in TOKEN_RE.findall(keyword.lower())]
+    return [word for word in words if word not in STOPWORDS] or words
+
+def trigrams(text):
+    """Character trigrams of a string padded with spaces."""
+    padded = f'  {text} '
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+def _features(keyword):
+    """Word unigrams, word bigrams and character trigrams of a keyword."""
+    words = normalize(keyword)
+    features = Counter(f'w:{word}' for word in words)
+    features.update(f'b:{first} {second}' for first, second in zip(words, words[1:]))
+    # Trigrams catch spelling variants and compounds, weighted below words
+    for word in words:
+        for gram in trigrams(word):
+            features[f't:{gram}'] += 0.25
+    return features
+
+def _tfidf(documents):
+    """L2-normalised TF-IDF vectors of feature counters."""
+    frequency = Counter(feature for document in documents for feature in document)
+    total = len(documents)
+    vectors = []
+    for document in documents:
+        vector = {
+            feature: weight * (math.log((1 + total) / (1 + frequency[feature])) + 1)
+            for feature, weight in document.items()
+        }
+        norm = math.sqrt(sum(value * value for value in vector.values())) or 1.0
+        vectors.append({feature: value / norm for feature, value in vector.items()})
+    return vectors
+
+def _cosine(first, second):
+    if len(first) > len(second):
+        first, second = second, first
+    return sum(value * second.get(feature, 0.0) for feature, value in first.items())
+
+def cluster_keywords(details, threshold=KEYWORD_CLUSTER_THRESHOLD):
+    """Group keywords into topic clusters.
+
+    Keywords are visited from the highest search volume down. Each joins
+    the cluster whose head term it resembles most, if closely enough (TF-IDF
+    cosine over words, word pairs and character trigrams), or starts a new
+    cluster with itself as head. The head is therefore always the
+    cluster's highest-volume keyword.
+
+    Args:
+        details (dict): ``keyword -> SpyFu result row`` with ``searchVolume``.
+        threshold (float): Minimum similarity to a cluster's head.
+
+    Returns:
+        list: Clusters, highest total volume first, each with ``head``,
+        ``keywords`` and ``searchVolume`` (summed over its keywords).
+    """
+    keywords = sorted(details, key=lambda keyword: (-(details[keyword].get('searchVolume') or 0), keyword))
+    vectors = dict(zip(keywords, _tfidf([_features(keyword) for keyword in keywords])))
+
+    clusters = []
+    for keyword in keywords:
+        scored = [(_cosine(vectors[keyword], vectors[cluster['head']]), cluster) for cluster in clusters]
+        similarity, best = max(scored, key=lambda pair: pair[0], default=(0.0, None))
+        if best is not None and similarity >= threshold:
+            best['keywords'].append(keyword)
+        else:
+            clusters.append({'head': keyword, 'keywords': [keyword]})
+
+    for cluster in clusters:
+        cluster['searchVolume'] = sum(details[keyword].get('searchVolume') or 0 for keyword in cluster['keywords'])
+    return sorted(clusters, key=lambda cluster: -cluster['searchVolume'])
+
+def clustered_details(details, clusters):
+    """One entry per cluster for ``selected_keywords_details.json``.
+
+    Each entry is the head keyword's SpyFu row plus ``variants`` (the
+    cluster's other keywords) and ``clusterVolume``, so the SEO crew writes
+    one ad set and outline per topic instead of one per near-duplicate.
+    """
+    return {
+        cluster['head']: {
+            **details[cluster['head']],
+            'variants': cluster['keywords'][1:],
+            'clusterVolume': cluster['searchVolume']
+        }
+        for cluster in clusters
+    }
@@ -0,0 +1,186 @@
+from pathlib import Path
+import hashlib
+import asyncio
+
+from renderer import MEDIA_TYPES, RENDER_BACKEND, RENDER_FORMATS, render_async
+from executors import run_io
+from storage import get_storage
+from runs import resolve_artifact
+
+# Downloadable document names (without extension) mapped to the markdown
+# artifact they are rendered from, relative to the run's output directory.
+DOCUMENT_SOURCES = {
+    'analysis': Path('crew') / '1_analysis.md',
+    'ad_copies': Path('crew') / '2_ad_copies.md',
+    'blog_post_outlines': Path('crew') / '3_blog_post_outlines.md',
+    'blog_post': Path('blogs') / 'blog_post.md',
+}
+
+def markdown_digest(markdown_file, backend=RENDER_BACKEND):
+    """Compute the content hash used to key cached renders.
+
+    The render backend is hashed with the markdown, so switching
+    ``RENDER_BACKEND`` re-renders documents and changes their ETags.
+
+    Args:
+        markdown_file (Path): Path to the markdown source file.
+        backend (str): Render backend the cached files are produced with.
+
+    Returns:
+        str: Hex SHA-256 digest of the backend name and file contents.
+    """
+    digest = hashlib.sha256(f'{backend}\0'.encode())
+    with open(markdown_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def parse_document_name(filename):
+    """Split a download name into its source name and render format.
+
+    Args:
+        filename (str): Download name such as ``analysis.docx``.
+
+    Returns:
+        tuple: ``(name, fmt)``, or ``(None, None)`` if the name is not a
+        renderable document.
+    """
+    name, _, fmt = filename.rpartition('.')
+    if name in DOCUMENT_SOURCES and fmt in RENDER_FORMATS:
+        return name, fmt
+    return None, None
+
+def media_type_for(filename):
+    """Return the media type for a document download name."""
+    return MEDIA_TYPES.get(filename.rpartition('.')[2], 'application/octet-stream')
+
+def available_docx_files(userId, names, run_id=None):
+    """Map response keys to DOCX names whose markdown source exists.
+
+    Args:
+        userId (str): Unique identifier for the user.
+        names (dict): Response key -> DOCX download name.
+        run_id (str): Run to look in; by default the latest one.
+
+    Returns:
+        dict: The subset of ``names`` that can be downloaded.
+    """
+    docx_files = {}
+    for key, filename in names.items():
+        source = DOCUMENT_SOURCES[Path(filename).stem]
+        if resolve_artifact(userId, source, run_id):
+            docx_files[key] = filename
+        else:
+            print(f"Warning: {source} not found for user {userId}")
+    return docx_files
+
+def _cache_paths(userId, name, formats, run_id=None):
+    """Resolve the markdown source and cache destinations for a document.
+
+    Returns:
+        tuple: ``(md_file, digest, {fmt: cached_path})``, or ``(None, None,
+        None)`` if the markdown source does not exist.
+    """
+    base_dir = resolve_artifact(userId, DOCUMENT_SOURCES[name], run_id)
+    md_file = get_storage().fetch(base_dir / DOCUMENT_SOURCES[name]) if base_dir else None
+    if md_file is None:
+        return None, None, None
+
+    digest = markdown_digest(md_file)
+    cache_dir = base_dir / 'doc' / '.cache'
+    return md_file, digest, {fmt: cache_dir / f'{name}.{digest}.{fmt}' for fmt in formats}
+
+def _prune_stale(cached):
+    """Drop renders of earlier versions of the same artifact and format."""
+    for path in cached.values():
+        name, digest, fmt = path.name.split('.')
+        for stale in path.parent.glob(f'{name}.*.{fmt}'):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+
+async def get_cached_document(userId, filename, run_id=None):
+    """Return the render for a download name, converting on first use.
+
+    Renders are cached in the run's ``doc/.cache`` keyed by the hash of the
+    markdown source and render backend, so repeat downloads are served from
+    disk and a regenerated artifact is re-rendered automatically. Conversion
+    runs on the rendering pool, off the event loop.
+
+    Args:
+        userId (str): Unique identifier for the user.
+        filename (str): Download name, e.g. ``analysis.docx``.
+        run_id (str): Run to render from; by default the latest one that
+            produced the document.
+
+    Returns:
+        tuple: ``(path, digest)`` of the rendered file, or ``(None, None)``
+        if the source markdown does not exist or conversion failed.
+    """
+    name, fmt = parse_document_name(filename)
+    md_file, digest, cached = await run_io(_cache_paths, userId, name, [fmt], run_id)
+    if md_file is None:
+        return None, None
+    if await run_io(cached[fmt].exists):
+        return cached[fmt], digest
+
+    print(f"Converting {md_file} to {filename}")
+    if not await render_async(md_file, cached):
+        return None, None
+
+    await run_io(_prune_stale, cached)
+    return cached[fmt], digest
+
+def _missing_renders(userId, names, formats, run_id):
+    """Cached render paths per document and the renders still to produce."""
+    rendered = {}
+    jobs = []
+    for name in names:
+        md_file, _, cached = _cache_paths(userId, name, formats, run_id)
+        if md_file is None:
+            continue
+        missing = {fmt: path for fmt, path in cached.items() if not path.exists()}
+        rendered[name] = cached
+        if missing:
+            jobs.append((name, md_file, missing))
+    return rendered, jobs
+
+async def render_user_documents(userId, names, formats=('docx',), run_id=None):
+    """Render several of a user's documents in parallel on the pool.
+
+    Each markdown source is parsed once and saved in every requested
+    format. Documents already cached for their current content are skipped.
+
+    Args:
+        userId (str): Unique identifier for the user.
+        names (list): Document names from ``DOCUMENT_SOURCES``.
+        formats (tuple): Format extensions to produce for each document.
+        run_id (str): Run to render from; by default each document's latest.
+
+    Returns:
+        dict: ``name -> {fmt: path}`` for every document that rendered.
+    """
+    rendered, jobs = await run_io(_missing_renders, userId, names, formats, run_id)
+    results = await asyncio.gather(*(render_async(md_file, missing) for _, md_file, missing in jobs))
+    for (name, _, missing), result in zip(jobs, results):
+        if result is None:
+            rendered.pop(name)
+        else:
+            await run_io(_prune_stale, missing)
+    return rendered
+
+def etag_matches(if_none_match, digest):
+    """Check an ``If-None-Match`` header against a document digest.
+
+    Args:
+        if_none_match (str): Raw header value, may be None.
+        digest (str): Digest of the current representation.
+
+    Returns:
+        bool: True if the client's cached copy is still current.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    tags = [tag.strip().removeprefix('W/').strip('"') for tag in if_none_match.split(',')]
+    return digest in tags
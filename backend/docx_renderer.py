@@ -0,0 +1,260 @@
+from docx import Document
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+import re
+
+HEADING_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+RULE_RE = re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$')
+LIST_RE = re.compile(r'^(\s*)([-*+]|\d+[.)])\s+(.*)$')
+TABLE_SEPARATOR_RE = re.compile(r'^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$')
+FENCE_RE = re.compile(r'^\s*(```|~~~)')
+INLINE_RE = re.compile(
+    r'(?P<code>`[^`]+`)'
+    r'|\[(?P<link_text>[^\]]+)\]\((?P<link_url>[^)\s]+)(?:\s+"[^"]*")?\)'
+    r'|\*\*(?P<bold>.+?)\*\*|__(?P<bold_alt>.+?)__'
+    r'|\*(?P<italic>[^*\s](?:.*?[^*\s])?)\*|(?<!\w)_(?P<italic_alt>[^_\s](?:.*?[^_\s])?)_(?!\w)'
+)
+
+def parse_inline(text, bold=False, italic=False):
+    """Parse inline markdown into styled spans.
+
+    Args:
+        text (str): Inline markdown text.
+        bold (bool): Whether the enclosing span is bold.
+        italic (bool): Whether the enclosing span is italic.
+
+    Returns:
+        list: ``(text, bold, italic, code, url)`` spans in order.
+    """
+    spans = []
+    pos = 0
+    for match in INLINE_RE.finditer(text):
+        if match.start() > pos:
+            spans.append((text[pos:match.start()], bold, italic, False, None))
+        if match.group('code'):
+            spans.append((match.group('code')[1:-1], bold, italic, True, None))
+        elif match.group('link_text'):
+            for span in parse_inline(match.group('link_text'), bold, italic):
+                spans.append(span[:4] + (match.group('link_url'),))
+        elif match.group('bold') or match.group('bold_alt'):
+            spans.extend(parse_inline(match.group('bold') or match.group('bold_alt'), True, italic))
+        else:
+            spans.extend(parse_inline(match.group('italic') or match.group('italic_alt'), bold, True))
+        pos = match.end()
+    if pos < len(text):
+        spans.append((text[pos:], bold, italic, False, None))
+    return spans
+
+def _split_row(line):
+    """Split a markdown table row into stripped cell texts."""
+    line = line.strip()
+    if line.startswith('|'):
+        line = line[1:]
+    if line.endswith('|'):
+        line = line[:-1]
+    return [cell.strip() for cell in re.split(r'(?<!\\)\|', line)]
+
+def iter_blocks(lines):
+    """Stream block-level markdown nodes from an iterable of lines.
+
+    Nodes are tuples whose first element names the kind:
+    ``('heading', level, spans)``, ``('paragraph', spans)``,
+    ``('list_item', ordered, level, spans)``, ``('quote', spans)``,
+    ``('table', header, rows)``, ``('code', text)`` and ``('rule',)``.
+
+    Args:
+        lines (iterable): Markdown source lines.
+
+    Yields:
+        tuple: The next block node.
+    """
+    paragraph = []
+    table = None
+    code = None
+    pending = None
+
+    def flush_paragraph():
+        if paragraph:
+            text = ' '.join(line.strip() for line in paragraph)
+            paragraph.clear()
+            return ('paragraph', parse_inline(text))
+        return None
+
+    for raw in lines:
+        line = raw.rstrip('\r\n')
+
+        if code is not None:
+            if FENCE_RE.match(line):
+                yield ('code', '\n'.join(code))
+                code = None
+            else:
+                code.append(line)
+            continue
+
+        if table is not None:
+            if line.strip().startswith('|'):
+                table[1].append([parse_inline(cell) for cell in _split_row(line)])
+                continue
+            yield ('table', table[0], table[1])
+            table = None
+
+        # A row followed by a separator line starts a table
+        if pending is not None:
+            if TABLE_SEPARATOR_RE.match(line):
+                block = flush_paragraph()
+                if block:
+                    yield block
+                table = ([parse_inline(cell) for cell in _split_row(pending)], [])
+                pending = None
+                continue
+            paragraph.append(pending)
+            pending = None
+
+        if FENCE_RE.match(line):
+            block = flush_paragraph()
+            if block:
+                yield block
+            code = []
+            continue
+
+        if not line.strip():
+            block = flush_paragraph()
+            if block:
+                yield block
+            continue
+
+        heading = HEADING_RE.match(line)
+        if heading:
+            block = flush_paragraph()
+            if block:
+                yield block
+            yield ('heading', len(heading.group(1)), parse_inline(heading.group(2)))
+            continue
+
+        if RULE_RE.match(line):
+            block = flush_paragraph()
+            if block:
+                yield block
+            yield ('rule',)
+            continue
+
+        item = LIST_RE.match(line)
+        if item:
+            block = flush_paragraph()
+            if block:
+                yield block
+            level = len(item.group(1).expandtabs(4)) // 2
+            yield ('list_item', item.group(2)[0].isdigit(), level, parse_inline(item.group(3)))
+            continue
+
+        if line.lstrip().startswith('>'):
+            block = flush_paragraph()
+            if block:
+                yield block
+            yield ('quote', parse_inline(line.lstrip()[1:].strip()))
+            continue
+
+        if line.strip().startswith('|'):
+            pending = line
+            continue
+
+        paragraph.append(line)
+
+    if pending is not None:
+        paragraph.append(pending)
+    if code is not None:
+        yield ('code', '\n'.join(code))
+    if table is not None:
+        yield ('table', table[0], table[1])
+    block = flush_paragraph()
+    if block:
+        yield block
+
+def _add_hyperlink(paragraph, url, text, bold, italic):
+    """Append an external hyperlink run to a paragraph."""
+    r_id = paragraph.part.relate_to(url, RT.HYPERLINK, is_external=True)
+    hyperlink = OxmlElement('w:hyperlink')
+    hyperlink.set(qn('r:id'), r_id)
+
+    run = OxmlElement('w:r')
+    properties = OxmlElement('w:rPr')
+    color = OxmlElement('w:color')
+    color.set(qn('w:val'), '0563C1')
+    properties.append(color)
+    underline = OxmlElement('w:u')
+    underline.set(qn('w:val'), 'single')
+    properties.append(underline)
+    if bold:
+        properties.append(OxmlElement('w:b'))
+    if italic:
+        properties.append(OxmlElement('w:i'))
+    run.append(properties)
+
+    text_element = OxmlElement('w:t')
+    text_element.text = text
+    text_element.set(qn('xml:space'), 'preserve')
+    run.append(text_element)
+    hyperlink.append(run)
+    paragraph._p.append(hyperlink)
+
+def _add_spans(paragraph, spans):
+    """Write inline spans into a paragraph as runs."""
+    for text, bold, italic, code, url in spans:
+        if url:
+            _add_hyperlink(paragraph, url, text, bold, italic)
+            continue
+        run = paragraph.add_run(text)
+        run.bold = bold or None
+        run.italic = italic or None
+        if code:
+            run.font.name = 'Courier New'
+
+def _list_style(document, ordered, level):
+    """Return the deepest built-in list style available for a nesting level."""
+    base = 'List Number' if ordered else 'List Bullet'
+    for depth in range(min(level, 2), 0, -1):
+        name = f'{base} {depth + 1}'
+        if name in document.styles:
+            return name
+    return base
+
+def render_markdown_to_docx(markdown_file, output_path):
+    """Render a markdown file to DOCX with python-docx.
+
+    The source is streamed line by line through ``iter_blocks`` and each
+    node is written to the document as soon as it is parsed.
+
+    Args:
+        markdown_file (Path): Path to the markdown source.
+        output_path (Path): Destination of the DOCX file.
+    """
+    document = Document()
+    with open(markdown_file, 'r', encoding='utf-8') as f:
+        for block in iter_blocks(f):
+            kind = block[0]
+            if kind == 'heading':
+                _add_spans(document.add_heading(level=block[1]), block[2])
+            elif kind == 'paragraph':
+                _add_spans(document.add_paragraph(), block[1])
+            elif kind == 'list_item':
+                _add_spans(document.add_paragraph(style=_list_style(document, block[1], block[2])), block[3])
+            elif kind == 'quote':
+                _add_spans(document.add_paragraph(style='Quote'), block[1])
+            elif kind == 'code':
+                run = document.add_paragraph().add_run(block[1])
+                run.font.name = 'Courier New'
+            elif kind == 'rule':
+                document.add_paragraph('_' * 40)
+            elif kind == 'table':
+                header, rows = block[1], block[2]
+                cols = max([len(header)] + [len(row) for row in rows])
+                table = document.add_table(rows=0, cols=cols)
+                table.style = 'Table Grid'
+                for index, row in enumerate([header] + rows):
+                    cells = table.add_row().cells
+                    for cell, spans in zip(cells, row):
+                        if index == 0:
+                            spans = [span[:1] + (True,) + span[2:] for span in spans]
+                        _add_spans(cell.paragraphs[0], spans)
+    document.save(str(output_path))
@@ -0,0 +1,257 @@
+from collections import OrderedDict, defaultdict, deque
+from metrics import CREW_TASK_SECONDS, PIPELINE_STAGE_SECONDS
+import threading
+import asyncio
+import json
+import time
+
+HISTORY_SIZE = 200
+# Users whose history is kept; the least recently active are dropped first
+MAX_HISTORIES = 1024
+KEEPALIVE_SECONDS = 15
+
+class EventBus:
+    """Per-user progress event streams.
+
+    Events are published from worker threads (crew runs, blog generation)
+    and delivered to asyncio subscribers on the server's event loop. A short
+    history is kept per user so a client that connects late, or reconnects
+    with ``Last-Event-ID``, still sees what it missed. Only the
+    ``max_histories`` users who published most recently keep theirs.
+    """
+
+    def __init__(self, max_histories=MAX_HISTORIES):
+        self.max_histories = max_histories
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._history = OrderedDict()
+        self._subscribers = defaultdict(list)
+
+    def publish(self, user_id, event_type, **data):
+        """Publish an event to the user's stream.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            event_type (str): Event name, e.g. ``task_finished``.
+            **data: JSON-serializable event fields.
+
+        Returns:
+            dict: The published event.
+        """
+        with self._lock:
+            self._seq += 1
+            event = {'id': self._seq, 'type': event_type, 'time': time.time(), **data}
+            if user_id not in self._history:
+                self._history[user_id] = deque(maxlen=HISTORY_SIZE)
+            self._history[user_id].append(event)
+            self._history.move_to_end(user_id)
+            while len(self._history) > self.max_histories:
+                self._history.popitem(last=False)
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # The subscriber's loop has closed
+                pass
+        return event
+
+    def subscribe(self, user_id, last_event_id=0):
+        """Register an asyncio subscriber for the user's stream.
+
+        Must be called from the event loop that will consume the queue.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            last_event_id (int): Replay history after this event id.
+
+        Returns:
+            asyncio.Queue: Queue receiving the replayed and future events.
+        """
+        queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            for event in self._history.get(user_id, ()):
+                if event['id'] > last_event_id:
+                    queue.put_nowait(event)
+            self._subscribers[user_id].append((loop, queue))
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        """Remove a subscriber registered with ``subscribe``."""
+        with self._lock:
+            self._subscribers[user_id] = [
+                entry for entry in self._subscribers[user_id] if entry[1] is not queue
+            ]
+            if not self._subscribers[user_id]:
+                del self._subscribers[user_id]
+
+    def clear(self, user_id):
+        """Drop the user's event history."""
+        with self._lock:
+            self._history.pop(user_id, None)
+
+event_bus = EventBus()
+
+def format_sse(event):
+    """Encode an event as a server-sent events message."""
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+async def stream_events(user_id, request, last_event_id=0):
+    """Yield a user's events as SSE messages until the client disconnects.
+
+    Args:
+        user_id (str): Unique identifier for the user.
+        request (Request): The streaming request, polled for disconnects.
+        last_event_id (int): Replay history after this event id.
+
+    Yields:
+        str: SSE-encoded events and keep-alive comments.
+    """
+    queue = event_bus.subscribe(user_id, last_event_id)
+    try:
+        while not await request.is_disconnected():
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            yield format_sse(event)
+    finally:
+        event_bus.unsubscribe(user_id, queue)
+
+def _summary(value, limit=200):
+    """Shorten free text for inclusion in an event."""
+    text = str(value or '')
+    return text if len(text) <= limit else text[:limit] + '…'
+
+class ProgressReporter:
+    """Publish the progress of one pipeline stage to a user's event stream.
+
+    Args:
+        user_id (str): Unique identifier for the user.
+        stage (str): Pipeline stage name, e.g. ``analysis`` or ``seo``.
+        run_id (str): Run the stage belongs to, included in every event.
+    """
+
+    def __init__(self, user_id, stage, run_id=None):
+        self.user_id = user_id
+        self.stage = stage
+        self.run_id = run_id
+        self.tasks = []
+        self.task_index = 0
+        self.started = time.perf_counter()
+        self.task_started = self.started
+
+    def _elapsed(self, since=None):
+        return round(time.perf_counter() - (since or self.started), 3)
+
+    def publish(self, event_type, **data):
+        """Publish an event tagged with this stage, its run and its elapsed time."""
+        if self.run_id:
+            data['run_id'] = self.run_id
+        return event_bus.publish(
+            self.user_id, event_type, stage=self.stage, elapsed=self._elapsed(), **data
+        )
+
+    def start(self):
+        """Mark the stage as started."""
+        self.started = time.perf_counter()
+        self.publish('stage_started')
+
+    def step(self, name, **data):
+        """Publish a named step within a stage that is not a crew task."""
+        self.publish('step', step=name, **data)
+
+    def attach(self, crew):
+        """Hook the reporter into a crew's step and task callbacks.
+
+        Existing task callbacks (such as artifact writers) keep running;
+        the progress callback is chained after them.
+
+        Args:
+            crew (Crew): The crew about to be kicked off.
+
+        Returns:
+            Crew: The same crew, instrumented.
+        """
+        self.tasks = list(crew.tasks)
+        crew.step_callback = self.on_step
+        for task in self.tasks:
+            task.callback = self._chain(task.callback)
+        return crew
+
+    def _chain(self, callback):
+        def chained(output):
+            if callback:
+                callback(output)
+            self.on_task(output)
+        return chained
+
+    def kickoff(self, crew, **kwargs):
+        """Run an attached crew, publishing start, task and finish events.
+
+        Args:
+            crew (Crew): The crew to run.
+            **kwargs: Passed to ``Crew.kickoff``.
+
+        Returns:
+            CrewOutput: The crew's result.
+        """
+        self.attach(crew)
+        self.start()
+        self._start_task()
+        try:
+            result = crew.kickoff(**kwargs)
+        except Exception as e:
+            self.fail(e)
+            raise
+        usage = getattr(crew, 'usage_metrics', None)
+        self.finish(tokens=usage.model_dump() if hasattr(usage, 'model_dump') else None)
+        return result
+
+    def _start_task(self):
+        if self.task_index < len(self.tasks):
+            task = self.tasks[self.task_index]
+            self.task_started = time.perf_counter()
+            self.publish(
+                'task_started',
+                task=task.name or _summary(task.description, 80),
+                index=self.task_index,
+                total=len(self.tasks),
+                agent=getattr(task.agent, 'role', None)
+            )
+
+    def on_step(self, step):
+        """Crew ``step_callback``: report tool calls and agent steps."""
+        tool = getattr(step, 'tool', None)
+        if tool:
+            self.publish('tool_called', tool=tool, input=_summary(getattr(step, 'tool_input', '')))
+        else:
+            self.publish('agent_step', thought=_summary(getattr(step, 'thought', '')))
+
+    def on_task(self, output):
+        """Task callback: report the finished task and start the next one."""
+        task_elapsed = self._elapsed(self.task_started)
+        task_name = output.name or _summary(output.description, 80)
+        CREW_TASK_SECONDS.observe(task_elapsed, stage=self.stage, task=task_name)
+        self.publish(
+            'task_finished',
+            task=task_name,
+            index=self.task_index,
+            total=len(self.tasks),
+            agent=output.agent,
+            task_elapsed=task_elapsed
+        )
+        self.task_index += 1
+        self._start_task()
+
+    def finish(self, **data):
+        """Mark the stage as finished."""
+        PIPELINE_STAGE_SECONDS.observe(self._elapsed(), stage=self.stage, outcome='ok')
+        self.publish('stage_finished', **data)
+
+    def fail(self, error):
+        """Mark the stage as failed."""
+        PIPELINE_STAGE_SECONDS.observe(self._elapsed(), stage=self.stage, outcome='error')
+        self.publish('stage_failed', error=str(error))
@@ -0,0 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import functools
+import asyncio
+import os
+
+from admission import ADMISSION_LIMITS
+from profiling import active_profile
+
+# Threads running crews; by default one per analysis and SEO admission slot,
+# so every admitted pipeline starts straight away
+CREW_WORKERS = int(os.getenv("CREW_WORKERS", ADMISSION_LIMITS.get('analysis', 2) + ADMISSION_LIMITS.get('seo', 2)))
+# Threads for blocking artifact reads and writes and run index updates
+IO_WORKERS = int(os.getenv("IO_WORKERS", "32"))
+
+# Crews block for minutes and artifact I/O for milliseconds; separate pools
+# keep short requests from queueing behind crews. Spire.Doc renders run on
+# the process pool in renderer.py.
+crew_executor = ThreadPoolExecutor(max_workers=max(CREW_WORKERS, 1), thread_name_prefix='crew')
+io_executor = ThreadPoolExecutor(max_workers=max(IO_WORKERS, 1), thread_name_prefix='io')
+
+def _call(func, args, kwargs):
+    profile = active_profile.get()
+    if profile is None:
+        return func(*args, **kwargs)
+    with profile.thread():
+        return func(*args, **kwargs)
+
+async def run_blocking(executor, func, *args, **kwargs):
+    """Run a blocking call on an executor without blocking the event loop.
+
+    The call sees the caller's context variables, e.g. the request
+    deadline, and is profiled with the request when profiling is on.
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, functools.partial(context.run, _call, func, args, kwargs)
+    )
+
+async def run_crew(func, *args, **kwargs):
+    """Run a crew pipeline on the crew executor."""
+    return await run_blocking(crew_executor, func, *args, **kwargs)
+
+async def run_io(func, *args, **kwargs):
+    """Run blocking file or storage I/O on the I/O executor."""
+    return await run_blocking(io_executor, func, *args, **kwargs)
+
+def shutdown_executors():
+    """Stop the executors, dropping queued work."""
+    crew_executor.shutdown(wait=False, cancel_futures=True)
+    io_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,235 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import shutil
+import stat
+import time
+import uuid
+import sys
+import os
+
+from metrics import OUTPUTS_BYTES, OUTPUTS_EVICTIONS, OUTPUTS_RECLAIMED_BYTES
+from runs import forget_run, list_runs, run_dir
+from storage import OUTPUTS_DIR, get_storage
+
+# Delete users not seen for this long; 0 keeps them until evicted for space
+OUTPUTS_TTL_HOURS = float(os.getenv("OUTPUTS_TTL_HOURS", "72"))
+# Disk quotas for all of outputs/ and for each user; 0 disables a quota
+OUTPUTS_QUOTA_MB = float(os.getenv("OUTPUTS_QUOTA_MB", "0"))
+USER_QUOTA_MB = float(os.getenv("USER_QUOTA_MB", "0"))
+JANITOR_INTERVAL = float(os.getenv("JANITOR_INTERVAL", "600"))
+# Users seen this recently are never evicted to meet the global quota
+ACTIVE_GRACE_SECONDS = 15 * 60
+# Access markers are rewritten at most this often per user
+TOUCH_INTERVAL = 60
+
+ACCESS_MARKER = '.last_access'
+TRASH_DIR = OUTPUTS_DIR / '.trash'
+
+def tree_size(path):
+    """Total size in bytes of the files under a directory."""
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+def _make_writable(func, path, exc):
+    """rmtree error handler: clear read-only bits and retry once."""
+    os.chmod(os.path.dirname(path), stat.S_IRWXU)
+    if os.path.exists(path):
+        os.chmod(path, stat.S_IRWXU)
+    func(path)
+
+def _force_rmtree(path):
+    if sys.version_info >= (3, 12):
+        shutil.rmtree(path, onexc=_make_writable)
+    else:
+        shutil.rmtree(path, onerror=_make_writable)
+
+def has_running_run(user_id):
+    """Whether one of the user's pipeline runs is still in progress."""
+    return any(entry.get('status') == 'running' for entry in list_runs(user_id))
+
+class Janitor:
+    """Keeps ``outputs/`` within its TTL and disk quotas.
+
+    A background thread sweeps ``outputs/`` every ``JANITOR_INTERVAL``
+    seconds. It deletes users not seen for ``OUTPUTS_TTL_HOURS``, evicts a
+    user's oldest finished runs above ``USER_QUOTA_MB``, and evicts the
+    least recently seen users above ``OUTPUTS_QUOTA_MB``. Users with a
+    pipeline run in progress are never evicted.
+
+    Deletion never blocks the caller. A directory is first renamed into
+    ``outputs/.trash``, which is instant and takes it out of view, and a
+    worker thread then deletes it and counts the bytes reclaimed.
+
+    Args:
+        interval (float): Seconds between sweeps.
+        on_evict (callable): Called with the ID of each evicted user from
+            the sweeping thread, to drop the user's in-memory state.
+    """
+
+    def __init__(self, interval=JANITOR_INTERVAL, on_evict=None):
+        self.interval = interval
+        self.on_evict = on_evict
+        self._stop = threading.Event()
+        self._thread = None
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='outputs-janitor')
+        self._touched = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start periodic sweeps and delete anything left in the trash."""
+        if TRASH_DIR.exists():
+            for path in TRASH_DIR.iterdir():
+                self._worker.submit(self._delete, path, 'trash')
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='outputs-janitor', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sweeping; pending deletions finish in the background."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self._worker.shutdown(wait=False)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Error sweeping outputs: {str(e)}")
+
+    def touch(self, user_id):
+        """Record that a user was seen, for TTL and LRU decisions.
+
+        Cheap enough to call on every request: the marker is written in the
+        background and at most once per ``TOUCH_INTERVAL``.
+        """
+        now = time.time()
+        with self._lock:
+            if now - self._touched.get(user_id, 0) < TOUCH_INTERVAL:
+                return
+            self._touched[user_id] = now
+        self._worker.submit(self._write_marker, user_id, now)
+
+    def _write_marker(self, user_id, now):
+        user_dir = OUTPUTS_DIR / user_id
+        if user_dir.is_dir():
+            get_storage().write_text(user_dir / ACCESS_MARKER, str(now))
+
+    def last_access(self, user_dir):
+        """When a user was last seen, falling back to the directory's mtime."""
+        try:
+            return float(get_storage().read_text(user_dir / ACCESS_MARKER))
+        except (FileNotFoundError, ValueError):
+            return user_dir.stat().st_mtime
+
+    def discard(self, directory, reason):
+        """Remove a directory from outputs/ and delete it in the background.
+
+        Args:
+            directory (Path): A user or run directory.
+            reason (str): Metric label, e.g. ``ttl`` or ``cleanup``.
+
+        Returns:
+            Future: Completes when the files are gone; None if there was nothing to delete.
+        """
+        storage = get_storage()
+        trash_path = None
+        if directory.exists():
+            TRASH_DIR.mkdir(parents=True, exist_ok=True)
+            trash_path = TRASH_DIR / f'{directory.name}-{uuid.uuid4().hex[:8]}'
+            os.replace(directory, trash_path)
+        # Drops the shared copies; the local directory is already gone
+        storage.delete_tree(directory)
+        OUTPUTS_EVICTIONS.inc(reason=reason)
+        if trash_path is None:
+            return None
+        return self._worker.submit(self._delete, trash_path, reason)
+
+    def _delete(self, path, reason):
+        size = tree_size(path)
+        try:
+            _force_rmtree(path)
+        except FileNotFoundError:
+            pass
+        OUTPUTS_RECLAIMED_BYTES.inc(size, reason=reason)
+        print(f"Deleted {path} ({size} bytes, {reason})")
+
+    def _evict_user(self, user_dir, reason):
+        """Discard a user unless a request holds the user's lock right now."""
+        try:
+            with get_storage().user_lock(user_dir.name, timeout=0):
+                self.discard(user_dir, reason)
+        except TimeoutError:
+            return False
+        with self._lock:
+            self._touched.pop(user_dir.name, None)
+        if self.on_evict is not None:
+            self.on_evict(user_dir.name)
+        return True
+
+    def _enforce_user_quota(self, user_dir, size, quota):
+        """Evict a user's oldest finished runs until the user fits the quota."""
+        user_id = user_dir.name
+        finished = [entry for entry in list_runs(user_id) if entry.get('status') != 'running']
+        for entry in sorted(finished, key=lambda entry: entry.get('finished') or entry.get('started') or ''):
+            if size <= quota:
+                break
+            path = run_dir(user_id, entry['run_id'])
+            run_size = tree_size(path)
+            forget_run(user_id, entry['run_id'])
+            self.discard(path, 'user_quota')
+            size -= run_size
+        return size
+
+    def sweep(self):
+        """Apply the TTL and quotas once.
+
+        Returns:
+            dict: Bytes in use after the sweep and the number of users evicted.
+        """
+        if not OUTPUTS_DIR.is_dir():
+            return {'bytes': 0, 'evicted': 0}
+        now = time.time()
+        ttl = OUTPUTS_TTL_HOURS * 3600
+        user_quota = USER_QUOTA_MB * 1024 * 1024
+        global_quota = OUTPUTS_QUOTA_MB * 1024 * 1024
+        evicted = 0
+
+        users = []
+        for user_dir in OUTPUTS_DIR.iterdir():
+            if not user_dir.is_dir() or user_dir.name.startswith('.'):
+                continue
+            last_access = self.last_access(user_dir)
+            # A pipeline may run for longer than the user's last access shows
+            running = has_running_run(user_dir.name)
+            if ttl and now - last_access > ttl and not running:
+                evicted += self._evict_user(user_dir, 'ttl')
+                continue
+            size = tree_size(user_dir)
+            if user_quota and size > user_quota:
+                size = self._enforce_user_quota(user_dir, size, user_quota)
+            users.append((last_access, user_dir, size, running))
+
+        total = sum(size for _, _, size, _ in users)
+        if global_quota and total > global_quota:
+            for last_access, user_dir, size, running in sorted(users, key=lambda user: user[0]):
+                if total <= global_quota:
+                    break
+                if running or now - last_access < ACTIVE_GRACE_SECONDS:
+                    continue
+                if self._evict_user(user_dir, 'global_quota'):
+                    evicted += 1
+                    total -= size
+
+        OUTPUTS_BYTES.set(total)
+        return {'bytes': total, 'evicted': evicted}
+
+janitor = Janitor()
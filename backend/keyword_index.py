@@ -0,0 +1,207 @@
+from collections import OrderedDict, Counter
+import threading
+import json
+import time
+
+from clustering import TOKEN_RE, trigrams
+from storage import get_storage
+from runs import list_runs
+
+# Best keywords kept at each trie node, which bounds the results of a prefix lookup
+NODE_TOP = 32
+# Trigram overlap (Dice coefficient) a fuzzy match needs
+FUZZY_MIN_SCORE = 0.3
+# User indexes kept in memory, and how often one is checked against its files
+MAX_INDEXES = 256
+REFRESH_SECONDS = 30
+
+class KeywordIndex:
+    """Typeahead index over one user's SpyFu keywords.
+
+    A prefix trie finds keywords with a word starting with the query
+    ("jaip" finds "mba colleges in jaipur"); each trie node keeps its
+    ``NODE_TOP`` highest-volume keywords, so a lookup never walks the
+    subtree. A trigram index finds misspelt queries. Keywords are added
+    one domain's rankings at a time as they are fetched.
+    """
+
+    def __init__(self):
+        self.keywords = {}
+        self._trie = {}
+        self._trigrams = {}
+        self._gram_counts = {}
+        self._lock = threading.Lock()
+
+    def add_rankings(self, domain, rankings):
+        """Index the keywords of one domain's rankings.
+
+        Args:
+            domain (str): Domain the rankings belong to.
+            rankings (dict): SpyFu rankings with a ``results`` list.
+        """
+        for result in rankings.get('results', []):
+            if result.get('keyword'):
+                self.add(result['keyword'], result.get('searchVolume') or 0, domain)
+
+    def add(self, keyword, volume, domain):
+        with self._lock:
+            entry = self.keywords.get(keyword)
+            if entry is None:
+                entry = self.keywords[keyword] = {'keyword': keyword, 'searchVolume': volume, 'domains': []}
+                grams = set(trigrams(keyword.lower()))
+                for gram in grams:
+                    self._trigrams.setdefault(gram, set()).add(keyword)
+                self._gram_counts[keyword] = len(grams)
+            entry['searchVolume'] = max(entry['searchVolume'], volume)
+            if domain not in entry['domains']:
+                entry['domains'].append(domain)
+            self._insert(keyword, entry['searchVolume'])
+
+    def _insert(self, keyword, volume):
+        """Add a keyword under the trie path of every word suffix of it."""
+        words = TOKEN_RE.findall(keyword.lower())
+        for start in range(len(words)):
+            node = self._trie
+            for char in ' '.join(words[start:]):
+                node = node.setdefault(char, {})
+                top = node.setdefault('', [])
+                top[:] = [item for item in top if item[1] != keyword]
+                top.append((-volume, keyword))
+                top.sort()
+                del top[NODE_TOP:]
+
+    def _prefix(self, query):
+        node = self._trie
+        for char in query:
+            node = node.get(char)
+            if node is None:
+                return []
+        return [keyword for _, keyword in node.get('', [])]
+
+    def _fuzzy(self, query):
+        grams = set(trigrams(query))
+        overlap = Counter(keyword for gram in grams for keyword in self._trigrams.get(gram, ()))
+        matches = []
+        for keyword, common in overlap.items():
+            score = 2 * common / (len(grams) + self._gram_counts[keyword])
+            if score >= FUZZY_MIN_SCORE:
+                matches.append((score, keyword))
+        return matches
+
+    def search(self, query, limit=10):
+        """Find keywords for a typeahead query.
+
+        Prefix matches come first, by search volume; fuzzy matches fill up
+        the rest, by similarity and then volume.
+
+        Returns:
+            list: Keyword entries with ``keyword``, ``searchVolume``,
+            ``domains`` and ``match`` (``prefix`` or ``fuzzy``).
+        """
+        query = ' '.join(TOKEN_RE.findall(query.lower()))
+        if not query:
+            return []
+        with self._lock:
+            found = self._prefix(query)[:limit]
+            results = [{**self.keywords[keyword], 'match': 'prefix'} for keyword in found]
+            if len(results) < limit and len(query) >= 3:
+                fuzzy = sorted(
+                    ((score, keyword) for score, keyword in self._fuzzy(query) if keyword not in found),
+                    key=lambda match: (-match[0], -self.keywords[match[1]]['searchVolume'])
+                )
+                results.extend({**self.keywords[keyword], 'match': 'fuzzy'} for _, keyword in fuzzy[:limit - len(results)])
+        return results
+
+def build_index(user_rankings, competitor_rankings, domain_url):
+    """Index a user's rankings and each competitor's."""
+    index = KeywordIndex()
+    index.add_rankings(domain_url, user_rankings)
+    for domain, rankings in competitor_rankings.items():
+        index.add_rankings(domain, rankings)
+    return index
+
+class KeywordIndexes:
+    """The keyword indexes of recently active users, least recently used evicted.
+
+    ``fetch_data_from_spyfu`` installs a fresh index whenever it saves new
+    SpyFu data. Otherwise, e.g. after a restart or when another worker
+    fetched the data, an index is built from the stored files on first
+    use and rebuilt when they change.
+    """
+
+    def __init__(self, max_indexes=MAX_INDEXES):
+        self.max_indexes = max_indexes
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _files(self, user_id):
+        data_dir = f'outputs/{user_id}/data'
+        return f'{data_dir}/user_rankings.json', f'{data_dir}/competitor_rankings.json'
+
+    def _stamp(self, user_id):
+        """Modification times of the user's local ranking files, refreshed from storage."""
+        storage = get_storage()
+        paths = [storage.fetch(path) for path in self._files(user_id)]
+        if None in paths:
+            return None
+        return tuple(path.stat().st_mtime_ns for path in paths)
+
+    def install(self, user_id, index):
+        """Use a freshly built index for a user's newly saved data."""
+        stamp = self._stamp(user_id)
+        with self._lock:
+            self._indexes[user_id] = (index, stamp, time.monotonic())
+            self._indexes.move_to_end(user_id)
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+
+    def forget(self, user_id):
+        with self._lock:
+            self._indexes.pop(user_id, None)
+
+    def loaded(self, user_id):
+        """Return a user's index if it was checked against its files recently.
+
+        Never touches the disk, so it is safe to call on the event loop.
+        """
+        with self._lock:
+            cached = self._indexes.get(user_id)
+            if cached is None:
+                return None
+            self._indexes.move_to_end(user_id)
+        return cached[0] if time.monotonic() - cached[2] < REFRESH_SECONDS else None
+
+    def get(self, user_id):
+        """Return a user's index, or None if the user has no SpyFu data.
+
+        Raises:
+            ValueError: If the stored rankings are not valid JSON.
+        """
+        index = self.loaded(user_id)
+        if index is not None:
+            return index
+
+        with self._lock:
+            cached = self._indexes.get(user_id)
+        stamp = self._stamp(user_id)
+        if stamp is None:
+            self.forget(user_id)
+            return None
+        if cached is not None and cached[1] == stamp:
+            with self._lock:
+                self._indexes[user_id] = (cached[0], stamp, time.monotonic())
+            return cached[0]
+
+        storage = get_storage()
+        user_path, competitor_path = self._files(user_id)
+        # The user's own domain is only recorded with their runs
+        domain_url = next(
+            (entry['domain_url'] for entry in reversed(list_runs(user_id)) if entry.get('domain_url')), user_id
+        )
+        index = build_index(
+            json.loads(storage.read_text(user_path)), json.loads(storage.read_text(competitor_path)), domain_url
+        )
+        self.install(user_id, index)
+        return index
+
+keyword_indexes = KeywordIndexes()
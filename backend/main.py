@@ -1,55 +1,148 @@
-from tools.spyfu_tool import SpyfuTool
+from tools.spyfu_tool import AsyncSpyfuClient, SpyfuError
 from analysis_crew import AnalysisCrew
 from blog_writer import generate_blog
+from events import ProgressReporter
+from metrics import install_llm_hooks
+from cassettes import install_cassette
+from admission import install_provider_limits
+from resilience import check_deadline, install_llm_resilience
+from routing import install_model_routing
+from usage import install_usage_accounting, usage_scope
 from seo_crew import SeoCrew
+from postprocess import write_artifact
+from clustering import cluster_keywords, clustered_details
+from keyword_index import KeywordIndex, build_index, keyword_indexes
+from refresh import tracked_spyfu_data
+from storage import get_storage
+from executors import run_io
+from runs import run_dir
 from pathlib import Path
 import warnings
+import asyncio
 import json
-import os
 
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
+install_llm_hooks()
+install_cassette()
+install_provider_limits()
+install_llm_resilience()
+install_model_routing()
+install_usage_accounting()
 
-def fetch_data_from_spyfu(domain_url: str, output_dir: Path):
+
+def _spyfu_json(result: str) -> dict:
+    """Parse a SpyfuTool result, raising on the tool's error payload.
+
+    Raises:
+        DeadlineExceeded: If the request ran out of time.
+        SpyfuError: If SpyFu returned an error or no results.
+    """
+    data = json.loads(result)
+    if 'error' in data or 'results' not in data:
+        check_deadline()
+        raise SpyfuError(data.get('error', 'SpyFu returned no results'))
+    return data
+
+
+def _save_spyfu_data(output_dir: Path, data_set: dict, index: KeywordIndex):
+    """Save a fetched data set together, so readers never see a mix of two fetches."""
+    with get_storage().user_lock(output_dir.name):
+        for filename, data in data_set.items():
+            write_artifact(output_dir / 'data' / filename, json.dumps(data, indent=2, ensure_ascii=False))
+        keyword_indexes.install(output_dir.name, index)
+
+
+async def fetch_data_from_spyfu_async(domain_url: str, output_dir: Path):
     """Fetch and save data from SpyFu.
 
+    The user's rankings and the competitor list are fetched at the same
+    time, then every competitor's rankings at once, within the SpyFu
+    provider limit. Competitors whose rankings cannot be fetched are
+    skipped; the fetch fails if the user's rankings, the competitor list
+    or every competitor's rankings are unavailable.
+
     Args:
         domain_url (str): The domain URL to fetch data for.
         output_dir (Path): The directory where the output data will be saved.
+
+    Raises:
+        SpyfuError: If SpyFu data could not be fetched.
     """
     try:
-        spy_tool = SpyfuTool()
+        async with AsyncSpyfuClient() as spyfu:
+            print("\nFetching user rankings and competitors...")
+            user_rankings, competitors = await asyncio.gather(
+                spyfu.get_newly_ranked_keywords(domain_url),
+                spyfu.get_top_competitors(domain=domain_url)
+            )
+            user_rankings_json = _spyfu_json(user_rankings)
+            competitors_json = _spyfu_json(competitors)
+
+            domains = [competitor['domain'] for competitor in competitors_json['results']]
+            print(f"\nFetching rankings for: {', '.join(domains)}")
+            results = await asyncio.gather(*(spyfu.get_newly_ranked_keywords(domain) for domain in domains))
+
+        # The keyword search index is built alongside the data set
+        index = KeywordIndex()
+        index.add_rankings(domain_url, user_rankings_json)
+        rankings_data = {}
+        for domain, result in zip(domains, results):
+            try:
+                rankings_data[domain] = _spyfu_json(result)
+                index.add_rankings(domain, rankings_data[domain])
+            except SpyfuError as e:
+                print(f"Skipping competitor {domain}: {str(e)}")
+
+        if competitors_json['results'] and not rankings_data:
+            raise SpyfuError('Rankings could not be fetched for any competitor')
+
+        await run_io(_save_spyfu_data, output_dir, {
+            'user_rankings.json': user_rankings_json,
+            'competitors.json': competitors_json,
+            'competitor_rankings.json': rankings_data
+        }, index)
+    except Exception as e:
+        print(f"Error fetching data from SpyFu: {str(e)}")
+        raise
 
-        print("\nFetching user rankings...")
-        user_rankings = spy_tool._get_newly_ranked_keywords(domain_url)
-        user_rankings_json = json.loads(user_rankings)
 
-        with open(output_dir / 'data' / 'user_rankings.json', 'w', encoding='utf-8') as f:
-            json.dump(user_rankings_json, f, indent=2, ensure_ascii=False)
+def fetch_data_from_spyfu(domain_url: str, output_dir: Path):
+    """Fetch and save data from SpyFu from a thread without an event loop.
 
-        print("\nFetching competitor rankings...")
-        competitors = spy_tool._get_top_competitors(domain=domain_url)
-        competitors_json = json.loads(competitors)
+    See ``fetch_data_from_spyfu_async``.
 
-        with open(output_dir / 'data' / 'competitors.json', 'w', encoding='utf-8') as f:
-            json.dump(competitors_json, f, indent=2, ensure_ascii=False)
+    Raises:
+        SpyfuError: If SpyFu data could not be fetched.
+    """
+    asyncio.run(fetch_data_from_spyfu_async(domain_url, output_dir))
 
-        rankings_data = {}
-        for competitor in competitors_json['results']:
-            domain = competitor['domain']
-            print(f"\nFetching rankings for: {domain}")
 
-            rankings = spy_tool._get_newly_ranked_keywords(domain)
-            rankings_json = json.loads(rankings)
-            rankings_data[domain] = rankings_json
+async def fetch_spyfu_stage(user_id: str, domain_url: str, output_dir: Path, run_id: str = None):
+    """Fetch SpyFu data as the ``spyfu`` stage of a user's progress events.
 
-        with open(output_dir / 'data' / 'competitor_rankings.json', 'w', encoding='utf-8') as f:
-            json.dump(rankings_data, f, indent=2, ensure_ascii=False)
+    Data refreshed off-peak for a tracked domain is used instead of a
+    fetch while it is fresh.
+    """
+    progress = ProgressReporter(user_id, 'spyfu', run_id)
+    progress.start()
+    try:
+        data_set = await run_io(tracked_spyfu_data, domain_url)
+        if data_set is not None:
+            print("Using refreshed SpyFu data...")
+            index = build_index(data_set['user_rankings.json'], data_set['competitor_rankings.json'], domain_url)
+            await run_io(_save_spyfu_data, output_dir, data_set, index)
+            progress.finish(source='tracked')
+            return
+        print("Fetching SpyFu data...")
+        await fetch_data_from_spyfu_async(domain_url, output_dir)
     except Exception as e:
-        print(f"Error fetching data from SpyFu: {str(e)}")
+        progress.fail(e)
         raise
+    progress.finish()
 
 
-def run_analysis_crew(user_id: str, institution_name: str, domain_url: str, output_dir: Path):
+def run_analysis_crew(user_id: str, institution_name: str, domain_url: str, output_dir: Path, run_id: str = None,
+                      fetch: bool = True):
     """Run the analysis crew.
 
     Args:
@@ -57,19 +150,28 @@ def run_analysis_crew(user_id: str, institution_name: str, domain_url: str, outp
         institution_name (str): Name of the institution.
         domain_url (str): The domain URL to analyze.
         output_dir (Path): The directory where output data will be saved.
+        run_id (str): Run namespace for the crew's outputs, if any.
+        fetch (bool): Fetch SpyFu data first; False when the caller already
+            awaited ``fetch_spyfu_stage``.
+
+    Returns:
+        dict: Cleaned markdown and metadata per artifact, keyed by name.
     """
     try:
         print(f"Running analysis for user: {user_id}")
 
-        print("Fetching SpyFu data...")
-        fetch_data_from_spyfu(domain_url, output_dir)
+        if fetch:
+            asyncio.run(fetch_spyfu_stage(user_id, domain_url, output_dir, run_id))
 
         crew = AnalysisCrew({
             'user_id': user_id,
             'institution_name': institution_name,
             'domain_url': domain_url,
+            'run_id': run_id
         })
-        crew.crew().kickoff()
+        with usage_scope(user_id, run_id, 'analysis'):
+            ProgressReporter(user_id, 'analysis', run_id).kickoff(crew.crew())
+        return crew.artifacts
 
     except Exception as e:
         print(f"Error running analysis crew: {str(e)}")
@@ -91,15 +193,14 @@ def get_available_keywords(userId: str):
         file_path = f'outputs/{userId}/data/competitor_rankings.json'
         print(f"Looking for file: {file_path}")
 
-        if not os.path.exists(file_path):
+        try:
+            rankings_data = json.loads(get_storage().read_text(file_path))
+        except FileNotFoundError:
             return {
                 'status': 'error',
                 'message': f'Rankings file not found: {file_path}'
             }
 
-        with open(file_path, 'r', encoding='utf-8') as f:
-            rankings_data = json.load(f)
-
         domain_keywords = {}
         for domain, data in rankings_data.items():
             unique_keywords = set(result['keyword'] for result in data['results'])
@@ -117,99 +218,131 @@ def get_available_keywords(userId: str):
         }
 
 
-def save_keyword_details(userId: str, selected_keywords: list[str]):
-    """Get full details for selected keywords.
+def get_keyword_clusters(userId: str):
+    """Get the topic clusters of the user's saved keyword selection.
 
     Args:
         userId (str): Unique identifier for the user.
-        selected_keywords (list[str]): List of selected keywords to get details for.
+
+    Returns:
+        dict: A dictionary containing the status and the clusters.
     """
     try:
-        with open(f'outputs/{userId}/data/competitor_rankings.json', 'r', encoding='utf-8') as f:
-            rankings_data = json.load(f)
+        file_path = f'outputs/{userId}/data/keyword_clusters.json'
+        try:
+            clusters = json.loads(get_storage().read_text(file_path))
+        except FileNotFoundError:
+            return {
+                'status': 'error',
+                'message': f'No saved keyword selection: {file_path}'
+            }
+
+        return {
+            'status': 'success',
+            'clusters': clusters
+        }
+    except Exception as e:
+        print(f"Error getting keyword clusters: {str(e)}")
+        return {
+            'status': 'error',
+            'message': str(e)
+        }
+
+
+def write_keyword_details(userId: str, selected_keywords: list[str]):
+    """Get full details for selected keywords, grouped into topic clusters.
+
+    Near-duplicate keywords are clustered, and ``selected_keywords_details.json``
+    gets one entry per cluster, keyed by its head term, so the SEO crew
+    writes for each topic once. The clusters are saved in
+    ``keyword_clusters.json``.
+
+    Args:
+        userId (str): Unique identifier for the user.
+        selected_keywords (list[str]): List of selected keywords to get details for.
+
+    Raises:
+        FileNotFoundError: If the user has no SpyFu data.
+    """
+    storage = get_storage()
+    with storage.user_lock(userId):
+        rankings_data = json.loads(storage.read_text(f'outputs/{userId}/data/competitor_rankings.json'))
+        try:
+            user_rankings = json.loads(storage.read_text(f'outputs/{userId}/data/user_rankings.json'))
+        except FileNotFoundError:
+            user_rankings = {}
+
+        # The keyword picker also offers keywords the user ranks for
+        # themselves, so those are looked up too, after the competitors'
+        results = [result for domain in rankings_data for result in rankings_data[domain]['results']]
+        results += user_rankings.get('results', [])
 
         keyword_details = {}
-        for domain in rankings_data:
-            for result in rankings_data[domain]['results']:
-                if result['keyword'] in selected_keywords:
-                    if result['keyword'] not in keyword_details:
-                        keyword_details[result['keyword']] = result
+        for result in results:
+            if result['keyword'] in selected_keywords:
+                if result['keyword'] not in keyword_details:
+                    keyword_details[result['keyword']] = result
+
+        clusters = cluster_keywords(keyword_details)
+        write_artifact(
+            f'outputs/{userId}/data/keyword_clusters.json',
+            json.dumps(clusters, indent=2, ensure_ascii=False)
+        )
+        write_artifact(
+            f'outputs/{userId}/data/selected_keywords_details.json',
+            json.dumps(clustered_details(keyword_details, clusters), indent=2, ensure_ascii=False)
+        )
+
 
-        with open(f'outputs/{userId}/data/selected_keywords_details.json', 'w', encoding='utf-8') as f:
-            json.dump(keyword_details, f, indent=2, ensure_ascii=False)
+def save_keyword_details(userId: str, selected_keywords: list[str]):
+    """Save the details of selected keywords, logging instead of raising errors.
 
+    See ``write_keyword_details``.
+    """
+    try:
+        write_keyword_details(userId, selected_keywords)
     except Exception as e:
         print(f"Error getting keyword details: {str(e)}")
 
 
-def run_seo_crew(userId: str, institution_name: str, domain_url: str):
+def run_seo_crew(userId: str, institution_name: str, domain_url: str, run_id: str = None):
     """Run the SEO crew.
 
     Args:
         userId (str): Unique identifier for the user.
         school_name (str): Name of the school.
         domain_url (str): The domain URL to analyze.
+        run_id (str): Run namespace for the crew's outputs, if any. The
+            current keyword selection is copied into it, so later selections
+            do not affect a running crew.
+
+    Returns:
+        dict: Cleaned markdown and metadata per artifact, keyed by name.
     """
     try:
         print(f"Running SEO crew for user: {userId}")
+        if run_id:
+            storage = get_storage()
+            with storage.user_lock(userId):
+                selection = storage.read_text(f'outputs/{userId}/data/selected_keywords_details.json')
+            write_artifact(run_dir(userId, run_id) / 'data' / 'selected_keywords_details.json', selection)
+
         crew = SeoCrew({
             'user_id': userId,
             'institution_name': institution_name,
-            'domain_url': domain_url
+            'domain_url': domain_url,
+            'run_id': run_id
         })
-        crew.crew().kickoff()
+        with usage_scope(userId, run_id, 'seo'):
+            ProgressReporter(userId, 'seo', run_id).kickoff(crew.crew())
+        return crew.artifacts
     except Exception as e:
         print(f"Error running SEO crew: {str(e)}")
         raise
 
 
 if __name__ == "__main__":
-    # Test the workflow
-    institution_name = "Jaipuria Institute of Management"
-    domain_url = "jaipuria.ac.in"
-    output_dir = Path('outputs')
-    output_dir.mkdir(exist_ok=True)
-    (output_dir / 'data').mkdir(exist_ok=True)
-
-    # # Step 1: Fetch SpyFu data
-    # print("Fetching SpyFu data...")
-    # fetch_data_from_spyfu(domain_url, output_dir)
-
-    # # Step 2: Run analysis crew
-    # print("\nRunning analysis crew...")
-    # analysis_result = run_analysis_crew("bd79829f-34c1-492b-80a1-9c563b09c50b", institution_name, domain_url, output_dir)
-    # print("Analysis complete!")
-
-    # # Step 3: Show available keywords
-    # print("\nAvailable keywords:")
-    # keywords_response = get_available_keywords("bd79829f-34c1-492b-80a1-9c563b09c50b")
-    # if keywords_response['status'] == 'success':
-    #     print("Keywords fetched successfully")
-    # else:
-    #     print("Error retrieving keywords:", keywords_response['message'])
-
-    # # Step 4: Get user input for keyword selection
-    # print("\nEnter the numbers of keywords you want to target (comma-separated):")
-    # selections = input("> ").strip().split(',')
-    # selected_keywords = [keywords[int(i.strip()) - 1] for i in selections if i.strip().isdigit() and 0 < int(i) <= len(keywords)]
-
-    # if not selected_keywords:
-    #     print("No valid keywords selected!")
-    #     exit(1)
-
-    # print("\nSelected keywords:", selected_keywords)
-
-    # # Step 5: Save keyword details
-    # print("\nSaving keyword details...")
-    # save_keyword_details(selected_keywords)
-
-    # # Step 6: Run SEO crew with selected keywords
-    # print("\nRunning SEO crew for selected keywords...")
-    # seo_result = run_seo_crew("ef2c1a46-2511-482f-8668-935b1f219eeb", institution_name, domain_url)
-    # print("SEO crew complete!")
-
-    # # Step 7: Run blog writer crew
-    # print("\nRunning blog writer")
-    # blog_outline = input("Enter the blog outline: ")
-    # generate_blog(blog_outline, "ef2c1a46-2511-482f-8668-935b1f219eeb")
-    # print("Blog writer crew complete!")
+    # Run the pipeline for a CSV/JSONL file of institutions, e.g.
+    # python main.py institutions.csv --workers 4
+    from batch import main
+    raise SystemExit(main())
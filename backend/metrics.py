@@ -0,0 +1,271 @@
+from contextlib import contextmanager
+from collections import defaultdict
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_registry = []
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Counter:
+    """A monotonically increasing value per label set.
+
+    Args:
+        name (str): Metric name.
+        documentation (str): Help text shown in the exposition.
+        labels (tuple): Label names, passed as keyword arguments to ``inc``.
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        """Increase the counter for the given label values."""
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def collect(self):
+        """Render the counter in the Prometheus text format."""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labels, key)} {value}')
+        return lines
+
+class Gauge(Counter):
+    """A value per label set that can go up and down, e.g. bytes on disk."""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        """Set the gauge for the given label values."""
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram:
+    """Observed values bucketed per label set, e.g. latencies in seconds.
+
+    Args:
+        name (str): Metric name.
+        documentation (str): Help text shown in the exposition.
+        labels (tuple): Label names, passed as keyword arguments to ``observe``.
+        buckets (tuple): Upper bounds of the cumulative buckets.
+    """
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        """Record one observation for the given label values."""
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self._lock:
+            series = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the ``with`` block.
+
+        The block may set ``labels['outcome']`` (or any other label) through
+        the yielded dict before it exits; failures are labelled ``error``
+        when the histogram has an ``outcome`` label.
+        """
+        start = time.perf_counter()
+        if 'outcome' in self.labels:
+            labels.setdefault('outcome', 'ok')
+        try:
+            yield labels
+        except BaseException:
+            if 'outcome' in self.labels:
+                labels['outcome'] = 'error'
+            raise
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self):
+        """Render the histogram in the Prometheus text format."""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                for bound, bucket in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{_format_labels(self.labels, key, [("le", bound)])} {bucket}')
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, key, [("le", "+Inf")])} {count}')
+                lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {total}')
+                lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {count}')
+        return lines
+
+def render_metrics():
+    """Render every registered metric in the Prometheus text format.
+
+    Returns:
+        str: The exposition body for ``/metrics``.
+    """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.collect())
+    return '\n'.join(lines) + '\n'
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_seconds', 'API request latency.', ('method', 'route', 'status')
+)
+PIPELINE_STAGE_SECONDS = Histogram(
+    'pipeline_stage_seconds', 'Duration of pipeline stages (spyfu, analysis, seo, blog).', ('stage', 'outcome')
+)
+CREW_TASK_SECONDS = Histogram(
+    'crew_task_seconds', 'Duration of individual crew tasks.', ('stage', 'task')
+)
+CREW_TOOL_SECONDS = Histogram(
+    'crew_tool_seconds', 'Duration of tool executions by crew agents.', ('tool', 'outcome')
+)
+SPYFU_REQUEST_SECONDS = Histogram(
+    'spyfu_request_seconds', 'SpyFu API call latency.', ('endpoint', 'outcome')
+)
+LLM_REQUEST_SECONDS = Histogram(
+    'llm_request_seconds', 'LLM provider call latency.', ('model', 'outcome')
+)
+GEMINI_REQUEST_SECONDS = Histogram(
+    'gemini_request_seconds', 'Blog writer Gemini call latency.', ('step', 'outcome')
+)
+LLM_TOKENS = Counter(
+    'llm_tokens_total', 'LLM tokens used.', ('model', 'kind')
+)
+DOCUMENT_RENDER_SECONDS = Histogram(
+    'document_render_seconds', 'Markdown to document render latency.', ('format', 'outcome')
+)
+FILE_WRITE_SECONDS = Histogram(
+    'file_write_seconds', 'Artifact write latency.', ('artifact',)
+)
+FILE_WRITE_BYTES = Counter(
+    'file_write_bytes_total', 'Bytes written to artifacts.', ('artifact',)
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    'admission_wait_seconds', 'Time pipeline requests waited for a slot.', ('pool',)
+)
+ADMISSION_REJECTED = Counter(
+    'admission_rejected_total', 'Pipeline requests rejected because the wait queue was full.', ('pool',)
+)
+PROVIDER_WAIT_SECONDS = Histogram(
+    'provider_wait_seconds', 'Time upstream calls waited for a provider slot.', ('provider',)
+)
+OUTPUTS_BYTES = Gauge(
+    'outputs_bytes', 'Size of outputs/ at the last janitor sweep.'
+)
+OUTPUTS_EVICTIONS = Counter(
+    'outputs_evictions_total', 'User directories and runs removed from outputs/.', ('reason',)
+)
+OUTPUTS_RECLAIMED_BYTES = Counter(
+    'outputs_reclaimed_bytes_total', 'Bytes freed by deleting outputs.', ('reason',)
+)
+UPSTREAM_RETRIES = Counter(
+    'upstream_retries_total', 'Upstream calls retried after a retryable failure.', ('upstream',)
+)
+CIRCUIT_STATE = Gauge(
+    'circuit_state', 'Upstream circuit breaker state: 0 closed, 1 half open, 2 open.', ('upstream',)
+)
+MODEL_ROUTED = Counter(
+    'model_routed_total', 'LLM calls per requested and chosen model, including hedges.', ('requested', 'model')
+)
+MODEL_HEDGES = Counter(
+    'model_hedges_total', 'Hedged LLM calls by which request answered first.', ('outcome',)
+)
+CREW_TEMPLATE_BUILDS = Counter(
+    'crew_template_builds_total', 'Crew configs parsed and shared crew tools built.', ('kind',)
+)
+CASSETTE_REQUESTS = Counter(
+    'cassette_requests_total', 'Upstream calls recorded or replayed.', ('channel', 'result')
+)
+WEB_SEARCHES = Counter(
+    'web_searches_total', 'Crew web searches by whether they were cached, live, over the task limit or prefetched.', ('result',)
+)
+SPECULATIONS = Counter(
+    'speculations_total', 'Speculative SEO stage preparations by what became of them.', ('outcome',)
+)
+SCHEDULED_REFRESHES = Counter(
+    'scheduled_refreshes_total', 'Off-peak refreshes of tracked institutions.', ('stage', 'outcome')
+)
+TRACKED_REUSES = Counter(
+    'tracked_reuses_total', 'Requests served from refreshed data instead of upstream calls.', ('stage',)
+)
+BUDGET_ACTIONS = Counter(
+    'budget_actions_total', 'LLM calls downgraded or refused by a token budget.', ('budget', 'action')
+)
+
+def record_llm_usage(model, input_tokens, output_tokens):
+    """Add an LLM call's token usage to ``llm_tokens_total``."""
+    if input_tokens:
+        LLM_TOKENS.inc(input_tokens, model=model, kind='input')
+    if output_tokens:
+        LLM_TOKENS.inc(output_tokens, model=model, kind='output')
+
+def _seconds(start_time, end_time):
+    delta = end_time - start_time
+    return delta.total_seconds() if hasattr(delta, 'total_seconds') else float(delta)
+
+def _on_llm_success(kwargs, response, start_time, end_time):
+    model = kwargs.get('model', 'unknown')
+    LLM_REQUEST_SECONDS.observe(_seconds(start_time, end_time), model=model, outcome='ok')
+    usage = getattr(response, 'usage', None)
+    if usage:
+        record_llm_usage(model, getattr(usage, 'prompt_tokens', 0), getattr(usage, 'completion_tokens', 0))
+
+def _on_llm_failure(kwargs, response, start_time, end_time):
+    LLM_REQUEST_SECONDS.observe(_seconds(start_time, end_time), model=kwargs.get('model', 'unknown'), outcome='error')
+
+def install_llm_hooks():
+    """Record latency and tokens of every crew LLM call made through litellm.
+
+    The hooks are plain functions on litellm's success and failure callback
+    lists, which crewai leaves in place when it swaps its own token handlers.
+    """
+    import litellm
+    if _on_llm_success not in litellm.success_callback:
+        litellm.success_callback.append(_on_llm_success)
+    if _on_llm_failure not in litellm.failure_callback:
+        litellm.failure_callback.append(_on_llm_failure)
+
+def instrument_tools(tools):
+    """Time each tool's executions in ``crew_tool_seconds``.
+
+    Args:
+        tools (list): crewai tool instances.
+
+    Returns:
+        list: The same tools, instrumented.
+    """
+    for tool in tools:
+        run = tool._run
+
+        def timed_run(*args, _run=run, _name=tool.name, **kwargs):
+            with CREW_TOOL_SECONDS.time(tool=_name):
+                return _run(*args, **kwargs)
+
+        # Set on the instance directly; pydantic would reject the assignment
+        object.__setattr__(tool, '_run', timed_run)
+    return tools
@@ -0,0 +1,154 @@
+from metrics import FILE_WRITE_BYTES, FILE_WRITE_SECONDS
+from storage import get_storage
+from pathlib import Path
+import re
+
+HEADING_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+TABLE_SEPARATOR_RE = re.compile(r'^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$')
+
+def _is_fence(line):
+    return line.strip().startswith(('```', '~~~'))
+
+def strip_fences(lines, metadata):
+    """Drop the bare and ``markdown`` code fences LLMs wrap their output in.
+
+    Code blocks fenced with another language are kept, closing fence included.
+    """
+    closing = None
+    for line in lines:
+        fence = line.strip()
+        if closing:
+            if fence == closing:
+                closing = None
+        elif fence in ('```markdown', '```'):
+            continue
+        elif _is_fence(line):
+            closing = fence[:3]
+        yield line
+
+def _cells(line):
+    line = line.strip()
+    if line.startswith('|'):
+        line = line[1:]
+    if line.endswith('|'):
+        line = line[:-1]
+    return [cell.strip() for cell in re.split(r'(?<!\\)\|', line)]
+
+def _separator_cell(cell):
+    left = cell.startswith(':')
+    right = cell.endswith(':') and len(cell) > 1
+    return f"{':' if left else ''}---{':' if right else ''}"
+
+def _format_table(rows):
+    """Pad table rows to the widest row's column count with consistent pipes.
+
+    Header and separator rows are widened too, so no cell is dropped.
+    """
+    rows = [_cells(row) for row in rows]
+    width = max(len(cells) for cells in rows)
+    formatted = []
+    for index, cells in enumerate(rows):
+        if index == 1:
+            cells = [_separator_cell(cell) for cell in cells]
+            cells += ['---'] * (width - len(cells))
+        else:
+            cells += [''] * (width - len(cells))
+        formatted.append('| ' + ' | '.join(cells) + ' |\n')
+    return formatted
+
+def _flush_table(table, metadata):
+    """Format a buffered table, or return its lines as-is if it is not one."""
+    if len(table) > 1 and TABLE_SEPARATOR_RE.match(table[1]):
+        metadata['tables'] = metadata.get('tables', 0) + 1
+        return _format_table(table)
+    return table
+
+def normalize_tables(lines, metadata):
+    """Normalize pipe tables so every row has the same column count.
+
+    Rows are buffered one table at a time; other lines, and lines inside
+    fenced code blocks, pass straight through.
+    """
+    table = []
+    in_code = False
+    for line in lines:
+        if _is_fence(line):
+            in_code = not in_code
+        elif not in_code and line.strip().startswith('|'):
+            table.append(line)
+            continue
+        if table:
+            yield from _flush_table(table, metadata)
+            table = []
+        yield line
+    if table:
+        yield from _flush_table(table, metadata)
+
+def collect_sections(lines, metadata):
+    """Record headings and word count while passing lines through."""
+    sections = metadata.setdefault('sections', [])
+    words = 0
+    for line in lines:
+        heading = HEADING_RE.match(line)
+        if heading:
+            sections.append({'level': len(heading.group(1)), 'title': heading.group(2)})
+        words += len(line.split())
+        yield line
+    metadata['words'] = words
+
+DEFAULT_TRANSFORMS = (strip_fences, normalize_tables, collect_sections)
+
+def process_markdown(text, transforms=DEFAULT_TRANSFORMS):
+    """Run markdown through the post-processing transforms in one pass.
+
+    Each transform is a generator ``transform(lines, metadata)`` that
+    consumes lines and yields lines, so they chain lazily and the text is
+    traversed once regardless of how many transforms run.
+
+    Args:
+        text (str): Raw markdown produced by a crew or the blog writer.
+        transforms (tuple): Transforms to apply, in order.
+
+    Returns:
+        tuple: ``(content, metadata)`` with the cleaned markdown and what
+        the transforms extracted from it.
+    """
+    metadata = {}
+    lines = iter(text.splitlines(keepends=True))
+    for transform in transforms:
+        lines = transform(lines, metadata)
+    return ''.join(lines), metadata
+
+def write_artifact(path, content):
+    """Write a text artifact atomically to the artifact store.
+
+    Args:
+        path (Path): Destination file.
+        content (str): Text to write.
+    """
+    path = Path(path)
+    with FILE_WRITE_SECONDS.time(artifact=path.name):
+        size = get_storage().write_text(path, content)
+    FILE_WRITE_BYTES.inc(size, artifact=path.name)
+
+def save_artifact(path, artifacts, key):
+    """Build a crewai task callback that post-processes and saves the output.
+
+    Used in place of ``Task(output_file=...)`` so the artifact is cleaned
+    and written once, and the cleaned content is kept in memory for the
+    API response.
+
+    Args:
+        path (Path): Destination markdown file.
+        artifacts (dict): Collects ``key -> {'content', 'metadata'}``.
+        key (str): Key under which to store this task's result.
+
+    Returns:
+        callable: Callback taking the task's ``TaskOutput``.
+    """
+    def callback(output):
+        content, metadata = process_markdown(output.raw)
+        write_artifact(path, content)
+        artifacts[key] = {'content': content, 'metadata': metadata}
+        print(f"✅ Saved to: {path}")
+    return callback
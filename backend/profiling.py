@@ -0,0 +1,267 @@
+from contextvars import ContextVar
+from contextlib import contextmanager
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+import functools
+import threading
+import cProfile
+import asyncio
+import pstats
+import time
+import uuid
+import sys
+import os
+
+# Profile every call of the decorated endpoints: '', 'cprofile' or 'sample'
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "").lower()
+# Run a process-wide sampler for the lifetime of the server
+PROFILE_SAMPLER = os.getenv("PROFILE_SAMPLER", "").lower() in ("1", "true", "yes")
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.01"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "profiles"))
+
+PROFILE_MODES = ('cprofile', 'sample')
+
+# Set per request from the X-Profile header by the profiling middleware
+requested_profile = ContextVar('requested_profile', default='')
+# The profile of the request being handled, followed into executor threads
+active_profile = ContextVar('active_profile', default=None)
+
+def parse_profile_header(value):
+    """Map an ``X-Profile`` header value to a profiling mode.
+
+    Args:
+        value (str): Header value; ``1``/``true`` select cProfile.
+
+    Returns:
+        str: ``cprofile``, ``sample`` or an empty string.
+    """
+    value = (value or '').strip().lower()
+    if value in ('1', 'true', 'yes'):
+        return 'cprofile'
+    return value if value in PROFILE_MODES else ''
+
+class StackSampler:
+    """Sample Python stacks from a background thread.
+
+    Stacks are aggregated in collapsed form (``outer;inner count``), which
+    flamegraph.pl, speedscope and similar tools read directly. Overhead is
+    one ``sys._current_frames()`` walk per interval and nothing on the
+    sampled threads themselves.
+
+    Args:
+        thread_ids (set): Threads to sample; None samples every thread.
+        interval (float): Seconds between samples.
+    """
+
+    def __init__(self, thread_ids=None, interval=PROFILE_SAMPLE_INTERVAL):
+        self.thread_ids = thread_ids
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start sampling in a daemon thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling and wait for the sampler thread to exit."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return self
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                self.samples += 1
+                for thread_id, frame in frames.items():
+                    if thread_id == own_id or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f'{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})')
+                        frame = frame.f_back
+                    self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self, reset=False):
+        """Return the aggregated stacks in collapsed format.
+
+        Args:
+            reset (bool): Clear the aggregate after reading it.
+
+        Returns:
+            str: One ``stack count`` line per distinct stack, hottest first.
+        """
+        with self._lock:
+            lines = [f'{stack} {count}' for stack, count in self.stacks.most_common()]
+            if reset:
+                self.stacks.clear()
+                self.samples = 0
+        return '\n'.join(lines) + '\n'
+
+_global_sampler = None
+
+def start_global_sampler():
+    """Start the always-on process sampler if ``PROFILE_SAMPLER`` is set."""
+    global _global_sampler
+    if PROFILE_SAMPLER and _global_sampler is None:
+        _global_sampler = StackSampler(interval=PROFILE_SAMPLE_INTERVAL).start()
+
+def stop_global_sampler():
+    """Stop the always-on process sampler."""
+    global _global_sampler
+    if _global_sampler is not None:
+        _global_sampler.stop()
+        _global_sampler = None
+
+def global_profile(reset=False):
+    """Return the always-on sampler's collapsed stacks, or None if disabled."""
+    if _global_sampler is None:
+        return None
+    return _global_sampler.collapsed(reset=reset)
+
+def _profile_path(name, user_id, suffix):
+    """Pick where to store a profile: next to the user's outputs if known."""
+    if user_id:
+        directory = Path('outputs') / str(user_id) / 'profiles'
+    else:
+        directory = PROFILE_DIR
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    return directory / f'{name}-{stamp}-{uuid.uuid4().hex[:8]}{suffix}'
+
+class RequestProfile:
+    """Profile of one request across the threads it runs on.
+
+    cProfile mode profiles each entered thread separately and merges the
+    stats when saving. If another profiler is already active (one per
+    process on 3.12+), the thread is sampled instead.
+
+    Args:
+        mode (str): ``cprofile`` or ``sample``.
+    """
+
+    def __init__(self, mode):
+        self.mode = mode
+        self._profilers = []
+        self._sampler = None
+        self._lock = threading.Lock()
+
+    def _sample(self, thread_id):
+        with self._lock:
+            if self._sampler is None:
+                self._sampler = StackSampler(set()).start()
+            self._sampler.thread_ids.add(thread_id)
+
+    @contextmanager
+    def thread(self):
+        """Profile the current thread for the duration of a block."""
+        profiler = cProfile.Profile() if self.mode == 'cprofile' else None
+        if profiler is not None:
+            try:
+                profiler.enable()
+            except ValueError:
+                profiler = None
+        if profiler is None:
+            self._sample(threading.get_ident())
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                with self._lock:
+                    self._profilers.append(profiler)
+
+    def save(self, name, user_id):
+        """Write the profile and return its path."""
+        if self._sampler is not None:
+            self._sampler.stop()
+        if self._profilers:
+            path = _profile_path(name, user_id, '.prof')
+            stats = pstats.Stats(self._profilers[0])
+            for profiler in self._profilers[1:]:
+                stats.add(profiler)
+            stats.dump_stats(str(path))
+        else:
+            path = _profile_path(name, user_id, '.collapsed')
+            path.write_text(self._sampler.collapsed() if self._sampler else '', encoding='utf-8')
+        return path
+
+def profiled(name):
+    """Profile an endpoint when requested.
+
+    Profiling is enabled by the ``X-Profile`` request header (``1``,
+    ``cprofile`` or ``sample``) or for every call by ``PROFILE_REQUESTS``.
+    cProfile output is saved as a ``.prof`` file (open with ``pstats`` or
+    snakeviz); sampling output as ``.collapsed`` stacks. The file is stored
+    under ``outputs/<userId>/profiles`` when the call has a user ID,
+    otherwise under ``PROFILE_DIR``, and its path is returned in the
+    ``X-Profile-Path`` response header.
+
+    A synchronous endpoint is profiled on its own thread. A coroutine
+    endpoint shares the event loop with other requests, so only the work it
+    hands to the executors (``executors.run_blocking``) is profiled.
+
+    Args:
+        name (str): Prefix for saved profile files.
+
+    Returns:
+        callable: The decorator.
+    """
+    def finish(profile, user_id, start, result):
+        # Save the profile even if the call failed
+        path = profile.save(name, user_id)
+        print(f"Profile for {name} ({time.perf_counter() - start:.2f}s) saved to: {path}")
+        if hasattr(result, 'headers'):
+            result.headers['X-Profile-Path'] = str(path)
+
+    def start_profile(kwargs):
+        mode = requested_profile.get() or PROFILE_REQUESTS
+        if mode not in PROFILE_MODES:
+            return None, None
+        user_id = kwargs.get('userId') or kwargs.get('user_id') or getattr(kwargs.get('data'), 'userId', None)
+        return RequestProfile(mode), user_id
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                profile, user_id = start_profile(kwargs)
+                if profile is None:
+                    return await func(*args, **kwargs)
+                start = time.perf_counter()
+                token = active_profile.set(profile)
+                result = None
+                try:
+                    result = await func(*args, **kwargs)
+                    return result
+                finally:
+                    active_profile.reset(token)
+                    finish(profile, user_id, start, result)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profile, user_id = start_profile(kwargs)
+            if profile is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            result = None
+            try:
+                with profile.thread():
+                    result = func(*args, **kwargs)
+                return result
+            finally:
+                finish(profile, user_id, start, result)
+        return wrapper
+    return decorator
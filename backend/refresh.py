@@ -0,0 +1,266 @@
+from datetime import datetime, timezone
+from pathlib import Path
+import threading
+import json
+import re
+import os
+
+from admission import admission_status
+from documents import DOCUMENT_SOURCES
+from events import ProgressReporter
+from metrics import SCHEDULED_REFRESHES, TRACKED_REUSES
+from postprocess import process_markdown, write_artifact
+from runs import forget_run, list_runs, run_dir
+from storage import get_storage
+
+def _parse_hours(value):
+    """Parse a ``start-end`` range of hours on the 24-hour clock, e.g. ``22-5``."""
+    start, _, end = (value or '').partition('-')
+    return int(start), int(end or start)
+
+# CSV or JSONL file of institutions whose data is kept fresh, in the batch
+# input format (institution_name, domain_url); unset disables the scheduler
+TRACKED_INSTITUTIONS = os.getenv("TRACKED_INSTITUTIONS")
+# Server-local hours the refresh may run in; the end hour is exclusive
+REFRESH_HOURS = _parse_hours(os.getenv("REFRESH_HOURS", "1-5"))
+# Refresh an institution once its data is this old
+REFRESH_MAX_AGE_HOURS = float(os.getenv("REFRESH_MAX_AGE_HOURS", "20"))
+# Set to 1 to re-run the analysis crew after each SpyFu refresh
+REFRESH_ANALYSIS = os.getenv("REFRESH_ANALYSIS", "0") == "1"
+# Interactive requests reuse refreshed SpyFu data and analyses this young
+TRACKED_FRESH_HOURS = float(os.getenv("TRACKED_FRESH_HOURS", "24"))
+# Seconds between checks for institutions due a refresh
+REFRESH_INTERVAL = float(os.getenv("REFRESH_INTERVAL", "300"))
+# Minutes before a failed refresh is tried again
+REFRESH_RETRY_MINUTES = float(os.getenv("REFRESH_RETRY_MINUTES", "60"))
+
+SPYFU_FILES = ('user_rankings.json', 'competitors.json', 'competitor_rankings.json')
+
+def tracked_user_id(domain_url):
+    """The namespace refreshed data of a domain is kept in, under ``outputs/``.
+
+    The leading dot keeps the janitor from evicting it like a user.
+    """
+    domain = re.sub(r'^(https?://)?(www\.)?', '', domain_url.strip().lower()).split('/')[0]
+    return '.tracked-' + (re.sub(r'[^a-z0-9.-]+', '-', domain) or 'unknown')
+
+def _refreshed_path(user_id):
+    return Path('outputs') / user_id / 'refreshed.json'
+
+def refresh_state(user_id):
+    """When a tracked namespace was last refreshed, by stage."""
+    try:
+        return json.loads(get_storage().read_text(_refreshed_path(user_id)))
+    except FileNotFoundError:
+        return {}
+
+def _age_hours(timestamp):
+    if not timestamp:
+        return float('inf')
+    return (datetime.now(timezone.utc) - datetime.fromisoformat(timestamp)).total_seconds() / 3600
+
+def _mark_refreshed(user_id, stage, **info):
+    state = refresh_state(user_id)
+    state[stage] = {'at': datetime.now(timezone.utc).isoformat(timespec='seconds'), **info}
+    write_artifact(_refreshed_path(user_id), json.dumps(state, indent=2))
+
+def _refresh_due(user_id):
+    """Whether a tracked namespace's data is stale and did not just fail to refresh."""
+    state = refresh_state(user_id)
+    return _age_hours(state.get('spyfu', {}).get('at')) > REFRESH_MAX_AGE_HOURS \
+        and _age_hours(state.get('failed', {}).get('at')) * 60 > REFRESH_RETRY_MINUTES
+
+def tracked_spyfu_data(domain_url):
+    """Refreshed SpyFu data of a domain, if it is at most ``TRACKED_FRESH_HOURS`` old.
+
+    Returns:
+        dict: ``filename -> data`` like a fresh fetch, or None.
+    """
+    user_id = tracked_user_id(domain_url)
+    if _age_hours(refresh_state(user_id).get('spyfu', {}).get('at')) > TRACKED_FRESH_HOURS:
+        return None
+    storage = get_storage()
+    try:
+        data_set = {
+            filename: json.loads(storage.read_text(Path('outputs') / user_id / 'data' / filename))
+            for filename in SPYFU_FILES
+        }
+    except FileNotFoundError:
+        return None
+    TRACKED_REUSES.inc(stage='spyfu')
+    return data_set
+
+def reuse_tracked_analysis(user_id, institution_name, domain_url, run_id):
+    """Serve a user's analysis from a fresh scheduled analysis of the same institution.
+
+    The analysis files are copied into the user's run, which then reads
+    like one that ran the crew.
+
+    Returns:
+        dict: Cleaned markdown and metadata per artifact, like
+        ``run_analysis_crew``, or None if there is no fresh analysis.
+    """
+    tracked = tracked_user_id(domain_url)
+    refreshed = refresh_state(tracked).get('analysis', {})
+    if _age_hours(refreshed.get('at')) > TRACKED_FRESH_HOURS \
+            or (refreshed.get('institution_name') or '').lower() != institution_name.strip().lower():
+        return None
+
+    storage = get_storage()
+    source = DOCUMENT_SOURCES['analysis']
+    try:
+        content = storage.read_text(run_dir(tracked, refreshed['run_id']) / source)
+    except (FileNotFoundError, KeyError, ValueError):
+        return None
+
+    progress = ProgressReporter(user_id, 'analysis', run_id)
+    progress.start()
+    write_artifact(run_dir(user_id, run_id) / source, content)
+    content, metadata = process_markdown(content)
+    progress.finish(source='tracked', refreshed=refreshed['at'])
+    TRACKED_REUSES.inc(stage='analysis')
+    return {'analysis': {'content': content, 'metadata': metadata}}
+
+def load_tracked_institutions(path=TRACKED_INSTITUTIONS):
+    """Read the tracked institutions, or none when no file is configured."""
+    if not path:
+        return []
+    from batch import read_rows
+    return read_rows(path)
+
+def in_refresh_window(hour=None):
+    """Whether the current server-local hour is within ``REFRESH_HOURS``."""
+    hour = datetime.now().hour if hour is None else hour
+    start, end = REFRESH_HOURS
+    if start == end:
+        return True
+    return start <= hour < end if start < end else hour >= start or hour < end
+
+def interactive_load():
+    """Pipeline requests running or queued in this worker."""
+    return sum(pool['active'] + pool['queued'] for pool in admission_status().values())
+
+class Refresher:
+    """Re-fetches tracked institutions' SpyFu data in off-peak hours.
+
+    A background thread checks every ``REFRESH_INTERVAL`` seconds. Within
+    ``REFRESH_HOURS``, it refreshes institutions whose data is older than
+    ``REFRESH_MAX_AGE_HOURS``, one at a time, retrying failures after
+    ``REFRESH_RETRY_MINUTES``. With ``REFRESH_ANALYSIS`` it also re-runs
+    their analysis crew. It waits while this worker has
+    pipeline requests in flight, and its upstream calls hold provider slots
+    like any request, so it stays within ``PROVIDER_LIMITS``.
+
+    Results go to a ``.tracked-<domain>`` namespace in ``outputs/``.
+    ``fetch_spyfu_stage`` and ``/run/analysis`` serve them instead of
+    calling SpyFu or running the crew while they are fresh. Each
+    institution is claimed under a lock, so only one worker refreshes it.
+    """
+
+    def __init__(self, interval=REFRESH_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the scheduler if any institutions are tracked."""
+        if not TRACKED_INSTITUTIONS:
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='tracked-refresh', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop checking; a crew run in progress is not waited for."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh_due()
+            except Exception as e:
+                print(f"Error refreshing tracked institutions: {str(e)}")
+
+    def refresh_due(self, force=False):
+        """Refresh every tracked institution whose data is stale.
+
+        Args:
+            force (bool): Ignore the refresh window and the interactive load.
+
+        Returns:
+            int: Institutions refreshed.
+        """
+        refreshed = 0
+        for row in load_tracked_institutions():
+            if self._stop.is_set() or not (force or in_refresh_window()):
+                break
+            if not force and interactive_load():
+                # Interactive requests take priority; try again next check
+                break
+            user_id = tracked_user_id(row['domain_url'])
+            if not _refresh_due(user_id):
+                continue
+            try:
+                with get_storage().user_lock(f'{user_id}.refresh', timeout=0):
+                    refreshed += self.refresh(row)
+            except TimeoutError:
+                continue  # another worker is refreshing it
+        return refreshed
+
+    def refresh(self, row):
+        """Refresh one institution's SpyFu data, and analysis if configured.
+
+        Returns:
+            int: 1 if the SpyFu data was refreshed, else 0.
+        """
+        from main import fetch_data_from_spyfu, run_analysis_crew
+        from runs import pipeline_run
+
+        user_id = tracked_user_id(row['domain_url'])
+        # Re-check under the lock: another worker may have just finished it
+        if not _refresh_due(user_id):
+            return 0
+        output_dir = Path('outputs') / user_id
+        try:
+            print(f"Refreshing SpyFu data of {row['domain_url']}")
+            fetch_data_from_spyfu(row['domain_url'], output_dir)
+            _mark_refreshed(user_id, 'spyfu')
+            SCHEDULED_REFRESHES.inc(stage='spyfu', outcome='ok')
+        except Exception as e:
+            print(f"Error refreshing SpyFu data of {row['domain_url']}: {str(e)}")
+            _mark_refreshed(user_id, 'failed', error=str(e))
+            SCHEDULED_REFRESHES.inc(stage='spyfu', outcome='error')
+            return 0
+
+        if REFRESH_ANALYSIS:
+            try:
+                info = {'institution_name': row['institution_name'], 'domain_url': row['domain_url']}
+                with pipeline_run(user_id, 'analysis', **info) as run_id:
+                    run_analysis_crew(user_id, row['institution_name'], row['domain_url'], output_dir, run_id, fetch=False)
+                _mark_refreshed(user_id, 'analysis', run_id=run_id, **info)
+                # Only the latest analysis is served; the janitor does not sweep tracked namespaces
+                for entry in list_runs(user_id):
+                    if entry['run_id'] != run_id:
+                        forget_run(user_id, entry['run_id'])
+                        get_storage().delete_tree(run_dir(user_id, entry['run_id']))
+                SCHEDULED_REFRESHES.inc(stage='analysis', outcome='ok')
+            except Exception as e:
+                print(f"Error refreshing analysis of {row['domain_url']}: {str(e)}")
+                SCHEDULED_REFRESHES.inc(stage='analysis', outcome='error')
+        return 1
+
+    def status(self):
+        """Tracked institutions and when each was last refreshed."""
+        return {
+            'enabled': bool(TRACKED_INSTITUTIONS),
+            'window': '-'.join(str(hour) for hour in REFRESH_HOURS),
+            'institutions': [
+                {'domain_url': row['domain_url'], **refresh_state(tracked_user_id(row['domain_url']))}
+                for row in load_tracked_institutions()
+            ]
+        }
+
+refresher = Refresher()
@@ -0,0 +1,186 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from metrics import DOCUMENT_RENDER_SECONDS
+import multiprocessing
+import threading
+import asyncio
+import os
+
+# Spire.Doc output formats by file extension. Values are FileFormat member
+# names, resolved inside the worker so the parent never has to import Spire.
+RENDER_FORMATS = {
+    'docx': 'Docx2016',
+    'pdf': 'PDF',
+    'html': 'Html',
+}
+
+MEDIA_TYPES = {
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'pdf': 'application/pdf',
+    'html': 'text/html; charset=utf-8',
+}
+
+# Backend used for DOCX output: 'spire' (Spire.Doc) or 'python-docx' (the
+# native renderer in docx_renderer.py). PDF and HTML always use Spire.Doc.
+RENDER_BACKEND = os.getenv("RENDER_BACKEND", "spire").lower()
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", max(1, min(4, (os.cpu_count() or 1) - 1))))
+
+_pool = None
+_pool_lock = threading.Lock()
+_spire = None
+
+def _load_spire():
+    """Import Spire.Doc on first use within a worker."""
+    global _spire
+    if _spire is None:
+        import spire.doc as _spire
+        _spire.Document().Dispose()
+    return _spire
+
+def _init_worker():
+    """Load the configured DOCX backend once per worker so renders start warm."""
+    if RENDER_BACKEND == 'python-docx':
+        import docx_renderer  # noqa: F401
+    else:
+        _load_spire()
+
+def _save_atomic(output_path, save):
+    """Write a file through ``save(tmp_path)`` and move it into place."""
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(f'.{output_path.name}.{os.getpid()}.tmp')
+    save(tmp_path)
+    os.replace(tmp_path, output_path)
+    return str(output_path)
+
+def _render(markdown_file, outputs):
+    """Render one markdown file to several formats from a single parse.
+
+    Runs inside a pool worker. Each output is written to a temporary file and
+    moved into place, so concurrent readers never see a partial document.
+    With the python-docx backend DOCX is rendered natively and Spire.Doc is
+    only loaded if PDF or HTML is also requested.
+
+    Args:
+        markdown_file (str): Path to the markdown source.
+        outputs (dict): Format extension -> destination path.
+
+    Returns:
+        dict: Format extension -> destination path of each rendered file.
+    """
+    outputs = dict(outputs)
+    rendered = {}
+    if RENDER_BACKEND == 'python-docx' and 'docx' in outputs:
+        from docx_renderer import render_markdown_to_docx
+        rendered['docx'] = _save_atomic(
+            outputs.pop('docx'), lambda path: render_markdown_to_docx(markdown_file, path)
+        )
+    if not outputs:
+        return rendered
+
+    spire = _load_spire()
+    doc = spire.Document()
+    try:
+        doc.LoadFromFile(str(markdown_file))
+        for fmt, output_path in outputs.items():
+            file_format = getattr(spire.FileFormat, RENDER_FORMATS[fmt])
+            rendered[fmt] = _save_atomic(output_path, lambda path: doc.SaveToFile(str(path), file_format))
+        return rendered
+    finally:
+        doc.Dispose()
+
+def get_render_pool():
+    """Return the shared rendering pool, starting it on first use.
+
+    Workers are spawned rather than forked so they do not inherit the
+    server's threads and locks.
+
+    Returns:
+        ProcessPoolExecutor: The document rendering pool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=RENDER_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker
+            )
+        return _pool
+
+def _worker_ready():
+    return os.getpid()
+
+def warm_render_pool():
+    """Start every rendering worker now, so no download pays for loading the converter.
+
+    Does not wait for the workers; call at server startup.
+    """
+    pool = get_render_pool()
+    # Jobs submitted before any worker is idle each spawn a worker
+    for _ in range(RENDER_WORKERS):
+        pool.submit(_worker_ready)
+
+def _replace_broken_pool(pool):
+    """Drop a pool whose worker died, so the next render starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def shutdown_render_pool():
+    """Stop the rendering pool and wait for in-flight renders."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def submit_render(markdown_file, outputs, pool=None):
+    """Queue a render on the pool.
+
+    Args:
+        markdown_file (Path): Path to the markdown source.
+        outputs (dict): Format extension -> destination path.
+        pool (ProcessPoolExecutor): Pool to use; by default the shared one.
+
+    Returns:
+        concurrent.futures.Future: Resolves to the rendered paths.
+    """
+    unknown = set(outputs) - set(RENDER_FORMATS)
+    if unknown:
+        raise ValueError(f"Unsupported render formats: {', '.join(sorted(unknown))}")
+    return (pool or get_render_pool()).submit(
+        _render, str(markdown_file), {fmt: str(path) for fmt, path in outputs.items()}
+    )
+
+async def render_async(markdown_file, outputs):
+    """Render on the pool without blocking the event loop.
+
+    If a worker dies, e.g. killed for memory, the pool is unusable; it is
+    replaced and the render tried once more.
+
+    Args:
+        markdown_file (Path): Path to the markdown source.
+        outputs (dict): Format extension -> destination path.
+
+    Returns:
+        dict: Format extension -> destination path, or None on failure.
+    """
+    try:
+        with DOCUMENT_RENDER_SECONDS.time(format='+'.join(sorted(outputs))):
+            for attempt in range(2):
+                pool = get_render_pool()
+                try:
+                    return await asyncio.wrap_future(submit_render(markdown_file, outputs, pool))
+                except BrokenProcessPool:
+                    print(f"Rendering pool broke while rendering {markdown_file}; starting a new one")
+                    _replace_broken_pool(pool)
+                    if attempt:
+                        raise
+    except Exception as e:
+        print(f"Error rendering {markdown_file}: {str(e)}")
+        return None
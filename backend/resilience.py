@@ -0,0 +1,351 @@
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import http.client
+import contextvars
+import functools
+import threading
+import asyncio
+import random
+import time
+import os
+
+from metrics import CIRCUIT_STATE, UPSTREAM_RETRIES
+
+# Seconds one upstream call may take before it is abandoned and retried
+SPYFU_TIMEOUT = float(os.getenv("SPYFU_TIMEOUT", "30"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "180"))
+# Attempts per call, and the backoff between them (full jitter, doubling
+# from the base delay up to the maximum)
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "1"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "20"))
+# Consecutive failures that open an upstream's circuit, and how long it
+# stays open before a trial call is let through
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+# Overall time budget of one pipeline request
+PIPELINE_DEADLINE = float(os.getenv("PIPELINE_DEADLINE", "900"))
+
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request has used up its time budget."""
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+    def __init__(self, upstream, retry_after):
+        super().__init__(f'{upstream} is unavailable, retry in {retry_after:.0f}s')
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+class ProviderBusy(Exception):
+    """Raised when no local call slot of a provider frees up in time.
+
+    The upstream was never called, so this is neither retried nor counted
+    against its circuit breaker.
+    """
+
+    def __init__(self, provider):
+        super().__init__(f'Timed out waiting for a {provider} call slot')
+        self.provider = provider
+
+class RetryableStatus(Exception):
+    """An upstream answered with a status worth retrying, e.g. 429 or 503."""
+
+    def __init__(self, upstream, status_code, body='', retry_after=None):
+        super().__init__(f'{upstream} returned {status_code}: {body[:200]}')
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+_deadline = contextvars.ContextVar('deadline', default=None)
+_llm_attempt_timeout = contextvars.ContextVar('llm_attempt_timeout', default=None)
+
+@contextmanager
+def deadline(seconds=PIPELINE_DEADLINE):
+    """Give the calls made in a block an overall time budget.
+
+    The deadline lives in a context variable, so it follows the request
+    into crew tool and LLM calls on the same thread and into threads
+    started with a copy of the context. A nested deadline can only shorten
+    the budget.
+    """
+    expires = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(expires if current is None else min(current, expires))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining():
+    """Seconds left before the current deadline, or None without one."""
+    expires = _deadline.get()
+    return None if expires is None else expires - time.monotonic()
+
+def check_deadline():
+    """Raise ``DeadlineExceeded`` if the current deadline has passed."""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded('Request deadline exceeded')
+
+def call_timeout(timeout):
+    """A per-call timeout shortened to fit the current deadline."""
+    left = remaining()
+    return timeout if left is None else max(min(timeout, left), 0.001)
+
+def is_retryable(error):
+    """Whether a failed call may succeed if repeated."""
+    if isinstance(error, (DeadlineExceeded, CircuitOpen, ProviderBusy)):
+        return False
+    if isinstance(error, (OSError, http.client.HTTPException)):
+        # Timeouts, refused and reset connections, malformed responses
+        return True
+    status = getattr(error, 'status_code', None) or getattr(error, 'code', None)
+    return status in RETRYABLE_STATUSES
+
+class CircuitBreaker:
+    """Fails calls fast while an upstream keeps failing.
+
+    After ``failures`` consecutive retryable failures the circuit opens
+    and calls raise ``CircuitOpen`` without reaching the upstream. Once
+    ``reset_seconds`` have passed, one trial call is let through: success
+    closes the circuit, failure opens it again.
+
+    Args:
+        name (str): Upstream name, e.g. ``spyfu`` or ``anthropic``.
+        failures (int): Consecutive failures that open the circuit.
+        reset_seconds (float): How long the circuit stays open.
+    """
+
+    def __init__(self, name, failures=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failures = max(failures, 1)
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self._failed = 0
+        self._opened = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state):
+        self.state = state
+        CIRCUIT_STATE.set({'closed': 0, 'half_open': 1, 'open': 2}[state], upstream=self.name)
+
+    def allow(self):
+        """Check that a call may go ahead.
+
+        Raises:
+            CircuitOpen: If the circuit is open.
+        """
+        with self._lock:
+            if self.state == 'closed':
+                return
+            waited = time.monotonic() - self._opened
+            if self.state == 'open' and waited >= self.reset_seconds:
+                self._set_state('half_open')
+            if self.state == 'half_open' and not self._trial:
+                self._trial = True
+                return
+            raise CircuitOpen(self.name, max(self.reset_seconds - waited, 1))
+
+    def is_open(self):
+        return self.state == 'open' and time.monotonic() - self._opened < self.reset_seconds
+
+    def release(self):
+        """Give back a trial call that never reached the upstream."""
+        with self._lock:
+            self._trial = False
+
+    def success(self):
+        with self._lock:
+            self._failed = 0
+            self._trial = False
+            if self.state != 'closed':
+                self._set_state('closed')
+
+    def failure(self):
+        with self._lock:
+            self._failed += 1
+            self._trial = False
+            if self.state == 'half_open' or self._failed >= self.failures:
+                self._opened = time.monotonic()
+                self._set_state('open')
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def circuit_breaker(upstream):
+    """Return the process-wide circuit breaker of an upstream."""
+    with _breakers_lock:
+        if upstream not in _breakers:
+            _breakers[upstream] = CircuitBreaker(upstream)
+        return _breakers[upstream]
+
+def breaker_status():
+    """State of each upstream's circuit."""
+    with _breakers_lock:
+        return {name: breaker.state for name, breaker in sorted(_breakers.items())}
+
+def _retry_after_seconds(value):
+    """Seconds to wait from a ``Retry-After`` value, or None if it cannot be parsed.
+
+    The header is either delta-seconds or an HTTP date.
+    """
+    try:
+        return max(float(value), 0)
+    except (TypeError, ValueError):
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if when is None:
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0)
+
+def _backoff(attempt, error):
+    retry_after = _retry_after_seconds(getattr(error, 'retry_after', None))
+    if retry_after is not None:
+        return min(retry_after, RETRY_MAX_DELAY)
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+
+def _retry_delay(upstream, breaker, attempt, error):
+    """Record a failed attempt and decide whether to try again.
+
+    Returns:
+        float: Seconds to back off before the next attempt, or None if the
+        error should be raised.
+    """
+    if isinstance(error, ProviderBusy):
+        # Local overload says nothing about the upstream's health
+        breaker.release()
+        return None
+    if not is_retryable(error):
+        # The upstream answered; the request itself was at fault
+        breaker.success()
+        return None
+    breaker.failure()
+    delay = _backoff(attempt, error)
+    left = remaining()
+    if attempt >= RETRY_ATTEMPTS or (left is not None and delay >= left):
+        return None
+    UPSTREAM_RETRIES.inc(upstream=upstream)
+    print(f"Retrying {upstream} call in {delay:.1f}s after: {str(error)}")
+    return delay
+
+def resilient_call(upstream, call, timeout):
+    """Call an upstream with retries, its circuit breaker and the deadline.
+
+    Args:
+        upstream (str): Upstream name, e.g. ``spyfu`` or ``openai``.
+        call (callable): Makes one attempt given its timeout in seconds.
+        timeout (float): Per-attempt timeout, shortened to fit the deadline.
+
+    Returns:
+        The call's result.
+
+    Raises:
+        DeadlineExceeded: If the deadline passes before a call succeeds.
+        CircuitOpen: If the upstream's circuit is open.
+        ProviderBusy: If no local call slot of the upstream frees up in time.
+    """
+    breaker = circuit_breaker(upstream)
+    attempt = 0
+    while True:
+        attempt += 1
+        check_deadline()
+        breaker.allow()
+        try:
+            result = call(call_timeout(timeout))
+        except Exception as e:
+            delay = _retry_delay(upstream, breaker, attempt, e)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            continue
+        breaker.success()
+        return result
+
+async def resilient_call_async(upstream, call, timeout):
+    """``resilient_call`` for coroutines.
+
+    Each attempt is cancelled when its timeout passes, so upstreams without
+    a timeout of their own are bounded too, and backoff waits do not block
+    the event loop.
+
+    Args:
+        upstream (str): Upstream name, e.g. ``spyfu`` or ``gemini``.
+        call (callable): Returns an awaitable attempt given its timeout in seconds.
+        timeout (float): Per-attempt timeout, shortened to fit the deadline.
+    """
+    breaker = circuit_breaker(upstream)
+    attempt = 0
+    while True:
+        attempt += 1
+        check_deadline()
+        breaker.allow()
+        attempt_timeout = call_timeout(timeout)
+        try:
+            try:
+                result = await asyncio.wait_for(call(attempt_timeout), attempt_timeout)
+            except asyncio.TimeoutError:
+                # Cut short by the request's deadline rather than the call's timeout
+                check_deadline()
+                raise TimeoutError(f'Call did not finish within {attempt_timeout:.3g}s')
+        except Exception as e:
+            delay = _retry_delay(upstream, breaker, attempt, e)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            continue
+        breaker.success()
+        return result
+
+def install_llm_resilience():
+    """Apply retries, circuit breakers and the deadline to every crewai ``LLM.call``.
+
+    Each attempt's timeout is ``LLM_TIMEOUT`` shortened to fit the
+    deadline. ``LLM.call`` takes no timeout, so the attempt's timeout is
+    passed to the ``litellm.completion`` it makes, which enforces it.
+    Install after the provider limits, so backoff sleeps do not hold a
+    provider slot.
+    """
+    import litellm
+    from crewai import LLM
+    from admission import provider_for_model
+
+    completion = litellm.completion
+    if not getattr(completion, 'deadline_bounded', False):
+        @functools.wraps(completion)
+        def bounded_completion(*args, **kwargs):
+            timeout = _llm_attempt_timeout.get()
+            if timeout is not None:
+                kwargs['timeout'] = min(kwargs.get('timeout') or timeout, timeout)
+            return completion(*args, **kwargs)
+
+        bounded_completion.deadline_bounded = True
+        litellm.completion = bounded_completion
+
+    call = LLM.call
+    if getattr(call, 'resilient', False):
+        return
+
+    def attempt(self, args, kwargs, timeout):
+        token = _llm_attempt_timeout.set(timeout)
+        try:
+            return call(self, *args, **kwargs)
+        finally:
+            _llm_attempt_timeout.reset(token)
+
+    @functools.wraps(call)
+    def resilient_llm_call(self, *args, **kwargs):
+        return resilient_call(
+            provider_for_model(self.model), lambda timeout: attempt(self, args, kwargs, timeout), LLM_TIMEOUT
+        )
+
+    resilient_llm_call.resilient = True
+    LLM.call = resilient_llm_call
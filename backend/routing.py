@@ -0,0 +1,321 @@
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from collections import deque
+import contextvars
+import functools
+import threading
+import asyncio
+import random
+import time
+import os
+
+from admission import provider_for_model
+from metrics import MODEL_HEDGES, MODEL_ROUTED
+from resilience import LLM_TIMEOUT, circuit_breaker
+
+def _parse_equivalents(value):
+    """Parse groups of interchangeable models, e.g. ``a|b,c|d``."""
+    groups = []
+    for group in (value or '').split(','):
+        models = [model.strip() for model in group.split('|') if model.strip()]
+        if len(models) > 1:
+            groups.append(models)
+    return groups
+
+# 'fastest' sends each LLM call to the fastest healthy model of its
+# equivalence set; off by default, so every agent keeps its configured model
+MODEL_ROUTING = os.getenv("MODEL_ROUTING", "").lower()
+# Interchangeable models, groups separated by ',' and models by '|'; the
+# first model of a group is preferred until there is latency data
+MODEL_EQUIVALENTS = _parse_equivalents(os.getenv(
+    "MODEL_EQUIVALENTS",
+    "claude-3-5-sonnet-20241022|gpt-4o,gemini-2.0-flash-exp|gemini-2.0-flash"
+))
+# Send a backup request to another model once a call runs longer than this
+# latency percentile of its model; 0 disables hedging
+MODEL_HEDGE_PERCENTILE = float(os.getenv("MODEL_HEDGE_PERCENTILE", "0"))
+# Calls remembered per model, and how long a sample counts
+ROUTING_WINDOW = 200
+ROUTING_WINDOW_SECONDS = 15 * 60
+# Samples needed before a model's latency is trusted
+ROUTING_MIN_SAMPLES = 10
+# Models failing more often than this are skipped while others are healthy
+ROUTING_MAX_ERROR_RATE = 0.5
+# Share of calls sent to a model with too few samples, to learn its latency
+ROUTING_EXPLORE = 0.05
+
+API_KEY_VARS = {'anthropic': 'ANTHROPIC_API_KEY', 'openai': 'OPENAI_API_KEY', 'gemini': 'GEMINI_API_KEY'}
+
+def _percentile(values, percentile):
+    values = sorted(values)
+    index = min(int(len(values) * percentile / 100), len(values) - 1)
+    return values[index]
+
+class LatencyWindow:
+    """Rolling latency and error samples of one model."""
+
+    def __init__(self, size=ROUTING_WINDOW, max_age=ROUTING_WINDOW_SECONDS):
+        self.max_age = max_age
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds, ok):
+        with self._lock:
+            self._samples.append((time.monotonic(), seconds, ok))
+
+    def _recent(self):
+        cutoff = time.monotonic() - self.max_age
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            return list(self._samples)
+
+    def summary(self):
+        """Sample count, error rate and p50/p95 latency of successful calls."""
+        samples = self._recent()
+        latencies = [seconds for _, seconds, ok in samples if ok]
+        return {
+            'samples': len(samples),
+            'error_rate': round(1 - len(latencies) / len(samples), 3) if samples else 0.0,
+            'p50': round(_percentile(latencies, 50), 3) if latencies else None,
+            'p95': round(_percentile(latencies, 95), 3) if latencies else None
+        }
+
+    def percentile(self, percentile):
+        """Latency percentile of successful calls, or None without enough samples."""
+        latencies = [seconds for _, seconds, ok in self._recent() if ok]
+        if len(latencies) < ROUTING_MIN_SAMPLES:
+            return None
+        return _percentile(latencies, percentile)
+
+class ModelRouter:
+    """Picks the model for each LLM call and optionally hedges slow calls.
+
+    Every call's latency and outcome is tracked per model. With routing
+    enabled, a call to a model that belongs to an equivalence set goes to
+    the set's healthy model with the lowest median latency, adjusted for
+    its error rate; models whose provider's circuit is open are tried
+    last. With hedging enabled, a call still running at its model's
+    ``hedge_percentile`` latency gets a backup request to another model of
+    the set, preferably from another provider, and the first
+    successful answer wins. In ``call`` the loser cannot be interrupted;
+    it finishes in the background and its answer is dropped. ``acall``
+    cancels it.
+
+    Args:
+        equivalents (list): Groups of interchangeable model names.
+        enabled (bool): Route calls; otherwise only track them.
+        hedge_percentile (float): Hedge threshold; 0 disables hedging.
+    """
+
+    def __init__(self, equivalents, enabled=False, hedge_percentile=0):
+        self.enabled = enabled
+        self.hedge_percentile = hedge_percentile
+        self._groups = {model: group for group in equivalents for model in group}
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def window(self, model):
+        with self._lock:
+            if model not in self._windows:
+                self._windows[model] = LatencyWindow()
+            return self._windows[model]
+
+    def _score(self, model):
+        """Median latency inflated by errors; None if the model is unproven or failing."""
+        summary = self.window(model).summary()
+        if summary['samples'] < ROUTING_MIN_SAMPLES:
+            return None
+        if summary['error_rate'] > ROUTING_MAX_ERROR_RATE:
+            return float('inf')
+        if summary['p50'] is None:
+            return float('inf')
+        return summary['p50'] / max(1 - summary['error_rate'], 0.1)
+
+    def candidates(self, model):
+        """Models to try for a call to ``model``, best first."""
+        group = self._groups.get(model)
+        if not self.enabled or not group:
+            return [model]
+        # The requested model first among equals, then the set's order
+        group = [model] + [other for other in group if other != model]
+        scores = {candidate: self._score(candidate) for candidate in group}
+        unproven = [candidate for candidate in group if scores[candidate] is None]
+        if unproven and random.random() < ROUTING_EXPLORE:
+            explore = random.choice(unproven)
+            return [explore] + [candidate for candidate in group if candidate != explore]
+        proven = sorted((candidate for candidate in group if scores[candidate] is not None), key=scores.get)
+        healthy = [candidate for candidate in proven if scores[candidate] != float('inf')]
+        failing = [candidate for candidate in proven if scores[candidate] == float('inf')]
+        order = healthy + unproven + failing
+        # Models whose provider's circuit is open go last
+        return sorted(order, key=lambda candidate: circuit_breaker(provider_for_model(candidate)).is_open())
+
+    def _backup(self, primary, candidates):
+        others = [candidate for candidate in candidates if candidate != primary]
+        for candidate in others:
+            if provider_for_model(candidate) != provider_for_model(primary):
+                return candidate
+        return others[0] if others else None
+
+    def _timed(self, model, invoke):
+        start = time.perf_counter()
+        try:
+            result = invoke(model)
+        except Exception:
+            self.window(model).add(time.perf_counter() - start, False)
+            raise
+        self.window(model).add(time.perf_counter() - start, True)
+        return result
+
+    def _start(self, model, invoke):
+        """Run a call on its own thread, keeping the caller's context."""
+        future = Future()
+        context = contextvars.copy_context()
+
+        def run():
+            try:
+                future.set_result(context.run(self._timed, model, invoke))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name=f'llm-{model}', daemon=True).start()
+        return future
+
+    def _plan(self, model):
+        """Primary model, backup model and hedge delay of a call to ``model``."""
+        candidates = self.candidates(model)
+        primary = candidates[0]
+        MODEL_ROUTED.inc(requested=model, model=primary)
+        backup = self._backup(primary, candidates) if self.hedge_percentile else None
+        hedge_after = self.window(primary).percentile(self.hedge_percentile) if backup else None
+        return primary, backup, hedge_after
+
+    def call(self, model, invoke):
+        """Make a call through the router.
+
+        Args:
+            model (str): The model the caller asked for.
+            invoke (callable): Makes the call given the model to use.
+
+        Returns:
+            The first successful result.
+        """
+        primary, backup, hedge_after = self._plan(model)
+        if hedge_after is None:
+            return self._timed(primary, invoke)
+
+        first = self._start(primary, invoke)
+        done, _ = wait([first], timeout=hedge_after)
+        if done and first.exception() is None:
+            return first.result()
+
+        MODEL_ROUTED.inc(requested=model, model=backup)
+        second = self._start(backup, invoke)
+        pending = {first: 'primary', second: 'backup'}
+        error = None
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                outcome = pending.pop(future)
+                if future.exception() is None:
+                    MODEL_HEDGES.inc(outcome=outcome)
+                    return future.result()
+                error = future.exception()
+        MODEL_HEDGES.inc(outcome='failed')
+        raise error
+
+    async def _atimed(self, model, invoke):
+        start = time.perf_counter()
+        try:
+            result = await invoke(model)
+        except Exception:
+            self.window(model).add(time.perf_counter() - start, False)
+            raise
+        self.window(model).add(time.perf_counter() - start, True)
+        return result
+
+    async def acall(self, model, invoke):
+        """``call`` for coroutines.
+
+        Hedged attempts run as tasks on the event loop, and the losing
+        attempt is cancelled instead of left running.
+
+        Args:
+            model (str): The model the caller asked for.
+            invoke (callable): Returns an awaitable call given the model to use.
+        """
+        primary, backup, hedge_after = self._plan(model)
+        if hedge_after is None:
+            return await self._atimed(primary, invoke)
+
+        first = asyncio.ensure_future(self._atimed(primary, invoke))
+        done, _ = await asyncio.wait([first], timeout=hedge_after)
+        if done and first.exception() is None:
+            return first.result()
+
+        MODEL_ROUTED.inc(requested=model, model=backup)
+        second = asyncio.ensure_future(self._atimed(backup, invoke))
+        pending = {first: 'primary', second: 'backup'}
+        error = None
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pending.pop(task)
+                    error = task.exception() or error
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is not None:
+                    MODEL_HEDGES.inc(outcome='primary' if winner is first else 'backup')
+                    return winner.result()
+        finally:
+            for task in pending:
+                task.cancel()
+        MODEL_HEDGES.inc(outcome='failed')
+        raise error
+
+    def status(self):
+        """Rolling latency and error rate per model."""
+        with self._lock:
+            models = sorted(self._windows)
+        return {
+            model: {'provider': provider_for_model(model), **self.window(model).summary()}
+            for model in models
+        }
+
+model_router = ModelRouter(MODEL_EQUIVALENTS, MODEL_ROUTING == 'fastest', MODEL_HEDGE_PERCENTILE)
+
+_llms = {}
+_llms_lock = threading.Lock()
+
+def llm_for(llm, model):
+    """The crewai LLM for ``model``, reusing ``llm``'s settings."""
+    if model == llm.model:
+        return llm
+    from crewai import LLM
+    with _llms_lock:
+        if model not in _llms:
+            _llms[model] = LLM(
+                model=model,
+                api_key=os.getenv(API_KEY_VARS[provider_for_model(model)]),
+                temperature=llm.temperature,
+                timeout=LLM_TIMEOUT
+            )
+        return _llms[model]
+
+def install_model_routing():
+    """Send every crewai ``LLM.call`` through ``model_router``.
+
+    Install after the provider limits and cassette, so each routed or
+    hedged attempt still holds its own provider slot and is recorded.
+    """
+    from crewai import LLM
+    call = LLM.call
+    if getattr(call, 'routed', False):
+        return
+
+    @functools.wraps(call)
+    def routed_call(self, messages, *args, **kwargs):
+        return model_router.call(self.model, lambda model: call(llm_for(self, model), messages, *args, **kwargs))
+
+    routed_call.routed = True
+    LLM.call = routed_call
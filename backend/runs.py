@@ -0,0 +1,148 @@
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+import json
+import uuid
+import re
+
+from postprocess import write_artifact
+from executors import run_io
+from storage import get_storage
+
+RUN_ID_RE = re.compile(r'^[0-9a-f]{12}$')
+# Folders of a run namespace that hold its artifacts
+RUN_FOLDERS = ('crew', 'blogs', 'data')
+
+def is_valid_run_id(run_id):
+    """Check that a client-supplied run ID is well formed."""
+    return bool(run_id and RUN_ID_RE.match(run_id))
+
+def run_dir(user_id, run_id):
+    """Return the namespace directory of one pipeline run.
+
+    Raises:
+        ValueError: If the run ID is malformed.
+    """
+    if not is_valid_run_id(run_id):
+        raise ValueError(f'Invalid run ID: {run_id}')
+    return Path('outputs') / str(user_id) / 'runs' / run_id
+
+def _index_path(user_id):
+    return Path('outputs') / str(user_id) / 'runs' / 'index.json'
+
+def list_runs(user_id):
+    """Return the user's runs, oldest first.
+
+    Returns:
+        list: One dict per run with ``run_id``, ``kind``, ``status``,
+        ``started``, ``finished`` and ``files`` (paths relative to the run).
+    """
+    try:
+        return json.loads(get_storage().read_text(_index_path(user_id)))
+    except FileNotFoundError:
+        return []
+
+def _update_run(user_id, run_id, **fields):
+    """Insert or update a run in the user's index under the user's lock."""
+    storage = get_storage()
+    with storage.user_lock(user_id):
+        index = list_runs(user_id)
+        for entry in index:
+            if entry['run_id'] == run_id:
+                entry.update(fields)
+                break
+        else:
+            index.append({'run_id': run_id, **fields})
+        write_artifact(_index_path(user_id), json.dumps(index, indent=2, ensure_ascii=False))
+
+def forget_run(user_id, run_id):
+    """Remove a run from the user's index, e.g. before its files are evicted."""
+    storage = get_storage()
+    with storage.user_lock(user_id):
+        index = [entry for entry in list_runs(user_id) if entry['run_id'] != run_id]
+        write_artifact(_index_path(user_id), json.dumps(index, indent=2, ensure_ascii=False))
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+def run_files(user_id, run_id):
+    """List the artifacts a run produced, relative to its directory."""
+    storage = get_storage()
+    base = run_dir(user_id, run_id)
+    return [
+        path.relative_to(base).as_posix()
+        for folder in RUN_FOLDERS
+        for path in storage.list(base / folder)
+    ]
+
+def _start_run(user_id, kind, info):
+    run_id = uuid.uuid4().hex[:12]
+    _update_run(user_id, run_id, kind=kind, status='running', started=_now(), **info)
+    return run_id
+
+def _finish_run(user_id, run_id, error=None):
+    if error is None:
+        _update_run(user_id, run_id, status='success', finished=_now(), files=run_files(user_id, run_id))
+    else:
+        _update_run(user_id, run_id, status='error', finished=_now(), error=str(error),
+                    files=run_files(user_id, run_id))
+
+@contextmanager
+def pipeline_run(user_id, kind, **info):
+    """Record a pipeline run in the user's index for the duration of a block.
+
+    Each run writes into its own ``outputs/<userId>/runs/<runId>``
+    namespace, so one user can run several pipelines concurrently without
+    them overwriting each other's files.
+
+    Args:
+        user_id (str): Unique identifier for the user.
+        kind (str): ``analysis``, ``seo`` or ``blog``.
+        **info: Extra JSON-serializable fields for the index entry.
+
+    Yields:
+        str: The new run ID.
+    """
+    run_id = _start_run(user_id, kind, info)
+    try:
+        yield run_id
+    except BaseException as e:
+        _finish_run(user_id, run_id, e)
+        raise
+    _finish_run(user_id, run_id)
+
+@asynccontextmanager
+async def pipeline_run_async(user_id, kind, **info):
+    """``pipeline_run`` for coroutines; the index is updated on the I/O executor."""
+    run_id = await run_io(_start_run, user_id, kind, info)
+    try:
+        yield run_id
+    except BaseException as e:
+        await run_io(_finish_run, user_id, run_id, e)
+        raise
+    await run_io(_finish_run, user_id, run_id)
+
+def resolve_artifact(user_id, relative, run_id=None):
+    """Find the directory holding a user's artifact.
+
+    Args:
+        user_id (str): Unique identifier for the user.
+        relative (Path): Artifact path within a run, e.g. ``crew/1_analysis.md``.
+        run_id (str): Look only in this run; by default the latest
+            successful run that produced the artifact, then the user's
+            directory for files written before runs were namespaced.
+
+    Returns:
+        Path: The base directory, or None if the artifact does not exist.
+    """
+    storage = get_storage()
+    if run_id:
+        base = run_dir(user_id, run_id)
+        return base if storage.exists(base / relative) else None
+
+    relative = Path(relative).as_posix()
+    for entry in reversed(list_runs(user_id)):
+        if entry.get('status') == 'success' and relative in entry.get('files', ()):
+            return run_dir(user_id, entry['run_id'])
+    base = Path('outputs') / str(user_id)
+    return base if storage.exists(base / relative) else None
@@ -3,28 +3,48 @@ from crewai.project import CrewBase, agent, crew, task
 from crewai import Agent, Crew, Task, LLM
 from dotenv import load_dotenv
 from pathlib import Path
+from tools.cached_search_tool import CachedSearchTool
+from events import ProgressReporter
+from postprocess import save_artifact
+from metrics import instrument_tools
+from cassettes import record_tools
+from storage import get_storage
+from runs import run_dir
+from resilience import LLM_TIMEOUT
+from templates import crew_templates, precompiled
 import agentops
 import os
 
 load_dotenv()
 serper_api_key = os.getenv("SERPER_API_KEY")
 
+# Site pages the ad copy specialist can search
+WEBSITE_PAGES = (
+    "https://www.jaipuria.ac.in",
+    "https://www.jaipuria.ac.in/about-us",
+    "https://www.jaipuria.ac.in/mba-programs",
+)
+
 # Initialize LLMs with respective API keys
 openai = LLM(
     model="gpt-4o",
-    api_key=os.getenv("OPENAI_API_KEY")
+    api_key=os.getenv("OPENAI_API_KEY"),
+    timeout=LLM_TIMEOUT
 )
 
 anthropic = LLM(
     model="claude-3-5-sonnet-20241022",
-    api_key=os.getenv("ANTHROPIC_API_KEY")
+    api_key=os.getenv("ANTHROPIC_API_KEY"),
+    timeout=LLM_TIMEOUT
 )
 
 gemini = LLM(
     model="gemini/gemini-2.0-flash-exp",
-    api_key=os.getenv("GEMINI_API_KEY")
+    api_key=os.getenv("GEMINI_API_KEY"),
+    timeout=LLM_TIMEOUT
 )
 
+@precompiled
 @CrewBase
 class SeoCrew():
     """SEO Content Generation Crew"""
@@ -43,15 +63,54 @@ class SeoCrew():
 
         Args:
             user_id (str): The ID of the user.
-            inputs (dict): The input data for the crew.
+            inputs (dict): The input data for the crew; an optional ``run_id``
+                selects the run namespace the outputs are saved in.
         """
         try:
             self.inputs = inputs
             self.output_dir = Path('outputs') / str(self.inputs['user_id'])
+            run_id = self.inputs.get('run_id')
+            self.run_dir = run_dir(self.inputs['user_id'], run_id) if run_id else self.output_dir
+            self.artifacts = {}
+            # Web searches of this crew's ad copy task, with their cache hits
+            # reported as progress steps
+            progress = ProgressReporter(self.inputs['user_id'], 'seo', run_id)
+            self.web_search = CachedSearchTool(
+                search=self.serper_tool(),
+                on_search=lambda stats: progress.step('web_search', **stats)
+            )
+
+            # The file tools read a local copy of the stored keyword selection
+            get_storage().fetch(self.run_dir / 'data' / 'selected_keywords_details.json')
         except Exception as e:
             print(f"Error initializing SeoCrew: {e}")
             raise
 
+    @staticmethod
+    def shared_tools():
+        """Return the website and web search tools every SeoCrew shares.
+
+        A WebsiteSearchTool embeds its site's pages when it is created, so
+        these are built once per process rather than per request.
+
+        Returns:
+            list: The shared tools.
+        """
+        return SeoCrew.website_tools() + [SeoCrew.serper_tool()]
+
+    @staticmethod
+    def website_tools():
+        """Return the shared website search tools, one per page in ``WEBSITE_PAGES``."""
+        return [
+            crew_templates.tool(('website_search', page), lambda page=page: WebsiteSearchTool(website=page))
+            for page in WEBSITE_PAGES
+        ]
+
+    @staticmethod
+    def serper_tool():
+        """Return the shared web search tool; tasks search through ``self.web_search``."""
+        return crew_templates.tool('serper', lambda: SerperDevTool(api_key=serper_api_key))
+
     @agent
     def ad_copy_specialist_agent(self) -> Agent:
         """Create an agent for generating ad copies.
@@ -97,26 +156,16 @@ class SeoCrew():
             return Task(
                 config=self.tasks_config['generate_ad_copies'],
                 agent=self.ad_copy_specialist_agent(),
-                tools=[
+                tools=instrument_tools(record_tools([
                     FileReadTool(
                         name="Read selected keywords data",
                         description="Read the selected_keywords.json file",
-                        file_path=self.output_dir / 'data' / 'selected_keywords_details.json',
+                        file_path=self.run_dir / 'data' / 'selected_keywords_details.json',
                         encoding='utf-8',
                         errors='ignore'
-                    ),
-                    WebsiteSearchTool(
-                        website="https://www.jaipuria.ac.in",
-                    ),
-                    WebsiteSearchTool(
-                        website="https://www.jaipuria.ac.in/about-us",
-                    ),
-                    WebsiteSearchTool(
-                        website="https://www.jaipuria.ac.in/mba-programs",
-                    ),
-                    SerperDevTool(api_key=serper_api_key)
-                ],
-                output_file=str(self.output_dir / 'crew' / '2_ad_copies.md')
+                    )
+                ])) + self.website_tools() + [self.web_search],
+                callback=save_artifact(self.run_dir / 'crew' / '2_ad_copies.md', self.artifacts, 'ad')
             )
         except Exception as e:
             print(f"Error generating ad copies task: {e}")
@@ -133,24 +182,24 @@ class SeoCrew():
             return Task(
                 config=self.tasks_config['generate_blog_post_outlines'],
                 agent=self.blog_outline_strategist_agent(),
-                tools=[
+                tools=instrument_tools(record_tools([
                     FileReadTool(
                         name="Read ad copies data",
                         description="Read the ad copies from 2_ad_copies.md file",
-                        file_path=self.output_dir / 'crew' / '2_ad_copies.md',
+                        file_path=self.run_dir / 'crew' / '2_ad_copies.md',
                         encoding='utf-8',
                         errors='ignore'
                     ),
                     FileReadTool(
                         name="Read selected keywords data",
                         description="Read the selected keywords details",
-                        file_path=self.output_dir / 'data' / 'selected_keywords_details.json',
+                        file_path=self.run_dir / 'data' / 'selected_keywords_details.json',
                         encoding='utf-8',
                         errors='ignore'
                     )
-                ],
+                ])),
                 context=[self.generate_ad_copies_task()],
-                output_file=str(self.output_dir / 'crew' / '3_blog_post_outlines.md')
+                callback=save_artifact(self.run_dir / 'crew' / '3_blog_post_outlines.md', self.artifacts, 'outlines')
             )
         except Exception as e:
             print(f"Error generating blog post outlines task: {e}")
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import os
+
+from clustering import cluster_keywords
+from executors import run_io
+from metrics import SPECULATIONS
+from seo_crew import SeoCrew
+from storage import get_storage
+from templates import warm_crew_class
+from tools.cached_search_tool import prefetch_search
+
+# Set to 1 to prepare a user's SEO stage while they choose keywords
+SPECULATE = os.getenv("SPECULATE", "0") == "1"
+# Keyword topics whose web searches are prefetched per user
+SPECULATIVE_SEARCHES = int(os.getenv("SPECULATIVE_SEARCHES", "5"))
+# Users prepared at once, so speculation never crowds out requests
+SPECULATIVE_CONCURRENCY = int(os.getenv("SPECULATIVE_CONCURRENCY", "2"))
+# Seconds a finished preparation waits for /run/seo before it counts as unused
+SPECULATION_TTL = float(os.getenv("SPECULATION_TTL", "1800"))
+
+def opportunity_keywords(user_id, count):
+    """The keyword topics a user's SEO crew is most likely to search for.
+
+    The head terms of the saved keyword selection when there is one.
+    Before that, the competitors' keywords the user does not rank for,
+    by search volume times the number of competitors ranking for them,
+    one per topic cluster.
+
+    Raises:
+        FileNotFoundError: If the user has no SpyFu data.
+    """
+    storage = get_storage()
+    data_dir = f'outputs/{user_id}/data'
+    try:
+        clusters = json.loads(storage.read_text(f'{data_dir}/keyword_clusters.json'))
+        return [cluster['head'] for cluster in clusters[:count]]
+    except FileNotFoundError:
+        pass
+
+    competitor_rankings = json.loads(storage.read_text(f'{data_dir}/competitor_rankings.json'))
+    try:
+        user_rankings = json.loads(storage.read_text(f'{data_dir}/user_rankings.json'))
+    except FileNotFoundError:
+        user_rankings = {}
+    ranked = {result.get('keyword') for result in user_rankings.get('results', [])}
+
+    details, competitors = {}, {}
+    for rankings in competitor_rankings.values():
+        for result in rankings.get('results', []):
+            keyword = result.get('keyword')
+            if keyword and keyword not in ranked:
+                details.setdefault(keyword, result)
+                competitors[keyword] = competitors.get(keyword, 0) + 1
+    scores = {keyword: (details[keyword].get('searchVolume') or 0) * competitors[keyword] for keyword in details}
+    # Clustering only the best candidates keeps this cheap for large rankings
+    candidates = sorted(scores, key=lambda keyword: -scores[keyword])[:count * 10]
+    clusters = cluster_keywords({keyword: {'searchVolume': scores[keyword]} for keyword in candidates})
+    return [cluster['head'] for cluster in clusters[:count]]
+
+class Speculator:
+    """Prepares users' SEO stage while they choose keywords.
+
+    Opt-in with ``SPECULATE=1``. After an analysis, and again when the
+    keyword selection is saved, the SEO crew's configs and shared tools
+    (including the website search indexes) are built if this worker has
+    not built them yet, and the web searches of the top keyword topics are
+    prefetched into the search cache the ad copy task reads. Crew
+    instances themselves carry the SEO run's ID and paths, so they are not
+    built ahead.
+
+    ``/run/seo`` claims the preparation, cancelling any part still running;
+    a preparation that is not claimed within ``SPECULATION_TTL`` is
+    forgotten, and its cached searches expire with the search cache.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        self._ready = set()
+        self._slots = asyncio.Semaphore(max(SPECULATIVE_CONCURRENCY, 1))
+
+    def start(self, user_id):
+        """Start preparing a user's SEO stage, replacing an earlier preparation.
+
+        Call from the event loop.
+        """
+        if not SPECULATE:
+            return
+        self.discard(user_id, 'replaced')
+        self._tasks[user_id] = asyncio.create_task(self._prepare(user_id))
+
+    async def _prepare(self, user_id):
+        try:
+            async with self._slots:
+                await run_io(warm_crew_class, SeoCrew)
+                keywords = await run_io(opportunity_keywords, user_id, SPECULATIVE_SEARCHES)
+                search = await run_io(SeoCrew.serper_tool)
+                for keyword in keywords:
+                    await run_io(prefetch_search, search, keyword)
+        except Exception as e:
+            print(f"Error preparing SEO stage for user {user_id}: {str(e)}")
+            SPECULATIONS.inc(outcome='failed')
+            self._forget(user_id)
+            return
+
+        self._ready.add(user_id)
+        await asyncio.sleep(SPECULATION_TTL)
+        SPECULATIONS.inc(outcome='expired')
+        self._forget(user_id)
+
+    def _forget(self, user_id):
+        if self._tasks.get(user_id) is asyncio.current_task():
+            del self._tasks[user_id]
+            self._ready.discard(user_id)
+
+    def _cancel(self, user_id):
+        """Cancel a user's preparation; return whether it had finished."""
+        task = self._tasks.pop(user_id, None)
+        ready = user_id in self._ready
+        self._ready.discard(user_id)
+        if task is None:
+            return None
+        task.cancel()
+        return ready
+
+    def claim(self, user_id):
+        """Use a user's preparation for their SEO run, stopping what is left of it."""
+        ready = self._cancel(user_id)
+        if ready is not None:
+            SPECULATIONS.inc(outcome='used' if ready else 'unfinished')
+
+    def discard(self, user_id, reason='discarded'):
+        """Drop a user's preparation, e.g. when their data is cleaned up."""
+        if self._cancel(user_id) is not None:
+            SPECULATIONS.inc(outcome=reason)
+
+    def discard_all(self):
+        for user_id in list(self._tasks):
+            self.discard(user_id)
+
+    def status(self):
+        """Users being prepared and users whose preparation is ready."""
+        return {'enabled': SPECULATE, 'preparing': len(self._tasks) - len(self._ready), 'ready': len(self._ready)}
+
+speculator = Speculator()
@@ -0,0 +1,255 @@
+from contextlib import contextmanager
+from pathlib import Path
+import threading
+import sqlite3
+import hashlib
+import shutil
+import time
+import uuid
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks only cover threads of one process
+    fcntl = None
+
+OUTPUTS_DIR = Path('outputs')
+# 'local' keeps artifacts on this machine's disk only; 'sqlite' shares them
+# between worker processes on one host through a WAL database. WAL needs
+# shared memory, so the database must not sit on a network filesystem;
+# sharing artifacts between hosts is not supported
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").lower()
+STORAGE_PATH = Path(os.getenv("STORAGE_PATH", "store/artifacts.db"))
+# Seconds to wait for another worker's per-user lock, and how long a lock
+# lives if its holder dies without releasing it
+LOCK_TIMEOUT = float(os.getenv("STORAGE_LOCK_TIMEOUT", "60"))
+LOCK_LEASE = float(os.getenv("STORAGE_LOCK_LEASE", "600"))
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+class LocalStorage:
+    """Artifacts stored as files under ``outputs/``.
+
+    Every artifact is addressed by its local path (``outputs/<userId>/...``),
+    which is also where code that needs a real file (crew file tools,
+    document rendering, downloads) finds it.
+    """
+
+    def write_bytes(self, path, data):
+        """Write an artifact atomically.
+
+        Returns:
+            int: Bytes written.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return len(data)
+
+    def write_text(self, path, text):
+        return self.write_bytes(path, text.encode('utf-8'))
+
+    def read_bytes(self, path):
+        """Read an artifact.
+
+        Raises:
+            FileNotFoundError: If the artifact does not exist.
+        """
+        return Path(path).read_bytes()
+
+    def read_text(self, path):
+        return self.read_bytes(path).decode('utf-8')
+
+    def exists(self, path):
+        return Path(path).is_file()
+
+    def fetch(self, path):
+        """Make an artifact available as a local file.
+
+        Returns:
+            Path: The local file, or None if the artifact does not exist.
+        """
+        path = Path(path)
+        return path if path.is_file() else None
+
+    def list(self, directory):
+        """List the artifacts directly inside a directory.
+
+        Returns:
+            list: Artifact paths, sorted.
+        """
+        directory = Path(directory)
+        if not directory.is_dir():
+            return []
+        return sorted(path for path in directory.iterdir() if path.is_file() and not path.name.startswith('.'))
+
+    def delete_tree(self, directory):
+        """Delete a directory of artifacts, e.g. everything of one user."""
+        if Path(directory).exists():
+            shutil.rmtree(directory)
+
+    @contextmanager
+    def user_lock(self, user_id, timeout=None):
+        """Hold an exclusive per-user lock across threads and processes.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            timeout (float): Seconds to wait; defaults to ``LOCK_TIMEOUT``.
+
+        Raises:
+            TimeoutError: If the lock is not acquired in time.
+        """
+        lock_dir = OUTPUTS_DIR / '.locks'
+        lock_dir.mkdir(parents=True, exist_ok=True)
+        with open(lock_dir / f'{user_id}.lock', 'a+') as f:
+            if fcntl is not None:
+                deadline = time.monotonic() + (LOCK_TIMEOUT if timeout is None else timeout)
+                while True:
+                    try:
+                        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        if time.monotonic() > deadline:
+                            raise TimeoutError(f'Timed out waiting for the lock of user {user_id}')
+                        time.sleep(0.05)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+class SQLiteStorage(LocalStorage):
+    """Artifacts shared between workers through a SQLite database in WAL mode.
+
+    The database is the source of truth; ``outputs/`` becomes a
+    write-through local copy. ``fetch`` refreshes the local file when it is
+    missing or differs from the stored version, so a request can be served
+    by a different worker than the one that produced its inputs. Per-user
+    locks are leases in the database, so they hold across processes and
+    expire if a worker dies.
+
+    Workers must run on the same host: WAL mode relies on shared memory
+    and does not work on network filesystems.
+
+    Args:
+        db_path (Path): Database file on a local disk; every worker must
+            open the same one.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS artifacts '
+                '(key TEXT PRIMARY KEY, data BLOB NOT NULL, digest TEXT NOT NULL, updated REAL NOT NULL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS locks (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)'
+            )
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=LOCK_TIMEOUT)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _key(self, path):
+        return Path(path).resolve().relative_to(OUTPUTS_DIR.resolve()).as_posix()
+
+    def _path(self, key):
+        return OUTPUTS_DIR / key
+
+    def write_bytes(self, path, data):
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO artifacts (key, data, digest, updated) VALUES (?, ?, ?, ?)',
+                (self._key(path), data, _sha256(data), time.time())
+            )
+        return super().write_bytes(path, data)
+
+    def read_bytes(self, path):
+        row = self._connection().execute('SELECT data FROM artifacts WHERE key = ?', (self._key(path),)).fetchone()
+        if row is None:
+            raise FileNotFoundError(path)
+        return row[0]
+
+    def exists(self, path):
+        return self._connection().execute(
+            'SELECT 1 FROM artifacts WHERE key = ?', (self._key(path),)
+        ).fetchone() is not None
+
+    def fetch(self, path):
+        path = Path(path)
+        row = self._connection().execute(
+            'SELECT digest FROM artifacts WHERE key = ?', (self._key(path),)
+        ).fetchone()
+        if row is None:
+            return None
+        if not path.is_file() or _sha256(path.read_bytes()) != row[0]:
+            super().write_bytes(path, self.read_bytes(path))
+        return path
+
+    def list(self, directory):
+        # Keys under "<dir>/" sort between "<dir>/" and "<dir>0" ('0' follows '/')
+        prefix = self._key(directory)
+        rows = self._connection().execute(
+            'SELECT key FROM artifacts WHERE key > ? AND key < ? ORDER BY key', (prefix + '/', prefix + '0')
+        ).fetchall()
+        return [self._path(key) for (key,) in rows if '/' not in key[len(prefix) + 1:]]
+
+    def delete_tree(self, directory):
+        prefix = self._key(directory)
+        with self._connection() as conn:
+            conn.execute(
+                'DELETE FROM artifacts WHERE key = ? OR (key > ? AND key < ?)', (prefix, prefix + '/', prefix + '0')
+            )
+        super().delete_tree(directory)
+
+    @contextmanager
+    def user_lock(self, user_id, timeout=None):
+        name, owner = f'user:{user_id}', uuid.uuid4().hex
+        conn = self._connection()
+        deadline = time.monotonic() + (LOCK_TIMEOUT if timeout is None else timeout)
+        while True:
+            now = time.time()
+            with conn:
+                conn.execute('DELETE FROM locks WHERE name = ? AND expires < ?', (name, now))
+                acquired = conn.execute(
+                    'INSERT OR IGNORE INTO locks (name, owner, expires) VALUES (?, ?, ?)',
+                    (name, owner, now + LOCK_LEASE)
+                ).rowcount
+            if acquired:
+                break
+            if time.monotonic() > deadline:
+                raise TimeoutError(f'Timed out waiting for the lock of user {user_id}')
+            time.sleep(0.05)
+        try:
+            yield
+        finally:
+            with conn:
+                conn.execute('DELETE FROM locks WHERE name = ? AND owner = ?', (name, owner))
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    """Return the artifact store selected by ``STORAGE_BACKEND``."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            if STORAGE_BACKEND == 'sqlite':
+                _storage = SQLiteStorage(STORAGE_PATH)
+            elif STORAGE_BACKEND == 'local':
+                _storage = LocalStorage()
+            else:
+                raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+    return _storage
@@ -0,0 +1,121 @@
+from pathlib import Path
+import threading
+import copy
+import yaml
+
+from metrics import CREW_TEMPLATE_BUILDS, instrument_tools
+from cassettes import record_tools
+
+class CrewTemplates:
+    """Process-wide cache of everything crews share between requests.
+
+    Crew classes used to parse their YAML configs and build every tool on
+    each instantiation. Parsed configs are now kept here and only parsed
+    again when the file changes; each crew gets its own copy, because
+    crewai fills agents and tasks into the config dicts. Tools that are
+    expensive to create and hold no per-request state (website search
+    indexes, web search) are built, recorded and instrumented once and then
+    shared by every crew. Agents, tasks and file tools are still created per
+    request, since they carry the request's inputs, paths and outputs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._configs = {}
+        self._tools = {}
+        self._building = {}
+
+    def config(self, path):
+        """Return a private copy of a parsed YAML config.
+
+        Raises:
+            FileNotFoundError: If the config does not exist.
+        """
+        path = Path(path).resolve()
+        stat = path.stat()
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._configs.get(path)
+        if cached is None or cached[0] != stamp:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = yaml.safe_load(f)
+            CREW_TEMPLATE_BUILDS.inc(kind='config')
+            cached = (stamp, data)
+            with self._lock:
+                self._configs[path] = cached
+        return copy.deepcopy(cached[1])
+
+    def tool(self, key, build):
+        """Return a shared tool, building it on first use.
+
+        Concurrent first uses wait for a single build.
+
+        Args:
+            key: Identifies the tool, e.g. ``('website_search', url)``.
+            build (callable): Creates the tool.
+
+        Returns:
+            The tool, recorded and instrumented.
+        """
+        with self._lock:
+            tool = self._tools.get(key)
+            if tool is not None:
+                return tool
+            building = self._building.setdefault(key, threading.Lock())
+        with building:
+            with self._lock:
+                tool = self._tools.get(key)
+            if tool is None:
+                tool = instrument_tools(record_tools([build()]))[0]
+                CREW_TEMPLATE_BUILDS.inc(kind='tool')
+                with self._lock:
+                    self._tools[key] = tool
+        return tool
+
+    def clear(self):
+        """Drop all cached configs and tools."""
+        with self._lock:
+            self._configs.clear()
+            self._tools.clear()
+
+crew_templates = CrewTemplates()
+_crew_classes = []
+
+def precompiled(crew_class):
+    """Serve a ``@CrewBase`` class's YAML configs from ``crew_templates``.
+
+    Apply above ``@CrewBase``. A class may define a static
+    ``shared_tools()`` that builds its shared tools, so they can be warmed
+    up at startup.
+    """
+    crew_class.load_yaml = staticmethod(crew_templates.config)
+    _crew_classes.append(crew_class)
+    return crew_class
+
+def warm_crew_class(crew_class):
+    """Parse a ``@precompiled`` crew class's configs and build its shared tools."""
+    for config_path in (crew_class.original_agents_config_path, crew_class.original_tasks_config_path):
+        crew_templates.config(crew_class.base_directory / config_path)
+    shared_tools = getattr(crew_class, 'shared_tools', None)
+    if shared_tools is not None:
+        shared_tools()
+
+def warm_crew_templates():
+    """Parse every crew's configs and build their shared tools.
+
+    Runs in a background thread so the server starts straight away;
+    requests that need a tool still being built wait for it.
+
+    Returns:
+        threading.Thread: The warm-up thread.
+    """
+    def warm():
+        for crew_class in _crew_classes:
+            try:
+                warm_crew_class(crew_class)
+            except Exception as e:
+                print(f"Error precompiling {crew_class.__name__}: {str(e)}")
+
+    thread = threading.Thread(target=warm, name='crew-templates', daemon=True)
+    thread.start()
+    return thread
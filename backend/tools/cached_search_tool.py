@@ -0,0 +1,169 @@
+from crewai.tools import BaseTool
+from pydantic import BaseModel, Field
+from typing import Any, Callable, Optional, Type
+from pathlib import Path
+import threading
+import sqlite3
+import json
+import time
+import os
+
+from cassettes import get_cassette
+from clustering import normalize
+from metrics import WEB_SEARCHES
+
+# Hours a cached web search result is served before searching again; 0 disables the cache
+SEARCH_CACHE_TTL_HOURS = float(os.getenv("SEARCH_CACHE_TTL_HOURS", "168"))
+# Cached results, shared by all workers on this machine
+SEARCH_CACHE_PATH = Path(os.getenv("SEARCH_CACHE_PATH", "store/search_cache.db"))
+# Live (uncached) searches one task may make; 0 is unlimited
+SEARCH_LIVE_LIMIT = int(os.getenv("SEARCH_LIVE_LIMIT", "5"))
+
+def search_key(query, **options):
+    """Cache key of a search: its content words, sorted, plus result options.
+
+    Case, punctuation, word order, plurals and filler words such as "best"
+    or "in" do not change the key, so "Best MBA colleges in Jaipur" and
+    "jaipur mba college" share one cached result.
+    """
+    words = sorted(set(normalize(query or '')))
+    return json.dumps({'q': ' '.join(words), **options}, sort_keys=True)
+
+class SearchCache:
+    """Web search results in a SQLite database, expiring after a TTL.
+
+    Args:
+        db_path (Path): Database file.
+        ttl (float): Seconds a result is served.
+    """
+
+    def __init__(self, db_path, ttl):
+        self.db_path = Path(db_path)
+        self.ttl = ttl
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS searches (key TEXT PRIMARY KEY, query TEXT NOT NULL, '
+                'result TEXT NOT NULL, at REAL NOT NULL)'
+            )
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """Return a fresh cached result, or None."""
+        row = self._connection().execute(
+            'SELECT result FROM searches WHERE key = ? AND at >= ?', (key, time.time() - self.ttl)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, query, result):
+        """Cache a result, dropping expired ones."""
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?)', (key, query, result, now))
+            conn.execute('DELETE FROM searches WHERE at < ?', (now - self.ttl,))
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_search_cache():
+    """Return the process's search cache, or None if it is disabled."""
+    global _cache
+    if SEARCH_CACHE_TTL_HOURS <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = SearchCache(SEARCH_CACHE_PATH, SEARCH_CACHE_TTL_HOURS * 3600)
+    return _cache
+
+def _search_options(search, n_results=None):
+    """Options of a search tool that change its results."""
+    return {
+        'n_results': n_results or getattr(search, 'n_results', None),
+        'country': getattr(search, 'country', None),
+        'locale': getattr(search, 'locale', None),
+        'location': getattr(search, 'location', None)
+    }
+
+def prefetch_search(search, query):
+    """Search ahead of time, so a later search for ``query`` is a cache hit.
+
+    Args:
+        search: The search tool, e.g. the shared ``SerperDevTool``.
+        query (str): Search query.
+
+    Returns:
+        bool: True if a search was made, False if the result was cached
+        already or there is no cache.
+    """
+    cache = get_search_cache() if get_cassette() is None else None
+    key = search_key(query, **_search_options(search))
+    if cache is None or cache.get(key) is not None:
+        return False
+    result = search._run(search_query=query)
+    if isinstance(result, str):
+        cache.put(key, query, result)
+    WEB_SEARCHES.inc(result='prefetched')
+    return True
+
+class CachedSearchToolInput(BaseModel):
+    """Input schema for CachedSearchTool."""
+    search_query: str = Field(..., description="Mandatory search query you want to use to search the internet")
+
+class CachedSearchTool(BaseTool):
+    """A web search tool that answers repeated searches from ``SearchCache``.
+
+    Wraps a shared search tool such as ``SerperDevTool`` for one task: the
+    task may make at most ``live_limit`` uncached searches, after which the
+    agent is told to work with the results it has. Searches are not cached
+    while a cassette records or replays them.
+    """
+    name: str = "Search the internet"
+    description: str = (
+        "A tool that can be used to search the internet with a search_query. "
+        "Results of searches made recently are returned instantly."
+    )
+    args_schema: Type[BaseModel] = CachedSearchToolInput
+    search: Any = Field(..., description="The search tool to call on a cache miss")
+    live_limit: int = SEARCH_LIVE_LIMIT
+    on_search: Optional[Callable] = Field(default=None, description="Called with the task's search counts after each search")
+    stats: dict = Field(default_factory=lambda: {'searches': 0, 'cached': 0, 'live': 0, 'capped': 0})
+
+    def _run(self, **kwargs) -> Any:
+        """Return the cached result of a search, or search and cache it.
+
+        Returns:
+            str: The search results, or a note that the search limit was reached.
+        """
+        query = kwargs.get('search_query') or kwargs.get('query')
+        key = search_key(query, **_search_options(self.search, kwargs.get('n_results')))
+        cache = get_search_cache() if get_cassette() is None else None
+        self.stats['searches'] += 1
+
+        result = cache.get(key) if cache else None
+        if result is not None:
+            source = 'cached'
+        elif self.live_limit and self.stats['live'] >= self.live_limit:
+            source = 'capped'
+            result = (
+                f"Search limit reached: this task already made {self.live_limit} live searches. "
+                "Continue with the search results you already have."
+            )
+        else:
+            source = 'live'
+            result = self.search._run(**kwargs)
+            # Failed searches come back as the provider's JSON error, not text
+            if cache and isinstance(result, str):
+                cache.put(key, query, result)
+        self.stats[source] += 1
+        WEB_SEARCHES.inc(result=source)
+        if self.on_search is not None:
+            self.on_search({'query': query, 'source': source, **self.stats})
+        return result
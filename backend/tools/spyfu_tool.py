@@ -1,15 +1,129 @@
 import http.client
+from urllib.parse import urlsplit
 import os
 import json
 import base64
 from crewai.tools import BaseTool
+import httpx
 from typing import Type
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
+from metrics import SPYFU_REQUEST_SECONDS
+from cassettes import http_connection, http_request_async
+from admission import PROVIDER_LIMITS, provider_slot, provider_slot_async
+from resilience import (
+    SPYFU_TIMEOUT, RETRYABLE_STATUSES, CircuitOpen, DeadlineExceeded, ProviderBusy, RetryableStatus, resilient_call,
+    resilient_call_async
+)
 import contextlib
 
 load_dotenv()
 
+class SpyfuError(Exception):
+    """Raised when SpyFu data could not be fetched."""
+
+# Failures a SpyFu request reports as an error payload: transport errors,
+# unparseable responses and missing credentials. ``CircuitOpen``,
+# ``ProviderBusy`` and ``DeadlineExceeded`` propagate, so callers can answer 503.
+REQUEST_ERRORS = (OSError, http.client.HTTPException, httpx.HTTPError, ValueError)
+
+def _base_url():
+    """SpyFu API origin; ``SPYFU_BASE_URL`` points it at a stand-in server."""
+    return urlsplit(os.getenv("SPYFU_BASE_URL", "https://www.spyfu.com"))
+
+def _auth_headers():
+    """Get authentication headers for SpyFu API.
+
+    Returns:
+        dict: A dictionary containing the authorization headers.
+
+    Raises:
+        ValueError: If API credentials are not set.
+    """
+    api_id = os.getenv("SPYFU_API_ID")
+    secret_key = os.getenv("SPYFU_SECRET_KEY")
+
+    if not api_id or not secret_key:
+        raise ValueError("SPYFU_API_ID and SPYFU_SECRET_KEY must be set in .env file")
+
+    auth_string = base64.b64encode(f"{api_id}:{secret_key}".encode()).decode()
+    return {
+        'Authorization': f'Basic {auth_string}',
+        'Accept': 'application/json'
+    }
+
+def _clean_domain(domain: str) -> str:
+    """Clean domain URL by removing protocol and trailing slashes."""
+    return domain.replace('https://', '').replace('http://', '').strip('/ ')
+
+def _competitors_url(domain: str) -> str:
+    return (
+        f"/apis/competitors_api/v2/seo/getTopCompetitors?"
+        f"domain={_clean_domain(domain)}&"
+        f"startingRow=2&"
+        f"pageSize=5&"
+        f"countryCode=IN"
+    )
+
+def _rankings_url(domain: str) -> str:
+    return (
+        f"/apis/serp_api/v2/seo/getNewlyRankedKeywords?"
+        f"query={_clean_domain(domain)}&"
+        f"sortBy=RankChange&"
+        f"sortOrder=Descending&"
+        f"startingRow=1&"
+        f"pageSize=10&"
+        f"countryCode=IN&"
+    )
+
+def _check_status(response, data):
+    """Raise ``RetryableStatus`` for a response worth retrying."""
+    if response.status in RETRYABLE_STATUSES:
+        getheader = getattr(response, 'getheader', None)
+        raise RetryableStatus(
+            'SpyFu', response.status, data.decode('utf-8', 'replace'),
+            retry_after=getheader('Retry-After') if getheader else None
+        )
+
+def _competitors_result(status, data) -> str:
+    """Turn a getTopCompetitors response into the tool's result string."""
+    if status == 200:
+        return data.decode("utf-8")  # raw JSON string
+    error_msg = f"Error getting competitors: {status} - {data.decode('utf-8')}"
+    print(f"SpyFu API Error: {error_msg}")
+    return json.dumps({"error": error_msg})
+
+def _rankings_result(status, data) -> str:
+    """Turn a getNewlyRankedKeywords response into the tool's result string, with filtered fields."""
+    if status != 200:
+        error_msg = f"Error getting new rankings: {status} - {data.decode('utf-8')}"
+        print(f"SpyFu API Error: {error_msg}")
+        return json.dumps({"error": error_msg})
+
+    # Parse the full response
+    full_data = json.loads(data.decode("utf-8"))
+
+    # Filter only required fields from results
+    filtered_results = []
+    for result in full_data.get('results', []):
+        filtered_result = {
+            'keyword': result.get('keyword'),
+            'topRankedUrl': result.get('topRankedUrl'),
+            'rank': result.get('rank'),
+            'searchVolume': result.get('searchVolume'),
+            'keywordDifficulty': result.get('keywordDifficulty'),
+            'seoClicks': result.get('seoClicks')
+        }
+        filtered_results.append(filtered_result)
+
+    # Create filtered response
+    filtered_data = {
+        'resultCount': full_data.get('resultCount'),
+        'results': filtered_results
+    }
+
+    return json.dumps(filtered_data, indent=2)
+
 class SpyfuToolInput(BaseModel):
     """Input schema for SpyfuTool."""
     domain: str = Field(..., description="Domain to analyze")
@@ -48,23 +162,56 @@ class SpyfuTool(BaseTool):
     def _get_auth_headers(self):
         """Get authentication headers for SpyFu API.
 
-        Returns:
-            dict: A dictionary containing the authorization headers.
-
         Raises:
             ValueError: If API credentials are not set.
         """
-        api_id = os.getenv("SPYFU_API_ID")
-        secret_key = os.getenv("SPYFU_SECRET_KEY")
+        return _auth_headers()
 
-        if not api_id or not secret_key:
-            raise ValueError("SPYFU_API_ID and SPYFU_SECRET_KEY must be set in .env file")
+    def _get_connection(self, timeout=SPYFU_TIMEOUT):
+        """Open a connection to the SpyFu API.
 
-        auth_string = base64.b64encode(f"{api_id}:{secret_key}".encode()).decode()
-        return {
-            'Authorization': f'Basic {auth_string}',
-            'Accept': 'application/json'
-        }
+        The host defaults to www.spyfu.com and can be pointed at a stand-in
+        server with ``SPYFU_BASE_URL`` (e.g. ``http://127.0.0.1:8765``).
+        Calls are recorded or replayed when ``CASSETTE_MODE`` is set.
+
+        Args:
+            timeout (float): Socket timeout in seconds.
+
+        Returns:
+            http.client.HTTPConnection: An unopened connection.
+        """
+        base_url = _base_url()
+        if base_url.scheme == 'http':
+            return http_connection('spyfu', lambda: http.client.HTTPConnection(base_url.netloc, timeout=timeout))
+        return http_connection('spyfu', lambda: http.client.HTTPSConnection(base_url.netloc, timeout=timeout))
+
+    def _request(self, endpoint: str, url: str):
+        """GET a SpyFu API URL with timeouts, retries and the circuit breaker.
+
+        Args:
+            endpoint (str): Endpoint name for metrics.
+            url (str): Path and query string.
+
+        Returns:
+            tuple: The final response status and body.
+        """
+        headers = self._get_auth_headers()
+
+        def attempt(timeout):
+            with contextlib.closing(self._get_connection(timeout)) as conn:
+                with provider_slot('spyfu'), SPYFU_REQUEST_SECONDS.time(endpoint=endpoint) as labels:
+                    conn.request("GET", url, headers=headers)
+                    res = conn.getresponse()
+                    data = res.read()
+                    if res.status != 200:
+                        labels['outcome'] = f'http_{res.status}'
+            _check_status(res, data)
+            return res.status, data
+
+        try:
+            return resilient_call('spyfu', attempt, SPYFU_TIMEOUT)
+        except RetryableStatus as e:
+            return e.status_code, str(e).encode('utf-8')
 
     def _clean_domain(self, domain: str) -> str:
         """Clean domain URL by removing protocol and trailing slashes.
@@ -75,7 +222,7 @@ class SpyfuTool(BaseTool):
         Returns:
             str: The cleaned domain URL.
         """
-        return domain.replace('https://', '').replace('http://', '').strip('/ ')
+        return _clean_domain(domain)
 
     def _get_top_competitors(self, domain: str) -> str:
         """Get top SEO competitors data.
@@ -86,34 +233,14 @@ class SpyfuTool(BaseTool):
         Returns:
             str: JSON string containing the top competitors data or error message.
         """
-        with contextlib.closing(http.client.HTTPSConnection("www.spyfu.com")) as conn:
-            headers = self._get_auth_headers()
-            clean_domain = self._clean_domain(domain)
-
-            url = (
-                f"/apis/competitors_api/v2/seo/getTopCompetitors?"
-                f"domain={clean_domain}&"
-                f"startingRow=2&"
-                f"pageSize=5&"
-                f"countryCode=IN"
-            )
-
-            try:
-                conn.request("GET", url, headers=headers)
-                res = conn.getresponse()
-                data = res.read()
-
-                if res.status == 200:
-                    return data.decode("utf-8")  # raw JSON string
-                else:
-                    error_msg = f"Error getting competitors: {res.status} - {data.decode('utf-8')}"
-                    print(f"SpyFu API Error: {error_msg}")
-                    return json.dumps({"error": error_msg})
-
-            except Exception as e:
-                error_msg = f"Error in competitors request: {str(e)}"
-                print(f"Exception: {error_msg}")
-                return json.dumps({"error": error_msg})
+        try:
+            return _competitors_result(*self._request('getTopCompetitors', _competitors_url(domain)))
+        except (CircuitOpen, DeadlineExceeded, ProviderBusy):
+            raise
+        except REQUEST_ERRORS as e:
+            error_msg = f"Error in competitors request: {str(e)}"
+            print(f"Exception: {error_msg}")
+            return json.dumps({"error": error_msg})
 
     def _get_newly_ranked_keywords(self, domain: str) -> str:
         """Get newly ranking keywords data with filtered fields.
@@ -124,55 +251,83 @@ class SpyfuTool(BaseTool):
         Returns:
             str: JSON string containing the newly ranked keywords data or error message.
         """
-        with contextlib.closing(http.client.HTTPSConnection("www.spyfu.com")) as conn:
-            headers = self._get_auth_headers()
-            clean_domain = self._clean_domain(domain)
-
-            url = (
-                f"/apis/serp_api/v2/seo/getNewlyRankedKeywords?"
-                f"query={clean_domain}&"
-                f"sortBy=RankChange&"
-                f"sortOrder=Descending&"
-                f"startingRow=1&"
-                f"pageSize=10&"
-                f"countryCode=IN&"
-            )
-
-            try:
-                conn.request("GET", url, headers=headers)
-                res = conn.getresponse()
-                data = res.read()
-
-                if res.status == 200:
-                    # Parse the full response
-                    full_data = json.loads(data.decode("utf-8"))
-
-                    # Filter only required fields from results
-                    filtered_results = []
-                    for result in full_data.get('results', []):
-                        filtered_result = {
-                            'keyword': result.get('keyword'),
-                            'topRankedUrl': result.get('topRankedUrl'),
-                            'rank': result.get('rank'),
-                            'searchVolume': result.get('searchVolume'),
-                            'keywordDifficulty': result.get('keywordDifficulty'),
-                            'seoClicks': result.get('seoClicks')
-                        }
-                        filtered_results.append(filtered_result)
-
-                    # Create filtered response
-                    filtered_data = {
-                        'resultCount': full_data.get('resultCount'),
-                        'results': filtered_results
-                    }
-
-                    return json.dumps(filtered_data, indent=2)
-                else:
-                    error_msg = f"Error getting new rankings: {res.status} - {data.decode('utf-8')}"
-                    print(f"SpyFu API Error: {error_msg}")
-                    return json.dumps({"error": error_msg})
-
-            except Exception as e:
-                error_msg = f"Error in new rankings request: {str(e)}"
-                print(f"Exception: {error_msg}")
-                return json.dumps({"error": error_msg})
+        try:
+            return _rankings_result(*self._request('getNewlyRankedKeywords', _rankings_url(domain)))
+        except (CircuitOpen, DeadlineExceeded, ProviderBusy):
+            raise
+        except REQUEST_ERRORS as e:
+            error_msg = f"Error in new rankings request: {str(e)}"
+            print(f"Exception: {error_msg}")
+            return json.dumps({"error": error_msg})
+
+class AsyncSpyfuClient:
+    """SpyFu API client for the event loop.
+
+    Makes the same requests as ``SpyfuTool`` and returns the same result
+    strings and error payloads, but over one pooled ``httpx.AsyncClient``,
+    so a fetch's requests share connections and can run concurrently
+    without holding threads. Provider limits, retries, the circuit breaker,
+    the deadline and cassettes apply as for the tool.
+
+    Use as ``async with AsyncSpyfuClient() as spyfu:``.
+    """
+
+    def __init__(self):
+        self._client = None
+
+    async def __aenter__(self):
+        base_url = _base_url()
+        self._client = httpx.AsyncClient(
+            base_url=f'{base_url.scheme}://{base_url.netloc}',
+            timeout=SPYFU_TIMEOUT,
+            limits=httpx.Limits(max_connections=max(PROVIDER_LIMITS.get('spyfu', 4), 1))
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._client.aclose()
+
+    async def _request(self, endpoint: str, url: str):
+        """GET a SpyFu API URL; see ``SpyfuTool._request``."""
+        headers = _auth_headers()
+
+        async def attempt(timeout):
+            async def send():
+                response = await self._client.get(url, headers=headers, timeout=timeout)
+                return response.status_code, response.content, response.headers
+
+            async with provider_slot_async('spyfu'):
+                with SPYFU_REQUEST_SECONDS.time(endpoint=endpoint) as labels:
+                    res = await http_request_async('spyfu', 'GET', url, send)
+                    data = res.read()
+                    if res.status != 200:
+                        labels['outcome'] = f'http_{res.status}'
+            _check_status(res, data)
+            return res.status, data
+
+        try:
+            return await resilient_call_async('spyfu', attempt, SPYFU_TIMEOUT)
+        except RetryableStatus as e:
+            return e.status_code, str(e).encode('utf-8')
+
+    async def get_top_competitors(self, domain: str) -> str:
+        """Get top SEO competitors data; see ``SpyfuTool._get_top_competitors``."""
+        try:
+            return _competitors_result(*await self._request('getTopCompetitors', _competitors_url(domain)))
+        except (CircuitOpen, DeadlineExceeded, ProviderBusy):
+            raise
+        except REQUEST_ERRORS as e:
+            error_msg = f"Error in competitors request: {str(e)}"
+            print(f"Exception: {error_msg}")
+            return json.dumps({"error": error_msg})
+
+    async def get_newly_ranked_keywords(self, domain: str) -> str:
+        """Get newly ranking keywords data; see ``SpyfuTool._get_newly_ranked_keywords``."""
+        try:
+            return _rankings_result(*await self._request('getNewlyRankedKeywords', _rankings_url(domain)))
+        except (CircuitOpen, DeadlineExceeded, ProviderBusy):
+            raise
+        except REQUEST_ERRORS as e:
+            error_msg = f"Error in new rankings request: {str(e)}"
+            print(f"Exception: {error_msg}")
+            return json.dumps({"error": error_msg})
@@ -0,0 +1,321 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import functools
+import threading
+import sqlite3
+import time
+import os
+
+from metrics import BUDGET_ACTIONS
+
+def _parse_pairs(value, separator):
+    """Parse ``key<separator>value`` pairs separated by commas."""
+    pairs = {}
+    for pair in (value or '').split(','):
+        key, _, item = pair.partition(separator)
+        if key.strip() and item.strip():
+            pairs[key.strip()] = item.strip()
+    return pairs
+
+def _parse_prices(value):
+    """Parse ``model=input/output`` USD prices per million tokens."""
+    prices = {}
+    for model, price in _parse_pairs(value, '=').items():
+        input_price, _, output_price = price.partition('/')
+        prices[model] = (float(input_price), float(output_price or input_price))
+    return prices
+
+# LLM calls of every user and run, shared by all workers on this machine
+USAGE_PATH = Path(os.getenv("USAGE_PATH", "store/usage.db"))
+# Tokens (input plus output) one pipeline run, and one user per UTC day, may
+# use; 0 is unlimited. A call that would exceed a budget is not made.
+RUN_TOKEN_BUDGET = int(os.getenv("RUN_TOKEN_BUDGET", "0"))
+USER_TOKEN_BUDGET = int(os.getenv("USER_TOKEN_BUDGET", "0"))
+# Share of a budget after which calls go to the cheaper model from
+# MODEL_DOWNGRADES instead; 1 disables downgrading
+BUDGET_DOWNGRADE_AT = float(os.getenv("BUDGET_DOWNGRADE_AT", "0.8"))
+MODEL_DOWNGRADES = _parse_pairs(os.getenv(
+    "MODEL_DOWNGRADES", "gpt-4o>gpt-4o-mini,claude-3-5-sonnet-20241022>claude-3-5-haiku-20241022"
+), '>')
+# USD per million input/output tokens, matched by longest model name prefix
+MODEL_PRICES = {
+    'gpt-4o': (2.5, 10.0),
+    'gpt-4o-mini': (0.15, 0.6),
+    'claude-3-5-sonnet': (3.0, 15.0),
+    'claude-3-5-haiku': (0.8, 4.0),
+    'gemini-2.0-flash-exp': (0.0, 0.0),
+    'gemini-2.0-flash': (0.1, 0.4),
+    **_parse_prices(os.getenv("MODEL_PRICES"))
+}
+
+class BudgetExceeded(Exception):
+    """Raised instead of making an LLM call that would exceed a token budget."""
+
+    def __init__(self, budget, used, limit, retry_after=None):
+        super().__init__(f'{budget} token budget of {limit} would be exceeded ({used} used)')
+        self.budget = budget
+        self.used = used
+        self.limit = limit
+        self.retry_after = retry_after
+
+# Who the LLM calls made in a block are accounted to
+_scope = ContextVar('usage_scope', default=None)
+
+@contextmanager
+def usage_scope(user_id, run_id, stage):
+    """Account the LLM calls made in a block to a user, run and pipeline stage.
+
+    Like the request deadline, the scope follows the block into executor
+    threads and tasks started with a copy of the context.
+    """
+    token = _scope.set((user_id, run_id, stage))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+def _bare_model(model):
+    """Model name without litellm's provider prefix, e.g. ``gemini/``."""
+    return (model or 'unknown').rpartition('/')[2]
+
+def call_cost(model, input_tokens, output_tokens):
+    """USD cost of a call from ``MODEL_PRICES``, or None for unpriced models."""
+    model = _bare_model(model)
+    matches = [name for name in MODEL_PRICES if model.startswith(name)]
+    if not matches:
+        return None
+    input_price, output_price = MODEL_PRICES[max(matches, key=len)]
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+def _day_start():
+    return datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+class UsageLedger:
+    """LLM calls with their tokens, model and latency in a SQLite database.
+
+    Each call is stored with the user, run and stage of the ``usage_scope``
+    it was made in; calls outside a scope, e.g. crew planning, are stored
+    without one. WAL mode lets every worker process append to one ledger.
+
+    Args:
+        db_path (Path): Database file.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS calls (at REAL NOT NULL, user_id TEXT, run_id TEXT, stage TEXT, '
+                'model TEXT NOT NULL, input_tokens INTEGER NOT NULL, output_tokens INTEGER NOT NULL, '
+                'seconds REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS calls_user ON calls (user_id, at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS calls_run ON calls (run_id)')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def record(self, model, input_tokens, output_tokens, seconds):
+        """Store one call under the current usage scope."""
+        user_id, run_id, stage = _scope.get() or (None, None, None)
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT INTO calls VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (time.time(), user_id, run_id, stage, model, int(input_tokens or 0), int(output_tokens or 0), seconds)
+            )
+
+    def run_tokens(self, run_id):
+        row = self._connection().execute(
+            'SELECT SUM(input_tokens + output_tokens) FROM calls WHERE run_id = ?', (run_id,)
+        ).fetchone()
+        return row[0] or 0
+
+    def user_tokens_today(self, user_id):
+        row = self._connection().execute(
+            'SELECT SUM(input_tokens + output_tokens) FROM calls WHERE user_id = ? AND at >= ?',
+            (user_id, _day_start().timestamp())
+        ).fetchone()
+        return row[0] or 0
+
+    def summary(self, user_id, run_id=None):
+        """A user's usage per run, stage and model.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            run_id (str): Only this run; by default all of the user's runs.
+
+        Returns:
+            dict: ``total`` and ``today`` usage, and usage per ``runs``
+            (each with its ``stages``) and per ``models``. Usage is
+            ``calls``, ``input_tokens``, ``output_tokens``, ``seconds`` and
+            ``cost_usd`` (None if a model has no price).
+        """
+        query = ('SELECT run_id, stage, model, COUNT(*), SUM(input_tokens), SUM(output_tokens), SUM(seconds), '
+                 'SUM(at >= ?) FROM calls WHERE user_id = ?')
+        params = [_day_start().timestamp(), user_id]
+        if run_id:
+            query += ' AND run_id = ?'
+            params.append(run_id)
+        rows = self._connection().execute(query + ' GROUP BY run_id, stage, model', params).fetchall()
+
+        def empty():
+            return {'calls': 0, 'input_tokens': 0, 'output_tokens': 0, 'seconds': 0.0, 'cost_usd': 0.0}
+
+        def add(totals, calls, input_tokens, output_tokens, seconds, cost):
+            totals['calls'] += calls
+            totals['input_tokens'] += input_tokens
+            totals['output_tokens'] += output_tokens
+            totals['seconds'] = round(totals['seconds'] + seconds, 3)
+            totals['cost_usd'] = None if cost is None or totals['cost_usd'] is None \
+                else round(totals['cost_usd'] + cost, 6)
+
+        total, today, runs, models = empty(), empty(), {}, {}
+        for row_run, stage, model, calls, input_tokens, output_tokens, seconds, calls_today in rows:
+            cost = call_cost(model, input_tokens, output_tokens)
+            usage = (calls, input_tokens, output_tokens, seconds, cost)
+            add(total, *usage)
+            if calls_today == calls:
+                add(today, *usage)
+            elif calls_today:
+                # Split a run that spans midnight by its share of calls
+                share = calls_today / calls
+                add(today, calls_today, round(input_tokens * share), round(output_tokens * share),
+                    seconds * share, None if cost is None else cost * share)
+            run = runs.setdefault(row_run or '', {**empty(), 'stages': {}})
+            add(run, *usage)
+            add(run['stages'].setdefault(stage or '', empty()), *usage)
+            add(models.setdefault(model, empty()), *usage)
+        return {'total': total, 'today': today, 'runs': runs, 'models': models}
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+def get_usage_ledger():
+    """Return the process's usage ledger."""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = UsageLedger(USAGE_PATH)
+    return _ledger
+
+def record_call(model, input_tokens, output_tokens, seconds):
+    """Store an LLM call's usage under the current usage scope."""
+    try:
+        get_usage_ledger().record(model, input_tokens, output_tokens, seconds)
+    except sqlite3.Error as e:
+        # Accounting must never fail the call it accounts for
+        print(f"Error recording LLM usage: {str(e)}")
+
+def estimate_tokens(content):
+    """Rough token count of a prompt: about four characters per token."""
+    if isinstance(content, (list, tuple)):
+        return sum(estimate_tokens(item) for item in content)
+    if isinstance(content, dict):
+        return estimate_tokens(content.get('content') or '')
+    # e.g. an earlier genai response passed back as context
+    text = getattr(content, 'text', None)
+    if isinstance(text, str):
+        return len(text) // 4
+    return len(str(content)) // 4
+
+def budget_model(model, tokens):
+    """Pick the model for a call under the current scope's token budgets.
+
+    Args:
+        model (str): The model the caller asked for.
+        tokens (int): Tokens the call is expected to use.
+
+    Returns:
+        str: ``model``, or its ``MODEL_DOWNGRADES`` replacement once a
+        budget is ``BUDGET_DOWNGRADE_AT`` used.
+
+    Raises:
+        BudgetExceeded: If the call would exceed the run's or user's budget.
+    """
+    user_id, run_id, _ = _scope.get() or (None, None, None)
+    ledger = get_usage_ledger()
+    budgets = []
+    if RUN_TOKEN_BUDGET and run_id:
+        budgets.append(('run', ledger.run_tokens(run_id), RUN_TOKEN_BUDGET, None))
+    if USER_TOKEN_BUDGET and user_id:
+        until_tomorrow = (_day_start() + timedelta(days=1) - datetime.now(timezone.utc)).total_seconds()
+        budgets.append(('user', ledger.user_tokens_today(user_id), USER_TOKEN_BUDGET, until_tomorrow))
+
+    downgrade = None
+    for name, used, limit, retry_after in budgets:
+        if used + tokens > limit:
+            BUDGET_ACTIONS.inc(budget=name, action='abort')
+            raise BudgetExceeded(name, used, limit, retry_after)
+        if downgrade is None and used + tokens > limit * BUDGET_DOWNGRADE_AT:
+            downgrade = name
+    cheaper = MODEL_DOWNGRADES.get(_bare_model(model))
+    if downgrade and cheaper:
+        BUDGET_ACTIONS.inc(budget=downgrade, action='downgrade')
+        # Keep litellm's provider prefix, e.g. gemini/
+        return model[:len(model) - len(_bare_model(model))] + cheaper
+    return model
+
+def budget_status(user_id):
+    """A user's token budgets and today's usage against them."""
+    return {
+        'run_token_budget': RUN_TOKEN_BUDGET or None,
+        'user_token_budget': USER_TOKEN_BUDGET or None,
+        'user_tokens_today': get_usage_ledger().user_tokens_today(user_id),
+        'downgrade_at': BUDGET_DOWNGRADE_AT,
+        'downgrades': MODEL_DOWNGRADES
+    }
+
+def install_usage_accounting():
+    """Account every crew LLM call and apply the token budgets to it.
+
+    Usage is read from each ``litellm.completion`` response on the calling
+    thread, where the usage scope is known; litellm's own callbacks run on
+    other threads. Budgets wrap ``LLM.call``; install last, so a downgraded
+    model is routed and rate limited like any other.
+    """
+    import litellm
+    from crewai import LLM
+    from routing import llm_for
+
+    completion = litellm.completion
+    if not getattr(completion, 'accounted', False):
+        @functools.wraps(completion)
+        def accounted_completion(*args, **kwargs):
+            start = time.perf_counter()
+            response = completion(*args, **kwargs)
+            usage = getattr(response, 'usage', None)
+            if usage is not None:
+                record_call(
+                    getattr(response, 'model', None) or kwargs.get('model'),
+                    getattr(usage, 'prompt_tokens', 0), getattr(usage, 'completion_tokens', 0),
+                    time.perf_counter() - start
+                )
+            return response
+
+        accounted_completion.accounted = True
+        litellm.completion = accounted_completion
+
+    call = LLM.call
+    if getattr(call, 'budgeted', False):
+        return
+
+    @functools.wraps(call)
+    def budgeted_call(self, messages, *args, **kwargs):
+        if not RUN_TOKEN_BUDGET and not USER_TOKEN_BUDGET:
+            return call(self, messages, *args, **kwargs)
+        tokens = estimate_tokens(messages) + (self.max_tokens or 0)
+        model = budget_model(self.model, tokens)
+        return call(llm_for(self, model), messages, *args, **kwargs)
+
+    budgeted_call.budgeted = True
+    LLM.call = budgeted_call
@@ -12,6 +12,7 @@ export default function BlogGeneration() {
     const [searchParams] = useSearchParams();
     const [blogContent, setBlogContent] = useState(''); // State to hold the blog content
     const [docxFile, setDocxFile] = useState(null); // State to hold the generated DOCX file name
+    const [runId, setRunId] = useState(null); // State to hold the run that produced this blog
     const [loading, setLoading] = useState(true); // State to manage loading status
     const [error, setError] = useState(null); // State to manage error messages
 
@@ -40,6 +41,7 @@ export default function BlogGeneration() {
                 if (result.status === 'success') {
                     setBlogContent(result.markdown); // Update to use the correct property for blog content
                     setDocxFile(result.docxFile);
+                    setRunId(result.runId);
                 } else {
                     throw new Error(result.message || 'Failed to generate blog');
                 }
@@ -59,7 +61,9 @@ export default function BlogGeneration() {
     const handleDownload = () => {
         if (docxFile) {
             const userId = searchParams.get('userId');
-            window.open(`${import.meta.env.VITE_API_URL}/download/${userId}/${docxFile}`, '_blank');
+            // Download this tab's blog even if other blogs were generated since
+            const runQuery = runId ? `?run_id=${runId}` : '';
+            window.open(`${import.meta.env.VITE_API_URL}/download/${userId}/${docxFile}${runQuery}`, '_blank');
         }
     };
 
@@ -1,5 +1,6 @@
-import { useState } from 'react';
+import { useEffect, useState } from 'react';
 import { motion } from 'framer-motion';
+import { searchKeywords } from '../../services/api';
 
 /**
  * KeywordSelection component allows users to select target keywords for content generation.
@@ -13,6 +14,30 @@ import { motion } from 'framer-motion';
  */
 export default function KeywordSelection({ keywords, onSubmit, isLoading, disabled, selectedKeywords = [] }) {
     const [localSelectedKeywords, setLocalSelectedKeywords] = useState(selectedKeywords);
+    const [query, setQuery] = useState('');
+    const [matches, setMatches] = useState([]);
+
+    // Search on the server once typing pauses, cancelling superseded searches
+    useEffect(() => {
+        if (!query.trim()) {
+            setMatches([]);
+            return;
+        }
+        const controller = new AbortController();
+        const timer = setTimeout(() => {
+            searchKeywords(query, 10, controller.signal)
+                .then(setMatches)
+                .catch((error) => {
+                    if (error.name !== 'AbortError') {
+                        console.error('Error searching keywords:', error);
+                    }
+                });
+        }, 150);
+        return () => {
+            clearTimeout(timer);
+            controller.abort();
+        };
+    }, [query]);
 
     /**
      * Toggles the selection of a keyword.
@@ -57,6 +82,40 @@ export default function KeywordSelection({ keywords, onSubmit, isLoading, disabl
                 </h2>
 
                 <form onSubmit={handleSubmit} className="space-y-4">
+                    <div className="mb-6">
+                        <input
+                            type="search"
+                            value={query}
+                            onChange={(e) => setQuery(e.target.value)}
+                            placeholder="Search keywords across all domains"
+                            disabled={disabled || isLoading}
+                            className="w-full px-3 py-2 border border-gray-300 rounded-md focus:ring-indigo-500 focus:border-indigo-500"
+                        />
+                        {matches.length > 0 && (
+                            <ul className="mt-2 border border-gray-200 rounded-md divide-y divide-gray-100">
+                                {matches.map((match) => (
+                                    <li key={match.keyword}>
+                                        <label className="flex items-center justify-between px-3 py-2 text-sm text-gray-700 cursor-pointer hover:bg-gray-50">
+                                            <span className="flex items-center space-x-2">
+                                                <input
+                                                    type="checkbox"
+                                                    checked={localSelectedKeywords.includes(match.keyword)}
+                                                    onChange={() => handleKeywordToggle(match.keyword)}
+                                                    disabled={disabled || isLoading}
+                                                    className="w-4 h-4 text-indigo-600 rounded border-gray-300 focus:ring-indigo-500"
+                                                />
+                                                <span>{match.keyword}</span>
+                                            </span>
+                                            <span className="text-xs text-gray-500">
+                                                {match.searchVolume.toLocaleString()} searches/mo
+                                            </span>
+                                        </label>
+                                    </li>
+                                ))}
+                            </ul>
+                        )}
+                    </div>
+
                     {Object.entries(keywords).map(([domain, domainKeywords]) => (
                         <div key={domain} className="mb-6">
                             <h3 className="text-lg font-semibold text-gray-700 mb-3">
@@ -36,6 +36,26 @@ export const runAnalysis = async (data) => {
     }
 };
 
+/**
+ * Subscribes to live pipeline progress events for a user.
+ * Pass the same userId in the body of runAnalysis to follow a new analysis.
+ * While a request waits for a free slot, 'queued' events report its position.
+ * @param {string} userId - The ID of the user whose progress to follow.
+ * @param {Function} onEvent - Called with each parsed progress event.
+ * @returns {Function} - Call to close the subscription.
+ */
+export const subscribeToProgress = (userId, onEvent) => {
+    const source = new EventSource(`${API_URL}/events/${userId}`);
+    const types = [
+        'stage_started', 'stage_finished', 'stage_failed', 'step',
+        'task_started', 'task_finished', 'tool_called', 'agent_step', 'queued'
+    ];
+    types.forEach(type => source.addEventListener(type, (event) => {
+        onEvent(JSON.parse(event.data));
+    }));
+    return () => source.close();
+};
+
 /**
  * Fetches keywords associated with the current user.
  * @returns {Promise<Object>} - The keywords data.
@@ -61,6 +81,31 @@ export const getKeywords = async () => {
     }
 };
 
+/**
+ * Searches the current user's and competitors' keywords as the user types.
+ * @param {string} query - The text typed so far.
+ * @param {number} limit - Maximum number of matches.
+ * @param {AbortSignal} signal - Cancels a search superseded by newer input.
+ * @returns {Promise<Array>} - Matching keywords with searchVolume and domains.
+ * @throws Will throw an error if the search fails.
+ */
+export const searchKeywords = async (query, limit = 10, signal) => {
+    const userId = localStorage.getItem('userId');
+    const params = new URLSearchParams({ userId, q: query, limit });
+    const response = await fetch(`${API_URL}/keywords/search?${params}`, {
+        method: 'GET',
+        headers: defaultHeaders,
+        signal,
+    });
+
+    const data = await response.json();
+
+    if (data.status !== 'success') {
+        throw new Error(data.message || 'Failed to search keywords');
+    }
+    return data.results;
+};
+
 /**
  * Saves the provided keywords for the current user.
  * @param {Array} keywords - The keywords to save.
@@ -146,7 +191,8 @@ export const generateBlog = async (blogOutline) => {
                 status: 'success',
                 message: 'Blog post generated successfully',
                 markdown: result.markdown,
-                docxFile: result.docxFile
+                docxFile: result.docxFile,
+                runId: result.runId
             }
         }
         else {